@@ -1,59 +1,163 @@
+import argparse
+import hashlib
+import time
 import requests
-from PIL import Image
-from io import BytesIO
 from bs4 import BeautifulSoup
 from transformers import AutoProcessor, BlipForConditionalGeneration
+from caption_cache import CaptionCache
+from caption_pipeline import CAPTION_SETTINGS, caption_batch, caption_urls, decode_image, fetch_image, make_session
+from crawl_manifest import CrawlManifest, merge_captions
+from image_prefilter import ImagePrefilter, normalize_url
 
 # Load the pretrained processor and model
-processor = AutoProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
+model_name = "Salesforce/blip-image-captioning-base"
+processor = AutoProcessor.from_pretrained(model_name)
+model = BlipForConditionalGeneration.from_pretrained(model_name)
 
 # URL of the page to scrape
 url = "https://en.wikipedia.org/wiki/IBM"
 
-# Download the page
-response = requests.get(url)
-# Parse the page with BeautifulSoup
-soup = BeautifulSoup(response.text, 'html.parser')
 
-# Find all img elements
-img_elements = soup.find_all('img')
+def find_image_urls(page_url, manifest=None, prefilter=None, concurrency=8):
+    """
+    Downloads a page and returns the URLs of the images worth captioning.
 
-# Open a file to write the captions
-with open("captions.txt", "w") as caption_file:
+    With a CrawlManifest the page is fetched with a conditional request, and the image
+    list from the previous crawl is reused if the page hasn't changed. With an
+    ImagePrefilter tiny images are dropped before download and srcset candidates
+    sized for the model are chosen.
+    """
+    # Download the page
+    headers = manifest.conditional_headers(page_url) if manifest is not None else None
+    response = requests.get(page_url, headers=headers)
+    if manifest is not None and response.status_code == 304:
+        return manifest.entries[page_url]['images']
+    # Parse the page with BeautifulSoup
+    soup = BeautifulSoup(response.text, 'html.parser')
+
+    candidates = []
     # Iterate over each img element
-    for img_element in img_elements:
+    for img_element in soup.find_all('img'):
         img_url = img_element.get('src')
+        if not img_url:
+            continue
 
         # Skip if the image is an SVG or too small (likely an icon)
         if 'svg' in img_url or '1x1' in img_url:
             continue
 
         # Correct the URL if it's malformed
-        if img_url.startswith('//'):
-            img_url = 'https:' + img_url
-        elif not img_url.startswith('http://') and not img_url.startswith('https://'):
+        img_url = normalize_url(img_url)
+        if img_url is None:
             continue  # Skip URLs that don't start with http:// or https://
 
+        candidates.append((img_element, img_url))
+
+    if prefilter is not None:
+        with make_session(concurrency) as session:
+            img_urls = prefilter.filter(session, candidates, concurrency)
+    else:
+        img_urls = [img_url for _, img_url in candidates]
+
+    if manifest is not None:
+        manifest.record(page_url, response, hashlib.sha256(response.content).hexdigest(), images=img_urls)
+    return img_urls
+
+
+def caption_sequential(img_urls, cache=None, manifest=None):
+    """Downloads and captions the images one at a time."""
+    session = requests.Session()
+    for img_url in img_urls:
         try:
             # Download the image
-            response = requests.get(img_url)
-            # Convert the image data to a PIL Image
-            raw_image = Image.open(BytesIO(response.content))
-            if raw_image.size[0] * raw_image.size[1] < 400:  # Skip very small images
+            data = fetch_image(session, img_url, manifest=manifest)
+            if data is None:  # Not modified since the previous crawl
+                continue
+            # Decode the image at the model's input resolution
+            image = decode_image(data)
+            if image is None:  # Skip very small images
                 continue
 
-            raw_image = raw_image.convert('RGB')
+            # Reuse the caption if this exact image was captioned before
+            if cache is not None:
+                key = cache.key(image, **CAPTION_SETTINGS)
+                caption = cache.get(key)
+                if caption is not None:
+                    yield img_url, caption
+                    continue
 
-            # Process the image
-            inputs = processor(raw_image, return_tensors="pt")
-            # Generate a caption for the image
-            out = model.generate(**inputs, max_new_tokens=50)
-            # Decode the generated tokens to text
-            caption = processor.decode(out[0], skip_special_tokens=True)
+            start = time.perf_counter()
+            # Process the image, generate a caption and decode it to text
+            caption = caption_batch(processor, model, [image], **CAPTION_SETTINGS)[0]
+            if cache is not None:
+                cache.put(key, caption, time.perf_counter() - start)
 
-            # Write the caption to the file, prepended by the image URL
-            caption_file.write(f"{img_url}: {caption}\n")
+            yield img_url, caption
         except Exception as e:
             print(f"Error processing image {img_url}: {e}")
-            continue
\ No newline at end of file
+            if manifest is not None:
+                manifest.forget(img_url)
+            continue
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Caption every image on a web page.")
+    parser.add_argument("--url", default=url, help="Page to scrape")
+    parser.add_argument("--output", help="File to write the captions to (default captions.txt, or captions.jsonl "
+                                         "in incremental mode)")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="Fetch images concurrently and caption them in batches")
+    parser.add_argument("--concurrency", type=int, default=8, help="Parallel image downloads (pipelined mode)")
+    parser.add_argument("--batch-size", type=int, default=8, help="Images per model.generate call (pipelined mode)")
+    parser.add_argument("--cache", default="caption_cache.sqlite3", help="Caption cache file")
+    parser.add_argument("--no-cache", action="store_true", help="Caption every image even if it was seen before")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only caption images that changed since the last crawl and merge them into a JSONL file")
+    parser.add_argument("--manifest", default="crawl_manifest.json", help="Crawl manifest file (incremental mode)")
+    parser.add_argument("--prefilter", action="store_true",
+                        help="Skip tiny images using tag attributes or the image header before downloading, "
+                             "and download srcset candidates sized for the model")
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else CaptionCache(model_name, path=args.cache)
+    manifest = CrawlManifest(args.manifest) if args.incremental else None
+    prefilter = ImagePrefilter() if args.prefilter else None
+
+    def print_error(img_url, e):
+        print(f"Error processing image {img_url}: {e}")
+        if manifest is not None:
+            manifest.forget(img_url)
+
+    start = time.perf_counter()
+    img_urls = find_image_urls(args.url, manifest, prefilter, args.concurrency)
+
+    if args.pipelined:
+        captions = caption_urls(img_urls, processor, model, concurrency=args.concurrency, batch_size=args.batch_size,
+                                on_error=print_error, cache=cache, manifest=manifest, **CAPTION_SETTINGS)
+    else:
+        captions = caption_sequential(img_urls, cache, manifest)
+
+    count = 0
+    if args.incremental:
+        output = args.output or "captions.jsonl"
+        captions = list(captions)
+        count = len(captions)
+        # Append only what changed, then remember what this crawl saw
+        appended = merge_captions(output, captions)
+        manifest.save()
+        print(f"Merged {appended} new or changed captions into {output}")
+    else:
+        # Open a file to write the captions
+        with open(args.output or "captions.txt", "w") as caption_file:
+            for img_url, caption in captions:
+                # Write the caption to the file, prepended by the image URL
+                caption_file.write(f"{img_url}: {caption}\n")
+                count += 1
+    elapsed = time.perf_counter() - start
+
+    print(f"Captioned {count} images in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.2f} images/s)")
+    if prefilter is not None:
+        print(f"Prefilter: {prefilter.metrics}")
+    if cache is not None:
+        print(f"Caption cache: {cache.stats()}")
+        cache.close()
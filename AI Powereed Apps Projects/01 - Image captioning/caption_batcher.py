@@ -0,0 +1,76 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Groups concurrent requests into batches for a function that handles a whole list at once.
+
+    A background thread waits for the first request, then keeps collecting until it has
+    `max_batch_size` items or `max_wait_ms` milliseconds have passed. It calls
+    `batch_fn(items)` once and hands each result back to the caller that submitted it.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=20):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, item):
+        """Queues an item and returns a Future for its result."""
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        """Queues an item and blocks until its result is ready."""
+        return self.submit(item).result()
+
+    def close(self):
+        """Stops the worker once the requests already queued have been handled."""
+        self._queue.put(None)
+        self._worker.join()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is None:
+                # Finish this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            items = [item for item, _ in batch]
+            try:
+                results = list(self.batch_fn(items))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            # Don't leave a caller waiting forever if the function returned fewer results than items
+            for _, future in batch[len(results):]:
+                future.set_exception(ValueError(f"batch_fn returned {len(results)} results for {len(items)} items"))
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class CaptionCache:
+    """
+    Caches captions by the content of the decoded image, the model name and the generation settings.
+
+    Lookups go to a small in-process LRU (the hot tier) first and then to an SQLite file on disk.
+    The disk store is kept under `max_bytes` by evicting the least recently used captions.
+    """
+
+    def __init__(self, model_name, path="caption_cache.sqlite3", max_bytes=64 * 2 ** 20, hot_size=256):
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.hot_size = hot_size
+        self._hot = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS captions ("
+            "key TEXT PRIMARY KEY, caption TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS captions_last_used ON captions (last_used)")
+        self._db.commit()
+
+        # Counters
+        self.hot_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._compute_seconds = 0.0
+        self._computed = 0
+
+    def key(self, image, **settings):
+        """
+        Returns the cache key of a PIL image captioned with the given generation settings.
+
+        Callers pass the image as `caption_pipeline.normalize_image` returns it, so the same picture
+        gets the same key however it arrived.
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{image.mode}:{image.size}".encode())
+        digest.update(image.tobytes())
+        digest.update(self.model_name.encode())
+        digest.update(json.dumps(settings, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Returns the cached caption, or None on a miss."""
+        with self._lock:
+            if key in self._hot:
+                self._hot.move_to_end(key)
+                self.hot_hits += 1
+                return self._hot[key]
+
+            row = self._db.execute("SELECT caption FROM captions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._db.execute("UPDATE captions SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.disk_hits += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, key, caption, compute_seconds=0.0):
+        """
+        Stores a caption.
+
+        Args:
+            key (str): Key returned by `key()`.
+            caption (str): The generated caption.
+            compute_seconds (float, optional): Time the model spent on it, used to estimate the time hits save.
+        """
+        caption = caption.strip()
+        size = len(key) + len(caption.encode())
+        with self._lock:
+            self._compute_seconds += compute_seconds
+            self._computed += 1
+            self._remember(key, caption)
+            self._db.execute(
+                "INSERT OR REPLACE INTO captions (key, caption, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, caption, size, time.time())
+            )
+            self._evict()
+            self._db.commit()
+
+    def stats(self):
+        """Returns the hit/miss counters and an estimate of the model time saved by hits."""
+        with self._lock:
+            hits = self.hot_hits + self.disk_hits
+            lookups = hits + self.misses
+            mean_compute = self._compute_seconds / self._computed if self._computed else 0.0
+            return {
+                "hits": hits,
+                "hot_hits": self.hot_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "seconds_saved": hits * mean_compute,
+            }
+
+    def close(self):
+        self._db.close()
+
+    def _remember(self, key, caption):
+        self._hot[key] = caption
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.hot_size:
+            self._hot.popitem(last=False)
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM captions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk from the least recently used entry until enough bytes are freed
+        evicted = []
+        for key, size in self._db.execute("SELECT key, size FROM captions ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM captions WHERE key = ?", evicted)
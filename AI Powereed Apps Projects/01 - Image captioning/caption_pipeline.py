@@ -0,0 +1,179 @@
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from io import BytesIO
+
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+
+# The downloader is shared with the other projects (../shared)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "shared"))
+from downloader import fetch  # noqa: E402
+
+# Input resolution of the BLIP base model (the processor resizes to this anyway)
+BLIP_IMAGE_SIZE = 384
+
+# Generation settings of every captioning path; part of the caption cache key
+CAPTION_SETTINGS = {"max_new_tokens": 50}
+
+
+def make_session(concurrency=8):
+    """
+    Creates a requests session whose connection pool is large enough for `concurrency`
+    parallel downloads, so connections to the same host are kept alive and reused.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def fetch_image(session, img_url, timeout=10, manifest=None):
+    """
+    Downloads the raw bytes of an image.
+
+    With a CrawlManifest the request is conditional, and None is returned if the server
+    answers 304 Not Modified or the content hashes the same as on the previous crawl.
+    The body is streamed, and resumed with a Range request if the connection breaks.
+    """
+    headers = manifest.conditional_headers(img_url) if manifest is not None else None
+    response, data = fetch(session, img_url, headers=headers, timeout=timeout)
+    if manifest is not None and response.status_code == 304:
+        return None
+    response.raise_for_status()
+
+    if manifest is not None:
+        sha256 = hashlib.sha256(data).hexdigest()
+        unchanged = manifest.is_unchanged(img_url, sha256)
+        manifest.record(img_url, response, sha256)
+        if unchanged:
+            return None
+    return data
+
+
+def decode_image(data, image_size=BLIP_IMAGE_SIZE):
+    """
+    Decodes image bytes into an RGB image resized to the model's input resolution.
+
+    JPEGs are decoded at full size, as Gradio decodes uploads, so a downloaded picture gets
+    the same pixels, and the same cache key, as the same file uploaded to the app.
+
+    Returns:
+        PIL.Image or None: None if the image is too small to be worth captioning.
+    """
+    raw_image = Image.open(BytesIO(data))
+    if raw_image.size[0] * raw_image.size[1] < 400:  # Skip very small images
+        return None
+    return normalize_image(raw_image, image_size)
+
+
+def normalize_image(image, image_size=BLIP_IMAGE_SIZE):
+    """
+    Converts an image to RGB at the model's input resolution.
+
+    Every captioning path feeds the model, and keys the caption cache on, the image in this form.
+    """
+    return image.convert('RGB').resize((image_size, image_size), Image.BICUBIC)
+
+
+def caption_batch(processor, model, images, **generate_kwargs):
+    """Captions a list of images with a single batched `model.generate` call (captions are stripped)."""
+    inputs = processor(images=images, return_tensors="pt")
+    out = model.generate(**inputs, **generate_kwargs)
+    return [caption.strip() for caption in processor.batch_decode(out, skip_special_tokens=True)]
+
+
+def _decode_and_key(data, cache, settings):
+    image = decode_image(data)
+    if image is None or cache is None:
+        return image, None
+    return image, cache.key(image, **settings)
+
+
+def caption_urls(img_urls, processor, model, concurrency=8, batch_size=8, decode_workers=4,
+                 on_error=None, cache=None, manifest=None, **generate_kwargs):
+    """
+    Downloads, decodes and captions images as a pipeline.
+
+    Images are fetched concurrently over a pooled session, decoded/resized on a worker pool,
+    and grouped into batches of `batch_size` for one `model.generate` call each. Captioning
+    runs in the calling thread while later images are still downloading.
+
+    Args:
+        img_urls (list): Image URLs to caption.
+        processor: The BLIP processor.
+        model: The BLIP model.
+        concurrency (int): Number of parallel downloads.
+        batch_size (int): Number of images per `model.generate` call.
+        decode_workers (int): Number of threads decoding images.
+        on_error (callable, optional): Called with (img_url, exception) for failed images.
+        cache (CaptionCache, optional): Images with a cached caption skip the processor and the model.
+        manifest (CrawlManifest, optional): Images unchanged since the previous crawl are skipped.
+        **generate_kwargs: Passed on to `model.generate` (e.g. CAPTION_SETTINGS).
+
+    Yields:
+        tuple: (img_url, caption) for each captioned image.
+    """
+    session = make_session(concurrency)
+    batch = []
+
+    with ThreadPoolExecutor(concurrency) as fetch_pool, ThreadPoolExecutor(decode_workers) as decode_pool:
+        pending_fetches = {
+            fetch_pool.submit(fetch_image, session, img_url, manifest=manifest): img_url for img_url in img_urls
+        }
+        pending_decodes = {}
+
+        while pending_fetches or pending_decodes:
+            done, _ = wait(list(pending_fetches) + list(pending_decodes), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                if future in pending_fetches:
+                    img_url = pending_fetches.pop(future)
+                    try:
+                        data = future.result()
+                    except Exception as e:
+                        if on_error:
+                            on_error(img_url, e)
+                        continue
+                    if data is None:  # Not modified since the previous crawl
+                        continue
+                    pending_decodes[decode_pool.submit(_decode_and_key, data, cache, generate_kwargs)] = img_url
+                else:
+                    img_url = pending_decodes.pop(future)
+                    try:
+                        image, key = future.result()
+                    except Exception as e:
+                        if on_error:
+                            on_error(img_url, e)
+                        continue
+                    if image is None:
+                        continue
+                    caption = cache.get(key) if cache is not None else None
+                    if caption is not None:
+                        yield img_url, caption
+                    else:
+                        batch.append((img_url, image, key))
+
+            # Run a full batch, or whatever is left once every image has been decoded
+            while len(batch) >= batch_size or (batch and not pending_fetches and not pending_decodes):
+                current, batch = batch[:batch_size], batch[batch_size:]
+                urls = [img_url for img_url, _, _ in current]
+                try:
+                    start = time.perf_counter()
+                    captions = caption_batch(processor, model, [image for _, image, _ in current], **generate_kwargs)
+                    elapsed = time.perf_counter() - start
+                except Exception as e:
+                    if on_error:
+                        for img_url in urls:
+                            on_error(img_url, e)
+                    continue
+                if cache is not None:
+                    for (_, _, key), caption in zip(current, captions):
+                        cache.put(key, caption, elapsed / len(current))
+                yield from zip(urls, captions)
+
+    session.close()
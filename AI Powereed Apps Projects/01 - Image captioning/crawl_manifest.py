@@ -0,0 +1,91 @@
+import json
+import os
+import threading
+
+
+class CrawlManifest:
+    """
+    Remembers, for every URL fetched by an incremental crawl, the ETag and Last-Modified
+    validators the server sent and a hash of the content, so the next crawl can send
+    conditional requests and skip anything that hasn't changed.
+    """
+
+    def __init__(self, path="crawl_manifest.json"):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as manifest_file:
+                self.entries = json.load(manifest_file)
+
+    def conditional_headers(self, url):
+        """Returns the If-None-Match/If-Modified-Since headers for a URL seen before."""
+        entry = self.entries.get(url, {})
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def is_unchanged(self, url, sha256):
+        """True if the content of a URL has the same hash as on the previous crawl."""
+        return self.entries.get(url, {}).get('sha256') == sha256
+
+    def record(self, url, response, sha256, **extra):
+        """Stores the validators of a response and the hash of its content."""
+        with self._lock:
+            self.entries[url] = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'sha256': sha256,
+                **extra,
+            }
+
+    def forget(self, url):
+        """Drops a URL, e.g. because it failed to caption, so the next crawl fetches it again."""
+        with self._lock:
+            self.entries.pop(url, None)
+
+    def save(self):
+        # Write to a temporary file first so an interrupted save can't corrupt the manifest
+        with self._lock:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as manifest_file:
+                json.dump(self.entries, manifest_file, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+def read_captions(path):
+    """Reads a captions JSONL file into a {url: caption} dict; later lines override earlier ones."""
+    captions = {}
+    if os.path.exists(path):
+        with open(path) as caption_file:
+            for line in caption_file:
+                if line.strip():
+                    entry = json.loads(line)
+                    captions[entry['url']] = entry['caption']
+    return captions
+
+
+def merge_captions(path, new_captions):
+    """
+    Appends the captions that are new or changed to a captions JSONL file.
+
+    Args:
+        path (str): The JSONL file, one {"url": ..., "caption": ...} object per line.
+        new_captions (iterable): (url, caption) pairs.
+
+    Returns:
+        int: The number of lines appended.
+    """
+    captions = read_captions(path)
+    appended = 0
+    with open(path, 'a') as caption_file:
+        for url, caption in new_captions:
+            if captions.get(url) == caption:
+                continue
+            caption_file.write(json.dumps({'url': url, 'caption': caption}) + '\n')
+            captions[url] = caption
+            appended += 1
+    return appended
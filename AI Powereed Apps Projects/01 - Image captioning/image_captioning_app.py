@@ -1,33 +1,65 @@
+import logging
+import os
+import time
 import gradio as gr
 import numpy as np
 from PIL import Image
 from transformers import AutoProcessor, BlipForConditionalGeneration
+from caption_batcher import MicroBatcher
+from caption_cache import CaptionCache
+from caption_pipeline import CAPTION_SETTINGS, caption_batch, normalize_image
 
 # Load the pretrained processor and model
-processor = AutoProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
+model_name = "Salesforce/blip-image-captioning-base"
+processor = AutoProcessor.from_pretrained(model_name)
+model = BlipForConditionalGeneration.from_pretrained(model_name)
 
-def caption_image(input_image: np.ndarray):
-    # Convert numpy array to PIL Image and convert to RGB
-    raw_image = Image.fromarray(input_image).convert('RGB')
+# Captions of images that were uploaded before
+cache = CaptionCache(model_name)
+logger = logging.getLogger(__name__)
 
-    # Process the image
-    inputs = processor(raw_image, return_tensors="pt")
+# Concurrent requests are grouped into one batched model call of up to
+# CAPTION_BATCH_SIZE images, waiting at most CAPTION_BATCH_WAIT_MS for the batch to fill
+max_batch_size = int(os.environ.get("CAPTION_BATCH_SIZE", 8))
+max_wait_ms = float(os.environ.get("CAPTION_BATCH_WAIT_MS", 20))
+batcher = MicroBatcher(
+    lambda images: caption_batch(processor, model, images, **CAPTION_SETTINGS),
+    max_batch_size=max_batch_size,
+    max_wait_ms=max_wait_ms
+)
 
-    # Generate a caption for the image
-    out = model.generate(**inputs,max_length=50)
+def caption_image(input_image: np.ndarray):
+    # Convert numpy array to PIL Image, in RGB at the model's input resolution
+    raw_image = normalize_image(Image.fromarray(input_image))
 
-    # Decode the generated tokens to text
-    caption = processor.decode(out[0], skip_special_tokens=True)
+    # Skip the processor and the model if this image was captioned before
+    key = cache.key(raw_image, **CAPTION_SETTINGS)
+    caption = cache.get(key)
+    if caption is not None:
+        log_cache_stats()
+        return caption
+
+    start = time.perf_counter()
+    # Process, generate and decode the caption together with other requests in flight
+    caption = batcher(raw_image)
+    cache.put(key, caption, time.perf_counter() - start)
+    log_cache_stats()
 
     return caption
 
+def log_cache_stats():
+    # Only gather the counters when someone is reading them
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Caption cache: %s", cache.stats())
+
 iface = gr.Interface(
-    fn=caption_image, 
-    inputs=gr.Image(), 
+    fn=caption_image,
+    inputs=gr.Image(),
     outputs="text",
     title="Image Captioning",
     description="This is a simple web app for generating captions for images using a trained model."
 )
 
-iface.launch()
\ No newline at end of file
+# Let enough requests run at once for the batcher to fill its batches
+iface.queue(default_concurrency_limit=max_batch_size)
+iface.launch()
@@ -0,0 +1,185 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import ImageFile
+
+from caption_pipeline import BLIP_IMAGE_SIZE
+
+# Images with fewer pixels than this are icons, spacers and the like
+MIN_IMAGE_AREA = 400
+
+
+def normalize_url(img_url):
+    """Makes protocol-relative URLs absolute; returns None for URLs that aren't http(s)."""
+    if img_url.startswith('//'):
+        return 'https:' + img_url
+    if img_url.startswith('http://') or img_url.startswith('https://'):
+        return img_url
+    return None
+
+
+def _int_attribute(img_element, name):
+    # Pixels only: "10%" or "auto" don't say how big the image is
+    match = re.fullmatch(r'\s*(\d+)\s*(px)?\s*', img_element.get(name) or '')
+    return int(match.group(1)) if match else None
+
+
+def parse_srcset(srcset, base_width=None):
+    """
+    Parses a srcset attribute into (url, width) pairs.
+
+    Width descriptors ("480w") are used as they are; density descriptors ("2x") are turned
+    into widths using the width of the 1x image, and are skipped if that isn't known.
+    """
+    candidates = []
+    for candidate in srcset.split(','):
+        parts = candidate.split()
+        if not parts:
+            continue
+        descriptor = parts[1] if len(parts) > 1 else '1x'
+        try:
+            if descriptor.endswith('w'):
+                width = int(descriptor[:-1])
+            elif descriptor.endswith('x') and base_width:
+                width = int(float(descriptor[:-1]) * base_width)
+            else:
+                continue
+        except ValueError:
+            continue
+        candidates.append((parts[0], width))
+    return candidates
+
+
+def read_header_size(data):
+    """Returns the (width, height) found in the first bytes of an image, or None if they aren't enough."""
+    parser = ImageFile.Parser()
+    try:
+        parser.feed(data)
+    except Exception:
+        return None
+    return parser.image.size if parser.image else None
+
+
+class ImagePrefilter:
+    """
+    Decides which images are worth downloading before downloading them.
+
+    Image sizes come from the width/height attributes of the <img> tag when they are set,
+    otherwise from the first bytes of the file fetched with a Range request. Tiny images
+    are dropped, and for images with a srcset the smallest candidate that still covers
+    the model's input resolution is chosen instead of the full-size original.
+
+    With `measure_savings` the `bytes_saved` metric also covers images skipped by their
+    attributes and srcset candidates chosen instead of the original, whose sizes are
+    read with HEAD requests.
+    """
+
+    def __init__(self, target_size=BLIP_IMAGE_SIZE, min_area=MIN_IMAGE_AREA, probe_bytes=2048,
+                 measure_savings=True):
+        self.target_size = target_size
+        self.min_area = min_area
+        self.probe_bytes = probe_bytes
+        self.measure_savings = measure_savings
+        self._lock = threading.Lock()
+        self.metrics = {
+            'images': 0,
+            'skipped_by_attributes': 0,
+            'skipped_by_probe': 0,
+            'probes': 0,
+            'probe_bytes': 0,
+            'srcset_candidates_chosen': 0,
+            'bytes_saved': 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.metrics[name] += amount
+
+    def choose_source(self, img_element, img_url):
+        """Returns the URL of the srcset candidate closest above the target size, or `img_url`."""
+        width = _int_attribute(img_element, 'width')
+        candidates = parse_srcset(img_element.get('srcset') or '', width)
+        if width:
+            candidates.append((img_url, width))
+        candidates = [(normalize_url(url), w) for url, w in candidates if normalize_url(url)]
+        if not candidates:
+            return img_url
+
+        large_enough = [candidate for candidate in candidates if candidate[1] >= self.target_size]
+        chosen = min(large_enough, key=lambda c: c[1]) if large_enough else max(candidates, key=lambda c: c[1])
+        if chosen[0] != img_url:
+            self._count('srcset_candidates_chosen')
+        return chosen[0]
+
+    def probe(self, session, img_url):
+        """
+        Reads the image size from the first `probe_bytes` bytes of the file.
+
+        Returns:
+            tuple: ((width, height) or None, total file size or None, number of bytes read)
+        """
+        headers = {'Range': f'bytes=0-{self.probe_bytes - 1}'}
+        with session.get(img_url, headers=headers, stream=True, timeout=10) as response:
+            if response.status_code not in (200, 206):
+                return None, None, 0
+            # Servers that ignore Range send the whole file; stop reading after the header anyway
+            data = response.raw.read(self.probe_bytes, decode_content=True)
+            total = response.headers.get('Content-Range', '').rpartition('/')[2]
+            if not total.isdigit():
+                total = response.headers.get('Content-Length', '') if response.status_code == 200 else ''
+        self._count('probes')
+        self._count('probe_bytes', len(data))
+        return read_header_size(data), int(total) if total.isdigit() else None, len(data)
+
+    def content_length(self, session, img_url):
+        """Returns the size of a file from a HEAD request, or None if the server doesn't say."""
+        try:
+            response = session.head(img_url, allow_redirects=True, timeout=10)
+        except Exception:
+            return None
+        length = response.headers.get('Content-Length', '')
+        return int(length) if response.ok and length.isdigit() else None
+
+    def check(self, session, img_element, img_url):
+        """Returns the URL to download for an <img> tag, or None if the image should be skipped."""
+        self._count('images')
+        width = _int_attribute(img_element, 'width')
+        height = _int_attribute(img_element, 'height')
+
+        if width is not None and height is not None:
+            if width * height < self.min_area:
+                self._count('skipped_by_attributes')
+                if self.measure_savings:
+                    self._count('bytes_saved', self.content_length(session, img_url) or 0)
+                return None
+        else:
+            try:
+                size, total, read = self.probe(session, img_url)
+            except Exception:
+                size, total, read = None, None, 0
+            # If the header couldn't be read, let the full download decide
+            if size is not None and size[0] * size[1] < self.min_area:
+                self._count('skipped_by_probe')
+                if total:
+                    self._count('bytes_saved', max(0, total - read))
+                return None
+
+        source = self.choose_source(img_element, img_url)
+        if source != img_url and self.measure_savings:
+            original = self.content_length(session, img_url)
+            chosen = self.content_length(session, source)
+            if original and chosen:
+                self._count('bytes_saved', max(0, original - chosen))
+        return source
+
+    def filter(self, session, candidates, concurrency=8):
+        """
+        Runs `check` on many (img_element, img_url) pairs at once.
+
+        Returns:
+            list: The URLs to download, in page order.
+        """
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = pool.map(lambda candidate: self.check(session, *candidate), candidates)
+            return [img_url for img_url in results if img_url is not None]
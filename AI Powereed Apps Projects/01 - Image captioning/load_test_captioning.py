@@ -0,0 +1,74 @@
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+from transformers import AutoProcessor, BlipForConditionalGeneration
+
+from caption_batcher import MicroBatcher
+from caption_pipeline import CAPTION_SETTINGS, caption_batch
+
+# Load the pretrained processor and model
+model_name = "Salesforce/blip-image-captioning-base"
+processor = AutoProcessor.from_pretrained(model_name)
+model = BlipForConditionalGeneration.from_pretrained(model_name)
+
+
+def caption_direct(raw_image):
+    """The current path of `caption_image`: one processor and generate call per request."""
+    inputs = processor(raw_image, return_tensors="pt")
+    out = model.generate(**inputs, **CAPTION_SETTINGS)
+    return processor.decode(out[0], skip_special_tokens=True)
+
+
+def run_load(caption_fn, images, concurrency):
+    """Sends every image through `caption_fn` from `concurrency` client threads and times each request."""
+    def timed(raw_image):
+        start = time.perf_counter()
+        caption_fn(raw_image)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as clients:
+        latencies = sorted(clients.map(timed, images))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "throughput": len(images) / elapsed,
+    }
+
+
+def print_result(name, result):
+    print(f"{name:>8}: p50 {result['p50_ms']:8.1f} ms   p99 {result['p99_ms']:8.1f} ms   "
+          f"{result['throughput']:6.2f} images/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-request and micro-batched captioning under load.")
+    parser.add_argument("--requests", type=int, default=64, help="Total number of caption requests")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of concurrent clients")
+    parser.add_argument("--batch-size", type=int, default=8, help="Maximum batch size of the batcher")
+    parser.add_argument("--wait-ms", type=float, default=20, help="Maximum time the batcher waits to fill a batch")
+    args = parser.parse_args()
+
+    # Random images so that no two requests are the same
+    rng = np.random.default_rng(0)
+    images = [Image.fromarray(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)) for _ in range(args.requests)]
+
+    # Warm up the model so the first timed request doesn't pay for it
+    caption_direct(images[0])
+
+    print(f"{args.requests} requests from {args.concurrency} concurrent clients")
+    print_result("direct", run_load(caption_direct, images, args.concurrency))
+
+    batcher = MicroBatcher(
+        lambda batch: caption_batch(processor, model, batch, **CAPTION_SETTINGS),
+        max_batch_size=args.batch_size,
+        max_wait_ms=args.wait_ms
+    )
+    print_result("batched", run_load(batcher, images, args.concurrency))
+    batcher.close()
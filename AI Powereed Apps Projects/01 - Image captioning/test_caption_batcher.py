@@ -0,0 +1,59 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from caption_batcher import MicroBatcher
+
+
+def test_concurrent_requests_are_batched_and_get_their_own_results():
+    batches = []
+
+    def double(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(double, max_batch_size=4, max_wait_ms=200)
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(batcher, range(8)))
+    batcher.close()
+
+    assert results == [item * 2 for item in range(8)]
+    assert all(len(batch) <= 4 for batch in batches) and len(batches) < 8
+    assert sorted(item for batch in batches for item in batch) == list(range(8))
+
+
+def test_a_failed_batch_fails_every_request_in_it():
+    def fail(items):
+        raise RuntimeError("model crashed")
+
+    batcher = MicroBatcher(fail, max_wait_ms=50)
+    futures = [batcher.submit(item) for item in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model crashed"):
+            future.result(timeout=5)
+    batcher.close()
+
+
+def test_requests_without_a_result_fail_instead_of_waiting_forever():
+    batcher = MicroBatcher(lambda items: items[:1], max_wait_ms=50)
+    futures = [batcher.submit(item) for item in range(3)]
+    assert futures[0].result(timeout=5) == 0
+    for future in futures[1:]:
+        with pytest.raises(ValueError, match="1 results for 3 items"):
+            future.result(timeout=5)
+    batcher.close()
+
+
+def test_close_handles_the_requests_already_queued():
+    release = threading.Event()
+
+    def slow(items):
+        release.wait()
+        return items
+
+    batcher = MicroBatcher(slow, max_batch_size=2, max_wait_ms=0)
+    futures = [batcher.submit(item) for item in range(5)]
+    release.set()
+    batcher.close()
+    assert [future.result(timeout=0) for future in futures] == list(range(5))
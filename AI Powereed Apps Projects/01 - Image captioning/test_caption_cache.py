@@ -0,0 +1,69 @@
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from caption_cache import CaptionCache
+from caption_pipeline import CAPTION_SETTINGS, decode_image, normalize_image
+
+
+def picture():
+    rng = np.random.default_rng(0)
+    return Image.fromarray(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8))
+
+
+def test_uploaded_and_downloaded_picture_share_one_cache_entry(tmp_path):
+    cache = CaptionCache("blip", path=str(tmp_path / "cache.sqlite3"))
+    png = BytesIO()
+    picture().save(png, format="PNG")
+
+    # The URL captioner decodes the downloaded bytes; the Gradio app gets the pixels as an array
+    downloaded = decode_image(png.getvalue())
+    uploaded = normalize_image(Image.fromarray(np.asarray(picture())))
+    cache.put(cache.key(downloaded, **CAPTION_SETTINGS), " a dog on a beach \n")
+
+    assert cache.get(cache.key(uploaded, **CAPTION_SETTINGS)) == "a dog on a beach"
+    assert cache.get(cache.key(uploaded, max_new_tokens=20)) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    cache.close()
+
+
+def test_caption_survives_a_restart_from_disk(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = CaptionCache("blip", path=path)
+    key = cache.key(normalize_image(picture()), **CAPTION_SETTINGS)
+    cache.put(key, "a dog on a beach")
+    cache.close()
+
+    cache = CaptionCache("blip", path=path)
+    assert cache.get(key) == "a dog on a beach" and cache.stats()["disk_hits"] == 1
+    assert CaptionCache("other model", path=path).key(normalize_image(picture()), **CAPTION_SETTINGS) != key
+    cache.close()
+
+
+def test_uploaded_and_downloaded_jpeg_share_one_cache_entry(tmp_path):
+    cache = CaptionCache("blip", path=str(tmp_path / "cache.sqlite3"))
+    jpeg = BytesIO()
+    picture().resize((1600, 1200)).save(jpeg, format="JPEG", quality=90)
+
+    # Gradio hands the app the upload decoded at full size
+    downloaded = decode_image(jpeg.getvalue())
+    uploaded = normalize_image(Image.fromarray(np.asarray(Image.open(BytesIO(jpeg.getvalue())).convert("RGB"))))
+
+    assert cache.key(downloaded, **CAPTION_SETTINGS) == cache.key(uploaded, **CAPTION_SETTINGS)
+    cache.close()
+
+
+def test_least_recently_used_captions_are_evicted_over_max_bytes(tmp_path):
+    key_size = len(CaptionCache("blip", path=":memory:").key(picture()))
+    cache = CaptionCache("blip", path=str(tmp_path / "cache.sqlite3"), max_bytes=3 * (key_size + 10), hot_size=0)
+    keys = [cache.key(picture(), max_new_tokens=n) for n in range(4)]
+    cache.put(keys[0], "caption 0.")
+    cache.put(keys[1], "caption 1.")
+    cache.put(keys[2], "caption 2.")
+    assert cache.get(keys[0]) == "caption 0."  # Now the most recently used
+
+    cache.put(keys[3], "caption 3.")
+    assert cache.get(keys[1]) is None
+    assert [cache.get(key) for key in (keys[0], keys[2], keys[3])] == ["caption 0.", "caption 2.", "caption 3."]
+    cache.close()
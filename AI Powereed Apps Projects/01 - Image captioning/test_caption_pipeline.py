@@ -0,0 +1,132 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from caption_pipeline import caption_urls
+
+
+def png(red, size=(64, 64)):
+    data = BytesIO()
+    Image.new('RGB', size, (red, 0, 0)).save(data, format='PNG')
+    return data.getvalue()
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Serves `files` ({path: (body, seconds to wait before answering)}); any other path is a 404."""
+
+    files = {}
+
+    def do_GET(self):
+        if self.path not in self.files:
+            self.send_error(404)
+            return
+        body, delay = self.files[self.path]
+        time.sleep(delay)
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{httpd.server_port}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class FakeBlip:
+    """Stands in for the BLIP processor and model: the caption of an image is its red value."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    def __call__(self, images, return_tensors):
+        return {'pixel_values': [image.getpixel((0, 0))[0] for image in images]}
+
+    def generate(self, pixel_values, **generate_kwargs):
+        if self.fail:
+            raise RuntimeError('out of memory')
+        self.batches.append(len(pixel_values))
+        return pixel_values
+
+    def batch_decode(self, out, skip_special_tokens):
+        return [f' red {red} ' for red in out]
+
+
+def serve(files):
+    FixtureHandler.files = files
+
+
+def test_every_url_gets_its_own_caption_in_full_batches(server):
+    serve({f'/{i}.png': (png(i * 10), 0.01 * (i % 4)) for i in range(20)})
+    urls = [f'{server}/{i}.png' for i in range(20)]
+    blip = FakeBlip()
+
+    captions = list(caption_urls(urls, blip, blip, concurrency=8, batch_size=8))
+
+    # Downloads finish out of order, but each caption is paired with the URL of its image
+    assert sorted(captions) == sorted((f'{server}/{i}.png', f'red {i * 10}') for i in range(20))
+    assert sum(blip.batches) == 20 and max(blip.batches) <= 8 and blip.batches.count(8) >= 1
+
+
+def test_slow_download_does_not_hold_back_the_others(server):
+    files = {f'/{i}.png': (png(i), 0) for i in range(6)}
+    files['/slow.png'] = (png(200), 1.0)
+    serve(files)
+    urls = [f'{server}/slow.png'] + [f'{server}/{i}.png' for i in range(6)]
+    blip = FakeBlip()
+
+    captions = list(caption_urls(urls, blip, blip, concurrency=8, batch_size=2))
+
+    assert captions[-1] == (f'{server}/slow.png', 'red 200')
+    assert len(captions) == 7
+
+
+def test_failed_images_are_reported_and_the_rest_captioned(server):
+    serve({'/good.png': (png(10), 0), '/broken.png': (b'not an image', 0)})
+    urls = [f'{server}/good.png', f'{server}/missing.png', f'{server}/broken.png']
+    errors = []
+    blip = FakeBlip()
+
+    captions = list(caption_urls(urls, blip, blip, on_error=lambda url, e: errors.append((url, e))))
+
+    assert captions == [(f'{server}/good.png', 'red 10')]
+    assert sorted(url for url, _ in errors) == [f'{server}/broken.png', f'{server}/missing.png']
+    assert all(isinstance(e, Exception) for _, e in errors)
+
+
+def test_failed_batch_is_reported_for_each_of_its_images(server):
+    serve({f'/{i}.png': (png(i), 0) for i in range(3)})
+    urls = [f'{server}/{i}.png' for i in range(3)]
+    errors = []
+
+    captions = list(caption_urls(urls, FakeBlip(), FakeBlip(fail=True), batch_size=8,
+                                 on_error=lambda url, e: errors.append((url, e))))
+
+    assert captions == []
+    assert sorted(url for url, _ in errors) == sorted(urls)
+    assert all(str(e) == 'out of memory' for _, e in errors)
+
+
+def test_small_images_are_skipped_without_an_error(server):
+    serve({'/icon.png': (png(10, size=(16, 16)), 0), '/photo.png': (png(20), 0)})
+    errors = []
+    blip = FakeBlip()
+
+    captions = list(caption_urls([f'{server}/icon.png', f'{server}/photo.png'], blip, blip,
+                                 on_error=lambda url, e: errors.append(url)))
+
+    assert captions == [(f'{server}/photo.png', 'red 20')]
+    assert errors == [] and blip.batches == [1]
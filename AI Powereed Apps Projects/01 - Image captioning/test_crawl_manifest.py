@@ -0,0 +1,104 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+
+import pytest
+
+from caption_pipeline import caption_urls
+from crawl_manifest import CrawlManifest, merge_captions, read_captions
+from test_caption_pipeline import FakeBlip, png
+
+
+class ConditionalHandler(BaseHTTPRequestHandler):
+    """Serves `files` ({path: (body, ETag)}) and answers 304 to a matching If-None-Match."""
+
+    files = {}
+    not_modified = []
+
+    def do_GET(self):
+        body, etag = self.files[self.path]
+        if self.headers.get('If-None-Match') == etag:
+            ConditionalHandler.not_modified.append(self.path)
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    ConditionalHandler.not_modified = []
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), ConditionalHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{httpd.server_port}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def crawl(urls, manifest_path, output, limit=None):
+    """One incremental run as automate_url_captioning.py does it; stops after `limit` captions if given."""
+    manifest = CrawlManifest(manifest_path)
+    blip = FakeBlip()
+    captions = caption_urls(urls, blip, blip, batch_size=1, manifest=manifest,
+                            on_error=lambda url, e: manifest.forget(url))
+    appended = merge_captions(output, islice(captions, limit))
+    if limit is None:
+        manifest.save()
+    return appended
+
+
+def test_run_after_a_partial_one_appends_only_what_is_missing(server, tmp_path):
+    ConditionalHandler.files = {f'/{i}.png': (png(i * 10), f'"v{i}"') for i in range(4)}
+    urls = [f'{server}/{i}.png' for i in range(4)]
+    manifest_path, output = str(tmp_path / 'manifest.json'), str(tmp_path / 'captions.jsonl')
+
+    # Interrupted after two captions: they are in the output, but the manifest was never saved
+    assert crawl(urls, manifest_path, output, limit=2) == 2
+    assert len(read_captions(output)) == 2
+
+    # The next run fetches everything again, and appends only the two captions still missing
+    assert crawl(urls, manifest_path, output) == 2
+    assert read_captions(output) == {f'{server}/{i}.png': f'red {i * 10}' for i in range(4)}
+    assert len((tmp_path / 'captions.jsonl').read_text().splitlines()) == 4
+    assert ConditionalHandler.not_modified == []
+
+
+def test_saved_manifest_skips_unchanged_images_and_refetches_failed_ones(server, tmp_path):
+    ConditionalHandler.files = {
+        '/same.png': (png(10), '"a"'),
+        '/edited.png': (png(20), '"b"'),
+        '/broken.png': (b'not an image yet', '"c"'),
+    }
+    urls = [f'{server}/same.png', f'{server}/edited.png', f'{server}/broken.png']
+    manifest_path, output = str(tmp_path / 'manifest.json'), str(tmp_path / 'captions.jsonl')
+
+    assert crawl(urls, manifest_path, output) == 2
+    assert set(json.loads((tmp_path / 'manifest.json').read_text())) == {f'{server}/same.png', f'{server}/edited.png'}
+
+    ConditionalHandler.files['/edited.png'] = (png(30), '"b2"')
+    ConditionalHandler.files['/broken.png'] = (png(40), '"c"')
+    assert crawl(urls, manifest_path, output) == 2
+
+    assert ConditionalHandler.not_modified == ['/same.png']
+    assert read_captions(output) == {f'{server}/same.png': 'red 10', f'{server}/edited.png': 'red 30',
+                                     f'{server}/broken.png': 'red 40'}
+    assert json.loads((tmp_path / 'manifest.json').read_text())[f'{server}/edited.png']['etag'] == '"b2"'
+
+
+def test_merge_appends_new_and_changed_captions_only(tmp_path):
+    output = str(tmp_path / 'captions.jsonl')
+    assert merge_captions(output, [('a', 'a cat'), ('b', 'a dog')]) == 2
+    with open(output, 'a') as caption_file:
+        caption_file.write('\n')  # Blank lines are ignored
+
+    assert merge_captions(output, [('a', 'a cat'), ('b', 'a wet dog'), ('c', 'a bird'), ('c', 'a bird')]) == 2
+    assert read_captions(output) == {'a': 'a cat', 'b': 'a wet dog', 'c': 'a bird'}
+    assert merge_captions(output, []) == 0
@@ -0,0 +1,120 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+import numpy as np
+import pytest
+import requests
+from bs4 import BeautifulSoup
+from PIL import Image
+
+from image_prefilter import ImagePrefilter, parse_srcset
+
+
+def noise(width, height, format='JPEG'):
+    rng = np.random.default_rng(0)
+    data = BytesIO()
+    Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8)).save(data, format=format)
+    return data.getvalue()
+
+
+def img(html):
+    return BeautifulSoup(html, 'html.parser').img
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves `files` ({path: body}), honouring HEAD and `bytes=start-end` Range requests."""
+
+    files = {}
+    ranges = True
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.files[self.path])))
+        self.end_headers()
+
+    def do_GET(self):
+        body = self.files[self.path]
+        start, _, end = self.headers.get('Range', '').removeprefix('bytes=').partition('-')
+        if self.ranges and start:
+            part = body[int(start):int(end) + 1]
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{int(start) + len(part) - 1}/{len(body)}')
+        else:
+            part = body
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(part)))
+        self.end_headers()
+        self.wfile.write(part)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    RangeHandler.ranges = True
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{httpd.server_port}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_srcset_widths_and_densities():
+    srcset = 'a.jpg 320w, b.jpg 640w,c.jpg 1.5x, d.jpg, e.jpg 2x, f.jpg 50vw, g.jpg wide'
+    assert parse_srcset(srcset) == [('a.jpg', 320), ('b.jpg', 640)]
+    assert parse_srcset(srcset, base_width=200) == [('a.jpg', 320), ('b.jpg', 640), ('c.jpg', 300),
+                                                    ('d.jpg', 200), ('e.jpg', 400)]
+    assert parse_srcset('') == []
+
+
+def test_smallest_srcset_candidate_covering_the_model_is_chosen():
+    prefilter = ImagePrefilter(target_size=384)
+    tag = img('<img width="200" srcset="https://x/s.jpg 1x, https://x/m.jpg 2x, https://x/l.jpg 4x">')
+    assert prefilter.choose_source(tag, 'https://x/orig.jpg') == 'https://x/m.jpg'
+    assert prefilter.choose_source(img('<img srcset="//x/a.jpg 100w, //x/b.jpg 300w">'),
+                                   'https://x/orig.jpg') == 'https://x/b.jpg'
+    assert prefilter.choose_source(img('<img>'), 'https://x/orig.jpg') == 'https://x/orig.jpg'
+
+
+@pytest.mark.parametrize('width, height, skipped', [
+    ('10', '10', True),
+    ('10px', ' 10 ', True),
+    ('10%', '10', False),
+    ('auto', '10', False),
+    ('100', '100', False),
+])
+def test_only_pixel_sizes_skip_an_image_without_probing(server, width, height, skipped):
+    RangeHandler.files = {'/big.jpg': noise(640, 480)}
+    prefilter = ImagePrefilter()
+    with requests.Session() as session:
+        result = prefilter.check(session, img(f'<img width="{width}" height="{height}">'), server + '/big.jpg')
+    assert (result is None) == skipped
+    assert prefilter.metrics['skipped_by_attributes'] == skipped
+    assert prefilter.metrics['bytes_saved'] == (len(RangeHandler.files['/big.jpg']) if skipped else 0)
+
+
+@pytest.mark.parametrize('ranges', [True, False])
+def test_probe_reads_the_size_from_the_first_bytes(server, ranges):
+    RangeHandler.ranges = ranges
+    RangeHandler.files = {'/big.jpg': noise(640, 480), '/icon.png': noise(19, 21, 'PNG')}
+    prefilter = ImagePrefilter(probe_bytes=1024)
+    with requests.Session() as session:
+        size, total, read = prefilter.probe(session, server + '/big.jpg')
+        assert (size, total, read) == ((640, 480), len(RangeHandler.files['/big.jpg']), 1024)
+
+        assert prefilter.check(session, img('<img>'), server + '/big.jpg') == server + '/big.jpg'
+        assert prefilter.check(session, img('<img>'), server + '/icon.png') is None
+    assert prefilter.metrics['skipped_by_probe'] == 1
+    assert prefilter.metrics['bytes_saved'] == len(RangeHandler.files['/icon.png']) - 1024
+
+
+def test_bytes_saved_counts_a_smaller_srcset_candidate(server):
+    RangeHandler.files = {'/orig.jpg': noise(1600, 1200), '/small.jpg': noise(400, 300)}
+    prefilter = ImagePrefilter(target_size=384)
+    tag = img(f'<img width="1600" height="1200" srcset="{server}/small.jpg 400w">')
+    with requests.Session() as session:
+        assert prefilter.check(session, tag, server + '/orig.jpg') == server + '/small.jpg'
+    assert prefilter.metrics['srcset_candidates_chosen'] == 1
+    assert prefilter.metrics['bytes_saved'] == len(RangeHandler.files['/orig.jpg']) - len(RangeHandler.files['/small.jpg'])
@@ -1,19 +1,99 @@
-from flask import Flask, request, render_template
+from flask import Flask, Response, jsonify, request, render_template, stream_with_context
 from flask_cors import CORS
+import gc
 import json
-from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+import os
+import time
+from types import SimpleNamespace
+from transformers import AutoTokenizer, TextIteratorStreamer
+from conversation_store import MemoryConversationStore, SQLiteConversationStore, build_prompt_ids
+from inference_backends import load_model
+from inference_worker import InferenceWorker, QueueFullError
+from model_loader import LazyLoader, memory_usage_mb
+
+started = time.monotonic()
 
 # Initialize Flask App
 app = Flask(__name__)
 CORS(app)  # Enable CORS for requests from other origins (e.g., your frontend)
 
-# Load Pre-Trained Model and Tokenizer 
-model_name = "facebook/blenderbot-400M-distill"
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+model_name = os.environ.get("CHAT_MODEL", "facebook/blenderbot-400M-distill")  # Hub id or local directory
+
+
+def load_chatbot():
+    """Loads the Pre-Trained Model and Tokenizer (CHAT_BACKEND selects torch, int8 or onnx inference)."""
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = load_model(model_name, os.environ.get("CHAT_BACKEND", "torch"))
+    # Turns are joined with newlines; tokenize the separator once
+    separator_ids = tokenizer("\n", add_special_tokens=False)["input_ids"]
+    return SimpleNamespace(tokenizer=tokenizer, model=model, separator_ids=separator_ids)
+
+
+def start_worker():
+    """
+    Starts this process's inference worker and warms it up.
+
+    All generation runs on one worker thread that batches concurrent requests;
+    requests beyond CHAT_MAX_QUEUE waiting ones are turned away with a 503.
+    """
+    chatbot = chatbot_loader.get()
+    worker = InferenceWorker(
+        chatbot.model,
+        chatbot.tokenizer,
+        max_batch_size=int(os.environ.get("CHAT_BATCH_SIZE", 8)),
+        max_wait_ms=float(os.environ.get("CHAT_BATCH_WAIT_MS", 10)),
+        max_queue=int(os.environ.get("CHAT_MAX_QUEUE", 64))
+    )
+    # One dummy generation so the first real request doesn't pay for one-off setup
+    worker.generate(chatbot.tokenizer("hello")["input_ids"])
+    return worker
+
+
+# The model is loaded on first use rather than at import, so the server starts right away
+# and /ready reports when it can answer. The worker thread is started separately because
+# threads don't survive a fork.
+chatbot_loader = LazyLoader(load_chatbot)
+worker_loader = LazyLoader(start_worker)
 
-# Conversation History (Moved outside the route for persistence across requests)
-conversation_history = [] 
+# With CHAT_PRELOAD=1 (used with gunicorn's preload_app) the weights are loaded once in the
+# master process, and forked workers share those memory pages copy-on-write. Inference is
+# left to the workers, since a torch thread pool started before the fork isn't fork-safe.
+if os.environ.get("CHAT_PRELOAD") == "1":
+    chatbot_loader.get()
+    # Keep the garbage collector from writing to (and so copying) the preloaded objects' pages
+    gc.freeze()
+
+# Conversation History, kept per session (set CHAT_HISTORY_DB to persist it in SQLite)
+history_ttl = int(os.environ.get("CHAT_HISTORY_TTL", 3600))
+if os.environ.get("CHAT_HISTORY_DB"):
+    conversation_store = SQLiteConversationStore(os.environ["CHAT_HISTORY_DB"], ttl_seconds=history_ttl)
+else:
+    conversation_store = MemoryConversationStore(ttl_seconds=history_ttl)
+
+
+def server_busy():
+    return Response("The chatbot is busy, please retry shortly.", status=503, headers={"Retry-After": "1"})
+
+
+# Readiness probe: 200 once this process has loaded and warmed up the model, 503 until then
+# (with the error if the last attempt failed; every probe after a failure starts a new attempt)
+@app.route('/ready', methods=['GET'])
+def ready():
+    if not worker_loader.ready:
+        error = worker_loader.error
+        worker_loader.load_in_background()
+        if error is not None:
+            return jsonify({"ready": False, "error": f"{type(error).__name__}: {error}"}), 503
+        return jsonify({"ready": False}), 503
+    return jsonify({
+        "ready": True,
+        "pid": os.getpid(),
+        # Measured from the start of the process that imported the app (the master with CHAT_PRELOAD=1)
+        "time_to_ready_s": round(worker_loader.ready_at - started, 2),
+        "model_load_s": round(chatbot_loader.load_seconds, 2),
+        "warm_up_s": round(worker_loader.load_seconds, 2),
+        "memory_mb": memory_usage_mb(),
+    })
 
 
 # Route for Rendering the Main Page
@@ -22,32 +102,95 @@ def home():
     return render_template('index.html')  # Assumes you have an index.html file for the UI
 
 
+def prepare_inputs(session_id, input_text):
+    """Tokenizes a new message and builds the model input ids from it and the session's recent history."""
+    tokenizer = chatbot_loader.get().tokenizer
+    # Tokenize only the new message; earlier turns were tokenized when they were stored
+    input_ids = tokenizer(input_text, add_special_tokens=False)["input_ids"]
+
+    # Build the input from as many recent turns as fit in the model's context
+    prompt_ids = build_prompt_ids(
+        conversation_store.turns(session_id),
+        input_ids,
+        tokenizer.model_max_length,
+        chatbot_loader.get().separator_ids,
+        tokenizer.eos_token_id
+    )
+    return prompt_ids, input_ids
+
+
+def remember(session_id, input_text, input_ids, response):
+    """Adds a message and the bot's response to the session's history."""
+    conversation_store.append(session_id, input_text, input_ids)
+    tokenizer = chatbot_loader.get().tokenizer
+    conversation_store.append(session_id, response, tokenizer(response, add_special_tokens=False)["input_ids"])
+
+
 # Route for Handling Chatbot Interactions
 @app.route('/chatbot', methods=['POST'])
 def handle_prompt():
-    global conversation_history  # Make sure we're modifying the global history
-
     data = request.get_data(as_text=True)
     data = json.loads(data)
-    
-    input_text = data['prompt']
 
-    # Construct Conversation History (Optimized)
-    history_string = "\n".join(conversation_history)
-
-    # Tokenization and Model Inference
-    inputs = tokenizer.encode_plus(history_string, input_text, return_tensors="pt")
-    outputs = model.generate(**inputs)
+    input_text = data['prompt']
+    # Clients that don't send a session id share one conversation, as before
+    session_id = data.get('session_id', 'default')
 
-    # Decode the Response
-    response = tokenizer.decode(outputs[0], skip_special_tokens=True).strip()
+    # Tokenization and Model Inference (batched with other requests by the worker)
+    prompt_ids, input_ids = prepare_inputs(session_id, input_text)
+    try:
+        response = worker_loader.get().generate(prompt_ids)
+    except QueueFullError:
+        return server_busy()
 
     # Update Conversation History
-    conversation_history.append(input_text)
-    conversation_history.append(response)
+    remember(session_id, input_text, input_ids, response)
 
     return response  # Send the response back as text
 
 
+# Route for Streaming Chatbot Responses as Server-Sent Events
+@app.route('/chatbot/stream', methods=['POST'])
+def handle_prompt_stream():
+    data = json.loads(request.get_data(as_text=True))
+    input_text = data['prompt']
+    session_id = data.get('session_id', 'default')
+
+    start = time.perf_counter()
+    prompt_ids, input_ids = prepare_inputs(session_id, input_text)
+
+    # The worker generates; the streamer hands over text as tokens are decoded
+    streamer = TextIteratorStreamer(chatbot_loader.get().tokenizer, skip_prompt=True, skip_special_tokens=True)
+    try:
+        future = worker_loader.get().submit(prompt_ids, streamer)
+    except QueueFullError:
+        return server_busy()
+
+    def events():
+        first_token_time = None
+        for text in streamer:
+            if not text:
+                continue
+            if first_token_time is None:
+                first_token_time = time.perf_counter()
+            yield f"data: {json.dumps({'token': text})}\n\n"
+
+        remember(session_id, input_text, input_ids, future.result())
+
+        # Report time-to-first-token next to the total latency
+        end = time.perf_counter()
+        timings = {
+            "ttft_ms": round(((first_token_time or end) - start) * 1000, 1),
+            "total_ms": round((end - start) * 1000, 1),
+        }
+        app.logger.info(f"Streamed response: {timings}")
+        yield f"event: done\ndata: {json.dumps(timings)}\n\n"
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 if __name__ == '__main__':
-    app.run(debug=True) 
\ No newline at end of file
+    # Start loading right away; /ready turns 200 once it's done
+    worker_loader.load_in_background()
+    app.run(debug=True)
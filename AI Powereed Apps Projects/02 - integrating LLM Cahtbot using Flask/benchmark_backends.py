@@ -0,0 +1,80 @@
+import argparse
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+from inference_backends import BACKENDS
+
+model_name = "facebook/blenderbot-400M-distill"
+
+# Fixed prompts so every backend answers the same questions
+prompts = [
+    "hello, how are you doing?",
+    "what do you like to do on weekends?",
+    "can you recommend a good book?",
+    "what is your favorite food?",
+    "tell me something interesting about space.",
+    "do you have any pets?",
+    "what music do you listen to?",
+    "where would you like to travel?",
+]
+
+
+def measure(backend):
+    """Loads one backend, answers the prompts with greedy decoding and returns timings, memory and outputs."""
+    from transformers import AutoTokenizer
+    from inference_backends import load_model
+
+    start = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = load_model(model_name, backend)
+    load_seconds = time.perf_counter() - start
+
+    # Warm-up so the first timed prompt doesn't include one-off setup
+    model.generate(**tokenizer(prompts[0], return_tensors="pt"), do_sample=False, num_beams=1)
+
+    latencies, outputs = [], []
+    for prompt in prompts:
+        inputs = tokenizer(prompt, return_tensors="pt")
+        start = time.perf_counter()
+        out = model.generate(**inputs, do_sample=False, num_beams=1)
+        latencies.append(time.perf_counter() - start)
+        outputs.append(tokenizer.decode(out[0], skip_special_tokens=True).strip())
+
+    return {
+        "load_s": load_seconds,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": statistics.median(latencies) * 1000,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "outputs": outputs,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare latency, memory and outputs of the Blenderbot backends.")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--measure", choices=BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        # Child process: measure a single backend and report as JSON
+        print(json.dumps(measure(args.measure)))
+        sys.exit(0)
+
+    # Each backend runs in its own process so the memory figures don't include the others
+    results = {}
+    for backend in args.backends:
+        completed = subprocess.run([sys.executable, __file__, "--measure", backend],
+                                   capture_output=True, text=True, check=True)
+        results[backend] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    reference = results.get("torch", next(iter(results.values())))["outputs"]
+    print(f"{'backend':>8} {'load s':>8} {'mean ms':>9} {'p50 ms':>9} {'peak MB':>9} {'agreement':>10}")
+    for backend, result in results.items():
+        agreement = sum(a == b for a, b in zip(result["outputs"], reference)) / len(reference)
+        print(f"{backend:>8} {result['load_s']:>8.1f} {result['mean_ms']:>9.1f} {result['p50_ms']:>9.1f} "
+              f"{result['peak_rss_mb']:>9.0f} {agreement:>10.0%}")
@@ -0,0 +1,66 @@
+import argparse
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Fixed prompts so that runs are comparable
+prompts = [
+    "hello, how are you doing?",
+    "what do you like to do on weekends?",
+    "can you recommend a good book?",
+    "what is your favorite food?",
+    "tell me something interesting about space.",
+]
+
+
+def run_client(url, requests_per_client):
+    """Sends prompts one after another in a conversation of its own and times each request."""
+    session = requests.Session()
+    session_id = str(uuid.uuid4())
+    latencies, rejected = [], 0
+    for i in range(requests_per_client):
+        start = time.perf_counter()
+        response = session.post(url, json={"prompt": prompts[i % len(prompts)], "session_id": session_id})
+        if response.status_code == 503:
+            rejected += 1
+            time.sleep(float(response.headers.get("Retry-After", 1)))
+            continue
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return latencies, rejected
+
+
+def run_level(url, clients, requests_per_client):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        results = list(pool.map(lambda _: run_client(url, requests_per_client), range(clients)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+    rejected = sum(client_rejected for _, client_rejected in results)
+    if not latencies:
+        return {"throughput": 0.0, "p50_ms": float("nan"), "p99_ms": float("nan"), "rejected": rejected}
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "rejected": rejected,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive the /chatbot endpoint with increasing numbers of clients.")
+    parser.add_argument("--url", default="http://127.0.0.1:5000/chatbot", help="Chatbot endpoint")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64],
+                        help="Numbers of concurrent clients to try")
+    parser.add_argument("--requests", type=int, default=5, help="Requests sent by each client")
+    args = parser.parse_args()
+
+    print(f"{'clients':>8} {'resp/s':>8} {'p50 ms':>10} {'p99 ms':>10} {'503s':>6}")
+    for clients in args.clients:
+        result = run_level(args.url, clients, args.requests)
+        print(f"{clients:>8} {result['throughput']:>8.2f} {result['p50_ms']:>10.1f} "
+              f"{result['p99_ms']:>10.1f} {result['rejected']:>6}")
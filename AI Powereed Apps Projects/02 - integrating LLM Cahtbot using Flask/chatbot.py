@@ -1,11 +1,14 @@
-from transformers import AutoTokenizer, AutoTokenizer, AutoModelForSeq2SeqLM
+import os
+from transformers import AutoTokenizer
+from inference_backends import load_model
 
 # Model Configuration
 model_name = "facebook/blenderbot-400M-distill"  # Specify the Blenderbot model to use
 
 # Model Loading
-model = AutoModelForSeq2SeqLM.from_pretrained(model_name)  
+model = load_model(model_name, os.environ.get("CHAT_BACKEND", "torch"))
 # Load the pre-trained model (downloads it from the Hugging Face Hub if not already on your machine)
+# CHAT_BACKEND picks the inference backend: torch (default), int8 (dynamic quantization) or onnx (ONNX Runtime)
 
 tokenizer = AutoTokenizer.from_pretrained(model_name)
 # Load the tokenizer associated with the model (used for converting text to/from numbers)
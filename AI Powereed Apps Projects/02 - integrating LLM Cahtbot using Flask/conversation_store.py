@@ -0,0 +1,122 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class MemoryConversationStore:
+    """
+    Keeps each session's conversation in memory as (text, token_ids) turns.
+
+    Sessions idle for longer than `ttl_seconds` are dropped, and beyond `max_sessions`
+    the least recently used session is evicted. Only the last `max_turns` turns of a
+    session are kept, which is more than the model's context window can hold anyway.
+    """
+
+    def __init__(self, max_sessions=1000, ttl_seconds=3600, max_turns=64):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+        self._sessions = OrderedDict()  # session_id -> (last_used, deque of turns)
+        self._lock = threading.Lock()
+
+    def turns(self, session_id):
+        """Returns the stored (text, token_ids) turns of a session, oldest first."""
+        with self._lock:
+            self._expire()
+            entry = self._sessions.get(session_id)
+            return list(entry[1]) if entry else []
+
+    def append(self, session_id, text, token_ids):
+        """Adds a turn to a session."""
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            turns = entry[1] if entry else deque(maxlen=self.max_turns)
+            turns.append((text, list(token_ids)))
+            self._sessions[session_id] = (time.monotonic(), turns)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def _expire(self):
+        # Sessions are ordered by last use, so expired ones are at the front
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._sessions:
+            session_id, (last_used, _) = next(iter(self._sessions.items()))
+            if last_used >= cutoff:
+                break
+            del self._sessions[session_id]
+
+
+class SQLiteConversationStore:
+    """Same as MemoryConversationStore, but persisted to an SQLite file so history survives restarts."""
+
+    def __init__(self, path, ttl_seconds=3600, max_turns=64):
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS turns ("
+            "session_id TEXT NOT NULL, seq INTEGER NOT NULL, text TEXT NOT NULL, token_ids TEXT NOT NULL, "
+            "created REAL NOT NULL, PRIMARY KEY (session_id, seq))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS turns_created ON turns (created)")
+        self._db.commit()
+
+    def turns(self, session_id):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT text, token_ids FROM turns WHERE session_id = ? AND created >= ? ORDER BY seq",
+                (session_id, time.time() - self.ttl_seconds)
+            ).fetchall()
+        return [(text, json.loads(token_ids)) for text, token_ids in rows]
+
+    def append(self, session_id, text, token_ids):
+        with self._lock:
+            now = time.time()
+            seq = self._db.execute(
+                "SELECT COALESCE(MAX(seq), -1) + 1 FROM turns WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+            self._db.execute(
+                "INSERT INTO turns (session_id, seq, text, token_ids, created) VALUES (?, ?, ?, ?, ?)",
+                (session_id, seq, text, json.dumps(list(token_ids)), now)
+            )
+            # Keep the last max_turns turns of this session and drop expired turns everywhere
+            self._db.execute("DELETE FROM turns WHERE session_id = ? AND seq <= ?", (session_id, seq - self.max_turns))
+            self._db.execute("DELETE FROM turns WHERE created < ?", (now - self.ttl_seconds,))
+            self._db.commit()
+
+
+def build_prompt_ids(turns, input_ids, max_tokens, separator_ids, eos_token_id):
+    """
+    Builds the model input from the newest turns that fit in `max_tokens`.
+
+    The already tokenized turns are walked from newest to oldest until the budget left
+    after the new input is used up, so the cost doesn't grow with the length of the conversation.
+
+    Args:
+        turns (list): (text, token_ids) turns, oldest first.
+        input_ids (list): Token ids of the new user message.
+        max_tokens (int): Maximum input length of the model.
+        separator_ids (list): Token ids placed between turns.
+        eos_token_id (int): Token id that ends the input.
+
+    Returns:
+        list: The token ids to feed to the model.
+    """
+    input_ids = input_ids[-(max_tokens - 1):]
+    budget = max_tokens - 1 - len(input_ids)
+
+    window = []
+    for _, token_ids in reversed(turns):
+        cost = len(token_ids) + len(separator_ids)
+        if cost > budget:
+            break
+        window.append(token_ids)
+        budget -= cost
+
+    prompt_ids = []
+    for token_ids in reversed(window):
+        prompt_ids += token_ids + separator_ids
+    return prompt_ids + input_ids + [eos_token_id]
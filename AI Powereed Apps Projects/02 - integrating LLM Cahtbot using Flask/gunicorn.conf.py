@@ -0,0 +1,19 @@
+# Run with: gunicorn -c gunicorn.conf.py app:app
+import os
+
+bind = "0.0.0.0:5000"
+workers = int(os.environ.get("GUNICORN_WORKERS", 2))
+# Handlers mostly wait on the inference worker, so each process serves several at once
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+timeout = 300
+
+# CHAT_PRELOAD=1 loads the model once in the master before forking, so the workers
+# share its memory pages instead of each loading a copy
+preload_app = os.environ.get("CHAT_PRELOAD") == "1"
+
+
+def post_worker_init(worker):
+    # Warm up each worker as soon as it starts instead of on its first request
+    from app import worker_loader
+    worker_loader.load_in_background()
@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+
+import torch
+from filelock import FileLock
+from torch.ao.quantization import quantize_dynamic
+from transformers import AutoModelForSeq2SeqLM
+
+# Names accepted by load_model
+BACKENDS = ("torch", "int8", "onnx")
+
+
+def load_model(model_name, backend="torch", cache_dir="onnx_models"):
+    """
+    Loads a seq2seq model for CPU inference with the chosen backend.
+
+    Every backend returns an object with the usual `generate(**inputs)` method, so callers
+    don't need to know which one is in use.
+
+    Args:
+        model_name (str): Hugging Face model id.
+        backend (str): "torch" for the fp32 PyTorch model, "int8" for PyTorch dynamic int8
+            quantization of the Linear layers, or "onnx" for an ONNX Runtime export.
+        cache_dir (str): Where the ONNX export is saved, so it only has to be built once.
+
+    Returns:
+        The loaded model.
+    """
+    if backend == "torch":
+        return AutoModelForSeq2SeqLM.from_pretrained(model_name).eval()
+
+    if backend == "int8":
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name).eval()
+        return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    if backend == "onnx":
+        try:
+            from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        except ImportError:
+            raise ImportError("The onnx backend needs optimum with ONNX Runtime: pip install optimum[onnxruntime]")
+
+        export_dir = os.path.join(cache_dir, model_name.replace("/", "--"))
+        os.makedirs(cache_dir, exist_ok=True)
+        # gunicorn workers start together: one of them exports while the others wait, then load its export
+        with FileLock(export_dir + ".lock"):
+            if os.path.isdir(export_dir):
+                return ORTModelForSeq2SeqLM.from_pretrained(export_dir)
+            model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True)
+            # Saved to a temporary directory and moved into place once complete, so an export
+            # interrupted by a crash is never mistaken for a finished one
+            partial_dir = tempfile.mkdtemp(prefix=".export-", dir=cache_dir)
+            try:
+                model.save_pretrained(partial_dir)
+                os.replace(partial_dir, export_dir)
+            except BaseException:
+                shutil.rmtree(partial_dir, ignore_errors=True)
+                raise
+            return model
+
+    raise ValueError(f"Unknown backend {backend!r}, expected one of {', '.join(BACKENDS)}")
@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class QueueFullError(Exception):
+    """Raised when the worker already has `max_queue` requests waiting."""
+
+
+class InferenceWorker:
+    """
+    Owns the model and runs every generation on one dedicated thread.
+
+    Request handlers only enqueue token ids and wait. The worker takes the first waiting
+    request, gathers up to `max_batch_size` requests that arrive within `max_wait_ms`,
+    pads them into one batch and runs a single `model.generate` call. Requests that
+    stream their output are generated on their own and without beam search, since a streamer
+    follows one sequence.
+    """
+
+    def __init__(self, model, tokenizer, max_batch_size=8, max_wait_ms=10, max_queue=64):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._deferred = []  # Streaming requests pulled from the queue while gathering a batch
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt_ids, streamer=None):
+        """
+        Queues a generation request.
+
+        Args:
+            prompt_ids (list): Token ids of the model input.
+            streamer (TextIteratorStreamer, optional): Receives the tokens as they are generated.
+
+        Returns:
+            Future: Resolves to the decoded response.
+
+        Raises:
+            QueueFullError: If the queue is at its maximum depth.
+        """
+        future = Future()
+        try:
+            self._queue.put_nowait((prompt_ids, streamer, future))
+        except queue.Full:
+            raise QueueFullError(f"{self._queue.maxsize} requests are already waiting")
+        return future
+
+    def generate(self, prompt_ids, timeout=None):
+        """Queues a request and blocks until its response is ready."""
+        return self.submit(prompt_ids).result(timeout)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        if batch[0][1] is not None:
+            return batch
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request[1] is not None:
+                # Streaming requests run alone; handle it right after this batch
+                self._deferred.append(request)
+                break
+            batch.append(request)
+        return batch
+
+    def _run_batch(self, batch):
+        try:
+            inputs = self.tokenizer.pad({"input_ids": [prompt_ids for prompt_ids, _, _ in batch]},
+                                        return_tensors="pt")
+            streamer = batch[0][1]
+            if streamer is not None:
+                # A streamer follows one sequence, so turn off any beam search the model's generation config asks for
+                outputs = self.model.generate(**inputs, streamer=streamer, num_beams=1)
+            else:
+                outputs = self.model.generate(**inputs)
+            responses = self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+        except Exception as e:
+            if batch[0][1] is not None:
+                batch[0][1].end()  # Unblock the reader of the stream
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, _, future), response in zip(batch, responses):
+            future.set_result(response.strip())
+
+    def _run(self):
+        while True:
+            batch = [self._deferred.pop()] if self._deferred else self._collect()
+            self._run_batch(batch)
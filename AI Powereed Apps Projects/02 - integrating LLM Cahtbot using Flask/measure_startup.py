@@ -0,0 +1,94 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+
+def build_stand_in(path):
+    """
+    Saves a model with the architecture and generation settings of facebook/blenderbot-400M-distill
+    but random weights, and a word-level tokenizer of the same vocabulary size, to `path`.
+
+    Loading and warming it up costs the same time and memory as the real model, so the startup can
+    be measured without downloading it.
+    """
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import BlenderbotConfig, BlenderbotForConditionalGeneration, PreTrainedTokenizerFast
+
+    config = BlenderbotConfig(vocab_size=8008, d_model=1280, encoder_layers=2, decoder_layers=12,
+                              encoder_attention_heads=32, decoder_attention_heads=32, encoder_ffn_dim=5120,
+                              decoder_ffn_dim=5120, max_position_embeddings=128, scale_embedding=True,
+                              pad_token_id=0, bos_token_id=1, eos_token_id=2, decoder_start_token_id=1)
+    model = BlenderbotForConditionalGeneration(config)
+    model.generation_config.update(num_beams=10, max_length=60, min_length=20, length_penalty=0.65,
+                                   no_repeat_ngram_size=3)
+    model.save_pretrained(path)
+
+    vocab = {token: i for i, token in enumerate(["<pad>", "<s>", "</s>", "<unk>"] + [f"w{i}" for i in range(8004)])}
+    words = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    words.pre_tokenizer = pre_tokenizers.Whitespace()
+    PreTrainedTokenizerFast(tokenizer_object=words, pad_token="<pad>", bos_token="<s>", eos_token="</s>",
+                            unk_token="<unk>", model_max_length=128).save_pretrained(path)
+
+
+def measure(preload, workers, port, timeout, model=None):
+    """
+    Starts gunicorn, waits until every worker reports ready and returns their /ready reports.
+    """
+    env = dict(os.environ, CHAT_PRELOAD="1" if preload else "0", GUNICORN_WORKERS=str(workers))
+    if model:
+        env["CHAT_MODEL"] = model
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}", "app:app"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    reports = {}
+    try:
+        deadline = time.monotonic() + timeout
+        # Each request may land on any worker; keep asking until all of them have answered ready
+        while len(reports) < workers and time.monotonic() < deadline:
+            try:
+                response = requests.get(f"http://127.0.0.1:{port}/ready", headers={"Connection": "close"}, timeout=5)
+                if response.status_code == 200:
+                    report = response.json()
+                    reports[report["pid"]] = report
+            except requests.exceptions.RequestException:
+                pass
+            time.sleep(0.2)
+    finally:
+        server.terminate()
+        server.wait()
+    return list(reports.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare time-to-ready and per-worker memory with and without preload.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--model", help="Model to serve (CHAT_MODEL) instead of facebook/blenderbot-400M-distill")
+    parser.add_argument("--stand-in", metavar="DIR",
+                        help="Serve a random-weight model of the same size, built in DIR if it isn't there yet "
+                             "(for measuring without downloading the model)")
+    args = parser.parse_args()
+
+    model = args.model
+    if args.stand_in:
+        if not os.path.isdir(args.stand_in):
+            build_stand_in(args.stand_in)
+        model = os.path.abspath(args.stand_in)
+
+    for preload in (False, True):
+        reports = measure(preload, args.workers, args.port, args.timeout, model)
+        print(f"\n{'preload' if preload else 'lazy, per worker'}: {len(reports)}/{args.workers} workers ready")
+        print(f"{'pid':>8} {'ready s':>8} {'load s':>8} {'warm s':>8} {'RSS MB':>8} {'PSS MB':>8} {'shared MB':>10}")
+        for report in sorted(reports, key=lambda r: r["time_to_ready_s"]):
+            memory = report["memory_mb"]
+            print(f"{report['pid']:>8} {report['time_to_ready_s']:>8.1f} {report['model_load_s']:>8.1f} "
+                  f"{report['warm_up_s']:>8.1f} {memory.get('rss', 0):>8.0f} {memory.get('pss', 0):>8.0f} "
+                  f"{memory.get('shared', 0):>10.0f}")
+        if reports:
+            print(f"total PSS: {sum(r['memory_mb'].get('pss', 0) for r in reports):.0f} MB")
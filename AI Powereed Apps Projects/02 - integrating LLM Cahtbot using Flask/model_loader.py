@@ -0,0 +1,86 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LazyLoader:
+    """
+    Runs `load` once, the first time the value is needed, no matter how many threads ask for it at once.
+
+    `ready` tells whether loading has finished, and `load_in_background` starts it without
+    blocking so a readiness probe can return right away. If loading fails, the exception is
+    logged and kept in `error` until a later attempt succeeds.
+    """
+
+    def __init__(self, load):
+        self._load = load
+        self._lock = threading.Lock()
+        self._value = None
+        self._thread = None
+        self._thread_lock = threading.Lock()  # Separate from _lock, which is held for the whole load
+        self.load_seconds = None
+        self.ready_at = None  # time.monotonic() when loading finished
+        self.error = None     # The exception of the last failed attempt
+
+    @property
+    def ready(self):
+        return self._value is not None
+
+    def get(self):
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    start = time.perf_counter()
+                    try:
+                        self._value = self._load()
+                    except Exception as e:
+                        logger.exception(f"Loading failed: {e}")
+                        self.error = e
+                        raise
+                    self.error = None
+                    self.load_seconds = time.perf_counter() - start
+                    self.ready_at = time.monotonic()
+        return self._value
+
+    def load_in_background(self):
+        """Starts loading on a background thread, unless it is loaded or already loading."""
+        with self._thread_lock:
+            if self._value is None and self._thread is None:
+                self._thread = threading.Thread(target=self._load_in_thread, daemon=True)
+                self._thread.start()
+
+    def _load_in_thread(self):
+        try:
+            self.get()
+        except Exception:
+            pass  # Logged and kept in `error`; the next load_in_background tries again
+        finally:
+            with self._thread_lock:
+                self._thread = None
+
+
+def memory_usage_mb():
+    """
+    Returns the resident memory of this process in MB.
+
+    `pss` splits pages shared with other processes (e.g. forked gunicorn workers) between
+    them, so summing it over the workers gives their real combined footprint.
+    """
+    usage = {}
+    try:
+        with open("/proc/self/smaps_rollup") as smaps:
+            for line in smaps:
+                name, _, value = line.partition(":")
+                if name in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty"):
+                    usage[name.lower()] = int(value.split()[0]) / 1024
+    except OSError:
+        # Not Linux: fall back to the peak resident size
+        import resource
+        import sys
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        usage["rss"] = maxrss / 2 ** 20 if sys.platform == "darwin" else maxrss / 1024
+    if "shared_clean" in usage:
+        usage["shared"] = usage.pop("shared_clean") + usage.pop("shared_dirty", 0)
+    return usage
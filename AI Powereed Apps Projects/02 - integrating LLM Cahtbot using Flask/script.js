@@ -1,5 +1,6 @@
 let savedpasttext = []; // Variable to store the message
 let savedpastresponse = []; // Variable to store the message
+const sessionId = crypto.randomUUID(); // Identifies this conversation to the server
 
 // Section: get the Id of the talking container
 const messagesContainer = document.getElementById('messages-container');
@@ -24,6 +25,7 @@ const addMessage = (message, role, imgSrc) => {
   var clearDiv = document.createElement("div");
   clearDiv.style.clear = "both";
   messagesContainer.appendChild(clearDiv);
+  return textElement;
 };
 //
 
@@ -41,52 +43,92 @@ const sendMessage = async (message) => {
   messagesContainer.appendChild(loadingElement);
   messagesContainer.appendChild(loadingtextElement);
 
-  async function makePostRequest(msg) {
-    const url = 'https://nagiat2019-5000.theianext-1-labs-prod-misc-tools-us-east-0.proxy.cognitiveclass.ai/chatbot';  // Make a POST request to this url
+  // Deleting the loading animation
+  const removeLoading = () => {
+    const loadanimation = document.querySelector('.loading-animation');
+    const loadtxt = document.querySelector('.loading-text');
+    if (loadanimation) loadanimation.remove();
+    if (loadtxt) loadtxt.remove();
+  };
+
+  // Stream the response: the server sends each decoded token as a Server-Sent Event
+  async function makeStreamRequest(msg, onText) {
+    const url = 'https://nagiat2019-5000.theianext-1-labs-prod-misc-tools-us-east-0.proxy.cognitiveclass.ai/chatbot/stream';  // Make a POST request to this url
     const requestBody = {
-      prompt: msg
+      prompt: msg,
+      session_id: sessionId
     };
-  
-    try {
-      const response = await fetch(url, {
+    const requestStart = performance.now();
+    let firstTokenTime = null;
+
+    // The server answers 503 when its queue is full; back off and retry a few times
+    let response;
+    for (let attempt = 0; ; attempt++) {
+      response = await fetch(url, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json'
         },
         body: JSON.stringify(requestBody)
       });
-  
-      const data = await response.text();
-      // Handle the response data here
-      console.log(data);
-      return data;
-    } catch (error) {
-      // Handle any errors that occurred during the request
-      console.error('Error:', error);
-      return error
+      if (response.status !== 503 || attempt >= 3) break;
+      const retryAfter = Number(response.headers.get('Retry-After')) || 1;
+      await new Promise((resolve) => setTimeout(resolve, retryAfter * 1000 * 2 ** attempt));
+    }
+    if (!response.ok) {
+      throw new Error(`The chatbot answered with status ${response.status}`);
     }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let text = '';
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      // Events are separated by a blank line; keep any incomplete event for the next chunk
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+      for (const event of events) {
+        const dataLine = event.split('\n').find((line) => line.startsWith('data: '));
+        if (!dataLine) continue;
+        const payload = JSON.parse(dataLine.slice(6));
+        if (event.startsWith('event: done')) {
+          // Time-to-first-token next to total latency, as seen by the server and the browser
+          console.log('Server timings:', payload);
+          console.log('Client timings:', {
+            ttft_ms: (firstTokenTime || performance.now()) - requestStart,
+            total_ms: performance.now() - requestStart
+          });
+        } else {
+          if (firstTokenTime === null) firstTokenTime = performance.now();
+          text += payload.token;
+          onText(text);
+        }
+      }
+    }
+    return text;
   }
-  
-  var res = await makePostRequest(message);
-  
-  data = {"response": res};
-  
-  // Deleting the loading animation
-  const loadanimation = document.querySelector('.loading-animation');
-  const loadtxt = document.querySelector('.loading-text');
-  loadanimation.remove();
-  loadtxt.remove();
 
-  if (data.error) {
-    // Handle the error here
-    const errorMessage = JSON.stringify(data);
+  let responseElement = null;
+  try {
+    await makeStreamRequest(message, (text) => {
+      // Replace the loading animation with the bot's message on the first token
+      if (responseElement === null) {
+        removeLoading();
+        responseElement = addMessage('', 'aibot', '../static/Bot_logo.png');
+      }
+      responseElement.innerText = text;
+    });
+    removeLoading();
+  } catch (error) {
+    // Handle any errors that occurred during the request
+    console.error('Error:', error);
+    removeLoading();
+    const errorMessage = JSON.stringify({ error: error.toString() });
     // addMessage(errorMessage, 'error','Error.png');
     addMessage(errorMessage, 'error','../static/Error.png');
-  } else {
-    // Process the normal response here
-    const responseMessage = data['response'];
-    // addMessage(responseMessage, 'aibot','Bot_logo.png');
-    addMessage(responseMessage, 'aibot','../static/Bot_logo.png');
   }
   
   //!!!!! code to  save the content in history
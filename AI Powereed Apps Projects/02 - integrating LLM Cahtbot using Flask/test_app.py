@@ -0,0 +1,135 @@
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+import torch
+from transformers import BlenderbotConfig, BlenderbotForConditionalGeneration
+
+import app as chat_app
+from inference_worker import InferenceWorker, QueueFullError
+from model_loader import LazyLoader
+
+PAD, BOS, EOS = 0, 1, 2
+
+
+class StubTokenizer:
+    """Word-level tokenizer for the tiny model: id n (3 <= n < 50) is the word "wn"."""
+
+    model_max_length = 32
+    eos_token_id = EOS
+    pad_token_id = PAD
+
+    def __call__(self, text, add_special_tokens=True):
+        ids = [3 + sum(map(ord, word)) % 47 for word in text.split()]
+        return {"input_ids": ids + [EOS] if add_special_tokens else ids}
+
+    def pad(self, features, return_tensors="pt"):
+        rows = features["input_ids"]
+        width = max(map(len, rows))
+        return {
+            "input_ids": torch.tensor([row + [PAD] * (width - len(row)) for row in rows]),
+            "attention_mask": torch.tensor([[1] * len(row) + [0] * (width - len(row)) for row in rows]),
+        }
+
+    def decode(self, ids, skip_special_tokens=True, **kwargs):
+        ids = ids.tolist() if hasattr(ids, "tolist") else ids
+        return " ".join(f"w{i}" for i in ids if i > EOS or not skip_special_tokens)
+
+    def batch_decode(self, rows, skip_special_tokens=True):
+        return [self.decode(row, skip_special_tokens) for row in rows]
+
+
+def tiny_blenderbot(num_beams):
+    torch.manual_seed(0)
+    config = BlenderbotConfig(vocab_size=50, d_model=16, encoder_layers=1, decoder_layers=1, encoder_attention_heads=2,
+                              decoder_attention_heads=2, encoder_ffn_dim=32, decoder_ffn_dim=32,
+                              max_position_embeddings=64, pad_token_id=PAD, bos_token_id=BOS, eos_token_id=EOS,
+                              decoder_start_token_id=BOS)
+    model = BlenderbotForConditionalGeneration(config).eval()
+    model.generation_config.num_beams = num_beams  # Like BlenderBot's own generation config
+    model.generation_config.max_length = 10
+    model.generation_config.min_length = 6
+    return model
+
+
+@pytest.fixture
+def chatbot(monkeypatch):
+    """The app with a tiny random BlenderBot that generates with beam search by default."""
+    tokenizer = StubTokenizer()
+    bot = SimpleNamespace(tokenizer=tokenizer, model=tiny_blenderbot(num_beams=4),
+                          separator_ids=tokenizer("\n", add_special_tokens=False)["input_ids"])
+    monkeypatch.setattr(chat_app, "chatbot_loader", LazyLoader(lambda: bot))
+    monkeypatch.setattr(chat_app, "worker_loader", LazyLoader(lambda: InferenceWorker(bot.model, tokenizer)))
+    monkeypatch.setattr(chat_app, "conversation_store", chat_app.MemoryConversationStore())
+    return chat_app.app.test_client()
+
+
+def sse_events(body):
+    events = []
+    for block in body.decode().strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines.get("event", "message"), json.loads(lines["data"])))
+    return events
+
+
+def test_stream_answers_with_a_beam_search_model(chatbot):
+    response = chatbot.post("/chatbot/stream", data=json.dumps({"prompt": "hello there", "session_id": "a"}))
+
+    assert response.status_code == 200 and response.mimetype == "text/event-stream"
+    events = sse_events(response.get_data())
+    tokens = "".join(data["token"] for kind, data in events if kind == "message")
+    assert tokens.strip()
+    assert events[-1][0] == "done" and events[-1][1]["ttft_ms"] <= events[-1][1]["total_ms"]
+    # The streamed reply is remembered as the bot's turn of the conversation
+    turns = chat_app.conversation_store.turns("a")
+    assert [text for text, _ in turns] == ["hello there", tokens.strip()]
+
+
+def test_batched_and_streamed_requests_share_the_worker(chatbot):
+    reply = chatbot.post("/chatbot", data=json.dumps({"prompt": "hello", "session_id": "b"})).get_data(as_text=True)
+    streamed = chatbot.post("/chatbot/stream", data=json.dumps({"prompt": "hello again", "session_id": "b"}))
+
+    assert reply.strip()
+    assert sse_events(streamed.get_data())[-1][0] == "done"
+    assert len(chat_app.conversation_store.turns("b")) == 4
+
+
+def test_ready_reports_a_failed_load_and_retries(chatbot, monkeypatch):
+    attempts = []
+
+    def start_worker():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("out of memory")
+        return chat_app.start_worker()
+
+    monkeypatch.setattr(chat_app, "worker_loader", LazyLoader(start_worker))
+    response = chatbot.get("/ready")
+    assert response.status_code == 503 and response.get_json() == {"ready": False}
+    assert wait_until(lambda: chat_app.worker_loader.error is not None and chat_app.worker_loader._thread is None)
+
+    response = chatbot.get("/ready")  # Reports the error and starts another attempt
+    assert response.status_code == 503 and response.get_json()["error"] == "RuntimeError: out of memory"
+    assert wait_until(lambda: chat_app.worker_loader.ready, timeout=60)
+
+    report = chatbot.get("/ready").get_json()
+    assert report["ready"] and report["warm_up_s"] >= 0 and report["memory_mb"]["rss"] > 0
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_full_worker_queue_answers_busy(chatbot, monkeypatch):
+    def submit(prompt_ids, streamer=None):
+        raise QueueFullError("64 requests are already waiting")
+
+    monkeypatch.setattr(chat_app, "worker_loader", LazyLoader(lambda: SimpleNamespace(submit=submit)))
+    response = chatbot.post("/chatbot/stream", data=json.dumps({"prompt": "hello", "session_id": "c"}))
+
+    assert response.status_code == 503 and response.headers["Retry-After"] == "1"
+    assert chat_app.conversation_store.turns("c") == []
@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+
+import pytest
+
+import conversation_store
+from conversation_store import MemoryConversationStore, SQLiteConversationStore, build_prompt_ids
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(conversation_store, "time", SimpleNamespace(monotonic=clock, time=clock))
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "memory":
+            return MemoryConversationStore(**kwargs)
+        return SQLiteConversationStore(str(tmp_path / "history.sqlite3"), **kwargs)
+    return make
+
+
+def test_only_the_last_turns_are_kept(make_store, clock):
+    store = make_store(max_turns=3)
+    for n in range(5):
+        store.append("a", f"turn {n}", [n])
+    store.append("b", "other", [9])
+
+    assert store.turns("a") == [("turn 2", [2]), ("turn 3", [3]), ("turn 4", [4])]
+    assert store.turns("b") == [("other", [9])]
+    assert store.turns("unknown") == []
+
+
+def test_idle_sessions_expire(make_store, clock):
+    store = make_store(ttl_seconds=60)
+    store.append("old", "hello", [1])
+    clock.now += 30
+    store.append("recent", "hi", [2])
+
+    clock.now += 40  # "old" is 70 s old, "recent" 40 s
+    assert store.turns("old") == []
+    assert store.turns("recent") == [("hi", [2])]
+
+
+def test_memory_store_evicts_the_least_recently_used_session():
+    store = MemoryConversationStore(max_sessions=2)
+    store.append("a", "1", [1])
+    store.append("b", "2", [2])
+    store.append("a", "3", [3])  # "b" is now the least recently used
+    store.append("c", "4", [4])
+
+    assert store.turns("b") == []
+    assert [text for text, _ in store.turns("a")] == ["1", "3"]
+
+
+def test_sqlite_history_survives_a_restart(tmp_path):
+    path = str(tmp_path / "history.sqlite3")
+    SQLiteConversationStore(path).append("a", "hello", [1, 2])
+    assert SQLiteConversationStore(path).turns("a") == [("hello", [1, 2])]
+
+
+def test_prompt_keeps_the_newest_turns_that_fit():
+    turns = [("t0", [10, 10, 10]), ("t1", [11, 11]), ("t2", [12])]
+    # 10 tokens: 2 of input, 1 EOS, then turns plus a 1-token separator each from the newest
+    assert build_prompt_ids(turns, [1, 2], 10, [0], 99) == [11, 11, 0, 12, 0, 1, 2, 99]
+    assert build_prompt_ids(turns, [1, 2], 4, [0], 99) == [1, 2, 99]
+    # An input longer than the model's context keeps its end
+    assert build_prompt_ids(turns, list(range(1, 8)), 4, [0], 99) == [5, 6, 7, 99]
@@ -0,0 +1,108 @@
+import os
+import sys
+import threading
+import time
+import types
+
+import pytest
+import torch
+
+import inference_backends
+from inference_backends import load_model
+
+
+class StubAutoModel:
+    """Stands in for AutoModelForSeq2SeqLM: a small torch model with a Linear layer."""
+
+    @staticmethod
+    def from_pretrained(model_name):
+        return torch.nn.Sequential(torch.nn.Linear(8, 8), torch.nn.ReLU()).train()
+
+
+class StubORTModel:
+    """Stands in for optimum's ORTModelForSeq2SeqLM; records exports and can fail while saving."""
+
+    exports = 0
+    fail_saving = False
+    lock = threading.Lock()
+
+    def __init__(self, source):
+        self.source = source
+
+    @classmethod
+    def from_pretrained(cls, name, export=False):
+        if export:
+            with cls.lock:
+                cls.exports += 1
+            time.sleep(0.2)  # Long enough for concurrent loads to overlap
+        elif not os.path.exists(os.path.join(name, "model.onnx")):
+            raise OSError(f"{name} has no model.onnx")
+        return cls(name)
+
+    def save_pretrained(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "config.json"), "w") as f:
+            f.write("{}")
+        if self.fail_saving:
+            raise RuntimeError("killed while saving")
+        with open(os.path.join(directory, "model.onnx"), "wb") as f:
+            f.write(b"onnx")
+
+
+@pytest.fixture(autouse=True)
+def stubs(monkeypatch):
+    monkeypatch.setattr(inference_backends, "AutoModelForSeq2SeqLM", StubAutoModel)
+    onnxruntime = types.ModuleType("optimum.onnxruntime")
+    onnxruntime.ORTModelForSeq2SeqLM = StubORTModel
+    monkeypatch.setitem(sys.modules, "optimum", types.ModuleType("optimum"))
+    monkeypatch.setitem(sys.modules, "optimum.onnxruntime", onnxruntime)
+    monkeypatch.setattr(StubORTModel, "exports", 0)
+    monkeypatch.setattr(StubORTModel, "fail_saving", False)
+
+
+def test_torch_backend_is_in_eval_mode():
+    model = load_model("bot", "torch")
+    assert isinstance(model[0], torch.nn.Linear) and not model.training
+
+
+def test_int8_backend_quantizes_the_linear_layers():
+    model = load_model("bot", "int8")
+    assert isinstance(model[0], torch.ao.nn.quantized.dynamic.Linear)
+    assert model(torch.ones(1, 8)).shape == (1, 8)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError, match="expected one of torch, int8, onnx"):
+        load_model("bot", "tensorrt")
+
+
+def test_onnx_export_is_built_once_and_reused(tmp_path):
+    model = load_model("facebook/bot", "onnx", cache_dir=str(tmp_path))
+    assert model.source == "facebook/bot" and StubORTModel.exports == 1
+    assert sorted(os.listdir(tmp_path / "facebook--bot")) == ["config.json", "model.onnx"]
+
+    model = load_model("facebook/bot", "onnx", cache_dir=str(tmp_path))
+    assert model.source == str(tmp_path / "facebook--bot") and StubORTModel.exports == 1
+
+
+def test_concurrent_workers_export_once(tmp_path):
+    models = []
+    workers = [threading.Thread(target=lambda: models.append(load_model("facebook/bot", "onnx", cache_dir=str(tmp_path))))
+               for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert len(models) == 4 and StubORTModel.exports == 1
+
+
+def test_interrupted_export_is_not_mistaken_for_a_finished_one(tmp_path, monkeypatch):
+    monkeypatch.setattr(StubORTModel, "fail_saving", True)
+    with pytest.raises(RuntimeError):
+        load_model("facebook/bot", "onnx", cache_dir=str(tmp_path))
+    assert not (tmp_path / "facebook--bot").exists()
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".export-")]
+
+    monkeypatch.setattr(StubORTModel, "fail_saving", False)
+    load_model("facebook/bot", "onnx", cache_dir=str(tmp_path))
+    assert StubORTModel.exports == 2 and (tmp_path / "facebook--bot" / "model.onnx").exists()
@@ -0,0 +1,107 @@
+import threading
+
+import pytest
+import torch
+
+from inference_worker import InferenceWorker, QueueFullError
+
+PAD = 0
+
+
+class EchoTokenizer:
+    def pad(self, features, return_tensors="pt"):
+        rows = features["input_ids"]
+        width = max(map(len, rows))
+        return {
+            "input_ids": torch.tensor([row + [PAD] * (width - len(row)) for row in rows]),
+            "attention_mask": torch.tensor([[1] * len(row) + [0] * (width - len(row)) for row in rows]),
+        }
+
+    def batch_decode(self, rows, skip_special_tokens=True):
+        return [" ".join(str(i) for i in row.tolist() if i != PAD) for row in rows]
+
+
+class EchoModel:
+    """Answers every prompt with its own ids and records the batches; the first call waits for `release`."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def generate(self, input_ids, attention_mask, streamer=None, **kwargs):
+        if not self.calls:
+            self.started.set()
+            self.release.wait(5)
+        self.calls.append({"prompts": input_ids.tolist(), "streamer": streamer, **kwargs})
+        if self.fail:
+            raise RuntimeError("CUDA out of memory")
+        return input_ids
+
+
+class Streamer:
+    def __init__(self):
+        self.ended = False
+
+    def end(self):
+        self.ended = True
+
+
+def busy_worker(model, **kwargs):
+    """A worker whose first request holds the model until `model.release` is set."""
+    worker = InferenceWorker(model, EchoTokenizer(), **kwargs)
+    first = worker.submit([9])
+    assert model.started.wait(5)
+    return worker, first
+
+
+def test_waiting_requests_are_batched_and_streams_run_alone():
+    model = EchoModel()
+    worker, first = busy_worker(model, max_batch_size=8, max_wait_ms=200)
+    batched = [worker.submit([n]) for n in (1, 2, 3)]
+    streamer = Streamer()
+    streamed = worker.submit([4, 4], streamer)
+    later = [worker.submit([n]) for n in (5, 6)]
+    model.release.set()
+
+    assert [future.result(5) for future in batched + [streamed] + later] == ["1", "2", "3", "4 4", "5", "6"]
+    assert first.result(5) == "9"
+    # The stream is deferred past the batch it interrupted, generated on its own without beam search
+    assert [call["prompts"] for call in model.calls] == [[[9]], [[1], [2], [3]], [[4, 4]], [[5], [6]]]
+    assert model.calls[2]["streamer"] is streamer and model.calls[2]["num_beams"] == 1
+    assert "num_beams" not in model.calls[1]
+
+
+def test_batches_are_capped_at_max_batch_size():
+    model = EchoModel()
+    worker, _ = busy_worker(model, max_batch_size=2, max_wait_ms=200)
+    futures = [worker.submit([n]) for n in range(1, 6)]
+    model.release.set()
+
+    assert [future.result(5) for future in futures] == ["1", "2", "3", "4", "5"]
+    assert [len(call["prompts"]) for call in model.calls] == [1, 2, 2, 1]
+
+
+def test_full_queue_is_refused():
+    model = EchoModel()
+    worker, _ = busy_worker(model, max_queue=2)
+    worker.submit([1])
+    worker.submit([2])
+    assert worker.queue_depth() == 2
+    with pytest.raises(QueueFullError):
+        worker.submit([3])
+    model.release.set()
+
+
+def test_failed_generation_fails_the_batch_and_ends_the_stream():
+    model = EchoModel(fail=True)
+    worker, first = busy_worker(model, max_wait_ms=200)
+    streamer = Streamer()
+    streamed = worker.submit([1], streamer)
+    model.release.set()
+
+    for future in (first, streamed):
+        with pytest.raises(RuntimeError, match="out of memory"):
+            future.result(5)
+    assert streamer.ended
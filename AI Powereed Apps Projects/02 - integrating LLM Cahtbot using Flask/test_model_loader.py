@@ -0,0 +1,65 @@
+import logging
+import threading
+import time
+
+import pytest
+
+from model_loader import LazyLoader, memory_usage_mb
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_loads_once_for_concurrent_callers():
+    calls = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.1)
+        return "model"
+
+    loader = LazyLoader(load)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(loader.get())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["model"] * 8 and calls == [1]
+    assert loader.ready and loader.load_seconds >= 0.1 and loader.ready_at is not None
+
+
+def test_failed_background_load_is_reported_and_retried(caplog):
+    attempts = []
+
+    def load():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("model files not found")
+        return "model"
+
+    loader = LazyLoader(load)
+    with caplog.at_level(logging.ERROR, logger="model_loader"):
+        loader.load_in_background()
+        assert wait_until(lambda: loader.error is not None and loader._thread is None)
+    assert not loader.ready and isinstance(loader.error, OSError)
+    assert "model files not found" in caplog.text
+
+    loader.load_in_background()
+    assert wait_until(lambda: loader.ready)
+    assert loader.get() == "model" and loader.error is None and len(attempts) == 2
+
+
+def test_get_raises_the_load_error():
+    loader = LazyLoader(lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        loader.get()
+    assert isinstance(loader.error, ZeroDivisionError) and not loader.ready
+
+
+def test_memory_usage_reports_resident_memory():
+    assert memory_usage_mb()["rss"] > 0
@@ -0,0 +1,204 @@
+import importlib.util
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+
+
+def load_class_settings(path, attribute):
+    """Returns {class name: value of `attribute`} for the classes of a runtime config file that have it."""
+    spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(path))[0], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return {name: getattr(value, attribute) for name, value in vars(module).items()
+            if isinstance(value, type) and hasattr(value, attribute)}
+
+
+def load_requirements(path):
+    """Returns {class name: resourceRequirement} for the classes declared in a resourceRequirements.py file."""
+    return load_class_settings(path, 'resourceRequirement')
+
+
+class AdmissionRejected(Exception):
+    """Raised when a call can't be admitted in time; `retry_after` is a suggested wait in seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Permit:
+    """An admitted session. Release it (or use it as a context manager) when the call is done."""
+
+    def __init__(self, controller, model, cost):
+        self.model = model
+        self.cost = cost
+        self.admitted_at = controller.clock()
+        self.started = time.time()
+        self._controller = controller
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class AdmissionController:
+    """
+    Admits calls to a speech runtime only while the sessions in flight fit in the node's
+    memory and CPU envelope.
+
+    Each session costs the `marginalMem`/`marginalCpu` its model's class declares in
+    resourceRequirements.py. A call that doesn't fit waits in a FIFO queue of at most
+    `max_queue` calls for up to `max_wait` seconds, and is then rejected with a retry-after
+    estimate. A single session is always admitted on an idle node, even if it is larger
+    than the envelope.
+    """
+
+    def __init__(self, requirements, default_class, memory_bytes, cpu, model_classes=None,
+                 max_queue=32, max_wait=5, usage_log=None, clock=time.monotonic):
+        """
+        Args:
+            requirements (dict): {class name: {'marginalMem': bytes, 'marginalCpu': percent of a core}}.
+            default_class (str): Requirement class of models not in `model_classes`.
+            memory_bytes (float): Memory the node can give to sessions.
+            cpu (float): CPU the node can give to sessions, in the same unit as `marginalCpu`.
+            model_classes (dict, optional): {model or voice name: requirement class name}.
+            usage_log (str, optional): File to append a JSON line to for every finished session,
+                with its start time, model and duration (the input of tune_session_pools.py).
+        """
+        self.requirements = requirements
+        self.default_class = default_class
+        self.model_classes = model_classes or {}
+        self.memory_limit = memory_bytes
+        self.cpu_limit = cpu
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.clock = clock
+
+        self._cond = threading.Condition()
+        self._waiters = deque()
+        self.memory_in_use = 0
+        self.cpu_in_use = 0
+        self.in_flight = Counter()
+        self._usage_log = open(usage_log, 'a', buffering=1) if usage_log else None
+
+        # Usage per model, for sizing the runtime's session pools
+        self.started = time.time()
+        self.requests = Counter()
+        self.peak_in_flight = Counter()
+
+        # Counters
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self._wait_seconds = 0.0
+        self._session_seconds = 0.0
+        self._sessions = 0
+
+    def cost(self, model):
+        requirement = self.requirements[self.model_classes.get(model, self.default_class)]
+        return requirement['marginalMem'], requirement['marginalCpu']
+
+    def acquire(self, model, max_wait=None):
+        """
+        Returns a Permit for a session of `model`, waiting for room if needed.
+
+        Raises:
+            AdmissionRejected: If the queue is full or there is no room within `max_wait` seconds.
+        """
+        cost = self.cost(model)
+        max_wait = self.max_wait if max_wait is None else max_wait
+        with self._cond:
+            if not self._waiters and self._fits(cost):
+                return self._admit(model, cost, 0.0)
+            if len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                raise AdmissionRejected(f"Admission queue for {model} is full", self._retry_after())
+
+            ticket = object()
+            self._waiters.append(ticket)
+            self.queued += 1
+            start = self.clock()
+            try:
+                # First come, first served: only the head of the queue may take freed room
+                while not (self._waiters[0] is ticket and self._fits(cost)):
+                    remaining = start + max_wait - self.clock()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise AdmissionRejected(f"No room for a {model} session", self._retry_after())
+                    self._cond.wait(remaining)
+            finally:
+                self._waiters.remove(ticket)
+                self._cond.notify_all()
+            return self._admit(model, cost, self.clock() - start)
+
+    def stats(self):
+        """Returns the budget in use, the sessions in flight per model and the admission counters."""
+        with self._cond:
+            decided = self.admitted + self.rejected
+            return {
+                "memory_in_use_mb": self.memory_in_use / 2 ** 20,
+                "memory_limit_mb": self.memory_limit / 2 ** 20,
+                "cpu_in_use": self.cpu_in_use,
+                "cpu_limit": self.cpu_limit,
+                "in_flight": dict(self.in_flight),
+                "waiting": len(self._waiters),
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "rejected": self.rejected,
+                "rejection_rate": self.rejected / decided if decided else 0.0,
+                "mean_wait_ms": self._wait_seconds / self.admitted * 1000 if self.admitted else 0.0,
+                "mean_session_s": self._mean_session_seconds(),
+                "uptime_s": time.time() - self.started,
+                "requests": dict(self.requests),
+                "peak_in_flight": dict(self.peak_in_flight),
+            }
+
+    def _fits(self, cost):
+        memory, cpu = cost
+        if not self.in_flight:
+            return True
+        return self.memory_in_use + memory <= self.memory_limit and self.cpu_in_use + cpu <= self.cpu_limit
+
+    def _admit(self, model, cost, waited):
+        self.memory_in_use += cost[0]
+        self.cpu_in_use += cost[1]
+        self.in_flight[model] += 1
+        self.requests[model] += 1
+        self.peak_in_flight[model] = max(self.peak_in_flight[model], self.in_flight[model])
+        self.admitted += 1
+        self._wait_seconds += waited
+        return Permit(self, model, cost)
+
+    def _release(self, permit):
+        with self._cond:
+            self.memory_in_use -= permit.cost[0]
+            self.cpu_in_use -= permit.cost[1]
+            self.in_flight[permit.model] -= 1
+            if not self.in_flight[permit.model]:
+                del self.in_flight[permit.model]  # An empty Counter means an idle node (see _fits)
+            duration = self.clock() - permit.admitted_at
+            self._session_seconds += duration
+            self._sessions += 1
+            self._cond.notify_all()
+            if self._usage_log is not None:
+                self._usage_log.write(json.dumps({'time': permit.started, 'model': permit.model,
+                                                  'duration': round(duration, 3)}) + '\n')
+
+    def _mean_session_seconds(self):
+        return self._session_seconds / self._sessions if self._sessions else 1.0
+
+    def _retry_after(self):
+        # Roughly when the sessions ahead will have finished, if they leave at the average rate
+        sessions = max(1, sum(self.in_flight.values()))
+        return max(1, math.ceil(self._mean_session_seconds() * (len(self._waiters) + 1) / sessions))
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import random
+
+import httpx
+
+from http_client import RETRY_STATUSES, CircuitBreaker, CircuitOpenError
+
+
+class AsyncServiceClient:
+    """
+    asyncio counterpart of `ServiceClient`: one pooled httpx client per service, with the same
+    timeouts, jittered retries and circuit breaker, for the async serving mode.
+    """
+
+    def __init__(self, base_url, connect_timeout=3.05, read_timeout=30, max_retries=2, backoff=0.25,
+                 max_backoff=4, pool_size=100, failure_threshold=5, reset_timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def post(self, path, stream=False, **kwargs):
+        """
+        Sends a POST request to `base_url + path`; takes the same arguments as `httpx.AsyncClient.post`.
+        With `stream=True` it returns once the headers arrive and the caller must `aclose()` the response.
+
+        Raises:
+            CircuitOpenError: If the service has been failing and the circuit is open.
+            httpx.HTTPError: If the request still fails after the retries.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {self.base_url}, not sending request")
+
+        url = self.base_url + path
+        recorded = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = await self.client.send(self.client.build_request('POST', path, **kwargs), stream=stream)
+                    if response.status_code not in RETRY_STATUSES:
+                        if response.is_error:
+                            await response.aclose()
+                        response.raise_for_status()
+                        recorded = True
+                        self.breaker.record_success()
+                        return response
+                    await response.aclose()  # Release the connection back to the pool before retrying
+                    error = httpx.HTTPStatusError(f"{response.status_code} from {url}", request=response.request,
+                                                  response=response)
+                except httpx.HTTPStatusError as e:
+                    # Other errors won't get better by retrying; only server errors count against the service
+                    recorded = True
+                    if e.response.status_code >= 500:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                    raise
+                except httpx.TransportError as e:
+                    error = e
+
+                if attempt < self.max_retries:
+                    # Full jitter: wait a random time up to the exponential backoff
+                    delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                    logging.warning(f"Request to {url} failed ({error!r}), retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+
+            recorded = True
+            self.breaker.record_failure()
+            raise error
+        except asyncio.CancelledError:
+            # The caller went away (e.g. the client disconnected): that says nothing about the service,
+            # but a trial call must still end so the next call can try
+            if not recorded:
+                recorded = True
+                self.breaker.release_trial()
+            raise
+        finally:
+            if not recorded:
+                # Any other error (undecodable body, invalid URL...) is a failure too, so a half-open
+                # circuit's trial always ends and the circuit can't stay open forever
+                self.breaker.record_failure()
+
+    async def aclose(self):
+        await self.client.aclose()
@@ -0,0 +1,222 @@
+# asyncio serving mode with the same routes and payloads as server.py.
+# Run with: hypercorn async_server:app --bind 0.0.0.0:8000
+import base64
+import json
+import logging
+import os
+import struct
+import time
+
+import simple_websocket
+from quart import Quart, render_template, request, websocket
+from quart_cors import cors, cors_exempt
+
+from admission import AdmissionRejected
+from async_worker import (SERVICE_ERRORS, speech_to_text, open_speech_to_text_stream, text_to_speech,
+                          text_to_speech_segments, text_to_speech_stream, openai_process_message)
+from worker import llm_cache, tts_cache, stt_admission, tts_admission, audio_response_parts, AUDIO_FORMATS
+
+app = Quart(__name__)
+app = cors(app, allow_origin="*", expose_headers=['X-Response-Text'])
+logging.basicConfig(level=logging.INFO)
+
+
+@app.errorhandler(AdmissionRejected)
+async def admission_rejected(e):
+    """Returns 503 with a Retry-After header, like server.py."""
+    logging.warning(f"Request shed: {e}")
+    response = app.response_class(json.dumps({'error': 'Server busy, please retry', 'retryAfter': e.retry_after}),
+                                  status=503, mimetype='application/json')
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+
+async def speech_service_failed(e):
+    """Returns 503 with a JSON error, like server.py."""
+    logging.error(f"Text-to-speech failed: {e}")
+    return app.response_class(json.dumps({'error': 'Text-to-speech failed, please retry'}),
+                              status=503, mimetype='application/json')
+
+
+for service_error in SERVICE_ERRORS:
+    app.register_error_handler(service_error, speech_service_failed)
+
+
+@app.route('/', methods=['GET'])
+async def index():
+    """Renders the main HTML page."""
+    return await render_template('index.html')
+
+
+@app.route('/speech-to-text', methods=['POST'])
+async def speech_to_text_route():
+    """Handles speech-to-text conversion requests."""
+    logging.info("Processing speech-to-text request.")
+    text = await speech_to_text(await request.get_data(), request.content_type)
+    return app.response_class(json.dumps({'text': text}), status=200, mimetype='application/json')
+
+
+@app.websocket('/speech-to-text-stream')
+@cors_exempt  # Like server.py, accept clients that send no Origin header
+async def speech_to_text_stream_route():
+    """Same protocol as the /speech-to-text-stream route of server.py."""
+    start = json.loads(await websocket.receive())
+    logging.info(f"Streaming speech-to-text request ({start.get('contentType')}).")
+
+    async def send_result(result):
+        await websocket.send(json.dumps(result))
+
+    try:
+        recognizer = await open_speech_to_text_stream(start.get('contentType', 'audio/webm'), send_result)
+    except AdmissionRejected as e:
+        logging.warning(f"Request shed: {e}")
+        await websocket.send(json.dumps({'type': 'error', 'error': 'Server busy, please retry',
+                                         'retryAfter': e.retry_after}))
+        return
+    except (simple_websocket.ConnectionError, OSError) as e:
+        logging.error(f"Error connecting to speech-to-text service: {e}")
+        await websocket.send(json.dumps({'type': 'error', 'error': 'Speech-to-text service unavailable'}))
+        return
+
+    async with recognizer:
+        while True:
+            message = await websocket.receive()
+            if not isinstance(message, bytes):
+                break  # {"action": "stop"}: the recording has ended
+            await recognizer.send(message)
+        stopped = time.perf_counter()
+        text = await recognizer.finish()
+
+    latency_ms = round((time.perf_counter() - stopped) * 1000)
+    logging.info(f"End of recording to final text: {latency_ms} ms")
+    await websocket.send(json.dumps({'type': 'done', 'text': text or 'null', 'finalLatencyMs': latency_ms}))
+
+
+def use_llm_cache(payload):
+    """Same as server.use_llm_cache, for the JSON body `payload`."""
+    cache_control = request.cache_control
+    return payload.get('cache', True) is not False and not (cache_control.no_cache or cache_control.no_store)
+
+
+async def surround(head, audio, tail):
+    """Same as server.surround, for an async iterator over the audio."""
+    try:
+        yield head
+        async for chunk in audio:
+            yield chunk
+        yield tail
+    finally:
+        await audio.aclose()
+
+
+@app.route('/process-message', methods=['POST'])
+async def process_message_route():
+    """Same request and content negotiation as the /process-message route of server.py."""
+    payload = await request.get_json()
+    user_message = payload['userMessage']
+    voice = payload['voice']
+    logging.info(f"Processing message request: {user_message} (voice: {voice})")
+
+    media_type = request.accept_mimetypes.best_match(['application/json'] + list(AUDIO_FORMATS),
+                                                     default='application/json')
+
+    openai_response_text = await openai_process_message(user_message, use_llm_cache(payload))
+    openai_response_text = os.linesep.join([s for s in openai_response_text.splitlines() if s])
+
+    if media_type != 'application/json':
+        audio = await text_to_speech_stream(openai_response_text, voice, media_type)
+        content_type, headers, head, tail = audio_response_parts(openai_response_text, media_type)
+        response = app.response_class(surround(head, audio, tail), status=200, content_type=content_type)
+        response.headers.update(headers)
+        response.vary.add('Accept')
+        return response
+
+    openai_response_speech = base64.b64encode(await text_to_speech(openai_response_text, voice)).decode('utf-8')
+    response = app.response_class(
+        json.dumps({"openaiResponseText": openai_response_text, "openaiResponseSpeech": openai_response_speech}),
+        status=200,
+        mimetype='application/json'
+    )
+    response.vary.add('Accept')
+    return response
+
+
+# Same framing as server.py: a one-byte kind, the payload length as four big-endian bytes, then the payload
+def frame(kind, payload):
+    return kind + struct.pack('>I', len(payload)) + payload
+
+
+@app.route('/process-message-stream', methods=['POST'])
+async def process_message_stream_route():
+    """Same frames as the /process-message-stream route of server.py."""
+    start = time.perf_counter()
+    payload = await request.get_json()
+    user_message = payload['userMessage']
+    voice = payload['voice']
+    use_cache = use_llm_cache(payload)
+    logging.info(f"Streaming reply to: {user_message} (voice: {voice})")
+
+    async def generate():
+        # The 200 status has gone out with the first frame, so failures are reported as an "E" frame
+        try:
+            openai_response_text = await openai_process_message(user_message, use_cache)
+        except Exception as e:
+            logging.exception(f"Processing the message failed while streaming: {e}")
+            yield frame(b'E', json.dumps({"error": "The assistant could not answer, please retry"}).encode())
+            return
+        openai_response_text = os.linesep.join([s for s in openai_response_text.splitlines() if s])
+        yield frame(b'T', json.dumps({"openaiResponseText": openai_response_text}).encode())
+
+        first_audio = None
+        segments = 0
+        try:
+            async for _, audio in text_to_speech_segments(openai_response_text, voice):
+                if first_audio is None:
+                    first_audio = time.perf_counter() - start
+                    logging.info(f"Time to first audio: {first_audio * 1000:.0f} ms")
+                segments += 1
+                yield frame(b'A', audio)
+        except AdmissionRejected as e:
+            logging.warning(f"Request shed while streaming: {e}")
+            yield frame(b'E', json.dumps({"error": "Server busy, please retry", "retryAfter": e.retry_after}).encode())
+            return
+        except SERVICE_ERRORS as e:
+            logging.error(f"Text-to-speech failed while streaming: {e}")
+            yield frame(b'E', json.dumps({"error": "Text-to-speech failed"}).encode())
+            return
+        except Exception as e:
+            logging.exception(f"Streaming the reply failed: {e}")
+            yield frame(b'E', json.dumps({"error": "Text-to-speech failed"}).encode())
+            return
+
+        timings = {
+            "segments": segments,
+            "firstAudioMs": round(first_audio * 1000) if first_audio is not None else None,
+            "totalMs": round((time.perf_counter() - start) * 1000),
+        }
+        yield frame(b'D', json.dumps(timings).encode())
+
+    return app.response_class(generate(), status=200, mimetype='application/octet-stream')
+
+
+@app.route('/tts-cache-stats', methods=['GET'])
+async def tts_cache_stats_route():
+    """Returns the TTS cache hit rate and size as JSON."""
+    return app.response_class(json.dumps(tts_cache.stats()), status=200, mimetype='application/json')
+
+
+@app.route('/llm-cache-stats', methods=['GET'])
+async def llm_cache_stats_route():
+    """Returns the LLM cache hit rate and the LLM time it saved as JSON."""
+    return app.response_class(json.dumps(llm_cache.stats()), status=200, mimetype='application/json')
+
+
+@app.route('/admission-stats', methods=['GET'])
+async def admission_stats_route():
+    """Returns the budget in use and the admitted, queued and rejected counts of each runtime as JSON."""
+    stats = {'stt': stt_admission.stats(), 'tts': tts_admission.stats()}
+    return app.response_class(json.dumps(stats), status=200, mimetype='application/json')
+
+
+if __name__ == "__main__":
+    app.run(port=8000, host='0.0.0.0')
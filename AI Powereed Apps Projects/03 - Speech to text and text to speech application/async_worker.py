@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from openai import AsyncOpenAI
+
+from async_http_client import AsyncServiceClient
+from audio_preprocessing import prepare_audio
+from http_client import CircuitOpenError
+from streaming_stt import AsyncStreamingRecognizer
+from worker import (AUDIO_FORMATS, assistant_prompt, llm_cache, llm_params, recognized_text, speech_request,
+                    split_sentences, stt_admission, stt_base_url, stt_codec, stt_model, stt_model_rate, stt_preprocess,
+                    stt_stream_url, tts_admission, tts_base_url, tts_cache, tts_parallelism,
+                    tts_stream_cache_max_bytes, voice_model)
+
+# The async serving mode: the same calls as worker.py, made with asyncio clients so a
+# process can wait on hundreds of them at once instead of tying up a thread per request.
+# The TTS cache is shared with worker.py.
+
+# Errors of the async clients, caught where worker.py catches requests.exceptions.RequestException
+SERVICE_ERRORS = (httpx.HTTPError, CircuitOpenError)
+
+openai_client = AsyncOpenAI()
+stt_client = AsyncServiceClient(stt_base_url, read_timeout=60)
+tts_client = AsyncServiceClient(tts_base_url, read_timeout=30)
+
+# Waiting for admission blocks, so it happens on threads of its own rather than on the event
+# loop or the default executor the cache uses. Each runtime gets its own threads, so a burst of
+# calls waiting for TTS can't hold the threads STT admission needs: `max_queue` of them wait at
+# a time, and one more admits or turns away the calls that don't have to wait
+admission_executors = {}
+
+
+def admission_executor(controller):
+    """Returns the threads that wait for admission to `controller`."""
+    if controller not in admission_executors:
+        admission_executors[controller] = ThreadPoolExecutor(max_workers=controller.max_queue + 1)
+    return admission_executors[controller]
+
+
+async def admitted(controller, model):
+    """Async version of `controller.acquire(model)`; returns the Permit."""
+    future = asyncio.get_running_loop().run_in_executor(admission_executor(controller), controller.acquire, model)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        # The request went away while waiting: give the session back once it is admitted
+        future.add_done_callback(lambda f: f.cancelled() or f.exception() or f.result().release())
+        raise
+
+
+async def speech_to_text(audio_binary, content_type=None):
+    """Async version of worker.speech_to_text."""
+    headers = {}
+    if stt_preprocess:
+        # NumPy work, so it runs on a thread rather than the event loop
+        prepared = await asyncio.to_thread(prepare_audio, audio_binary, content_type, stt_model_rate, stt_codec)
+        if prepared is not None:
+            audio_binary, headers['Content-Type'] = prepared
+            if not audio_binary:
+                logging.info("Recording is all silence, nothing to transcribe")
+                return "null"
+    try:
+        with await admitted(stt_admission, stt_model):
+            response = await stt_client.post('/speech-to-text/api/v1/recognize', params={'model': stt_model},
+                                             headers=headers, content=audio_binary)
+    except SERVICE_ERRORS as e:
+        logging.error(f"Error connecting to speech-to-text service: {e}")
+        return "null"
+    return recognized_text(response.json())
+
+
+async def open_speech_to_text_stream(content_type, on_result):
+    """Async version of worker.open_speech_to_text_stream; `on_result` is a coroutine function."""
+    permit = await admitted(stt_admission, stt_model)
+    try:
+        return await AsyncStreamingRecognizer.open(stt_stream_url, content_type, on_result, on_close=permit.release)
+    except BaseException:
+        permit.release()
+        raise
+
+
+async def text_to_speech(text, voice="", use_cache=True):
+    """Async version of worker.text_to_speech."""
+    cache_key = tts_cache.key(text, voice, 'audio/wav')
+    # The cache may read from disk, so it is used from a thread rather than the event loop
+    audio = await asyncio.to_thread(tts_cache.get, cache_key) if use_cache else None
+    if audio is not None:
+        return audio
+
+    api_path, request_args = speech_request(text, voice, 'audio/wav')
+    with await admitted(tts_admission, voice_model(voice)):
+        response = await tts_client.post(api_path, **request_args)
+    logging.info(f"Text-to-Speech response: {response}")
+    if use_cache:
+        await asyncio.to_thread(tts_cache.put, cache_key, response.content)
+    return response.content
+
+
+async def text_to_speech_stream(text, voice="", media_type='audio/wav', chunk_size=64 * 1024, use_cache=True):
+    """Async version of worker.text_to_speech_stream; returns an async iterator over the audio."""
+    audio_format = AUDIO_FORMATS[media_type]
+    cache_key = tts_cache.key(text, voice, audio_format)
+    audio = await asyncio.to_thread(tts_cache.get, cache_key) if use_cache else None
+    if audio is not None:
+        async def cached():
+            yield audio
+        return cached()
+
+    api_path, request_args = speech_request(text, voice, audio_format)
+    permit = await admitted(tts_admission, voice_model(voice))
+    try:
+        response = await tts_client.post(api_path, stream=True, **request_args)
+    except BaseException:
+        permit.release()
+        raise
+    logging.info(f"Text-to-Speech response: {response}")
+
+    async def chunks():
+        # Keep a copy for the cache only while it is short enough to be worth caching
+        parts, size = ([], 0) if use_cache else (None, 0)
+        try:
+            async for chunk in response.aiter_bytes(chunk_size):
+                if parts is not None:
+                    parts.append(chunk)
+                    size += len(chunk)
+                    if size > tts_stream_cache_max_bytes:
+                        parts = None
+                yield chunk
+        finally:
+            await response.aclose()
+            permit.release()
+        if parts is not None:
+            await asyncio.to_thread(tts_cache.put, cache_key, b''.join(parts))
+
+    return chunks()
+
+
+async def text_to_speech_segments(text, voice="", max_in_flight=tts_parallelism, use_cache=True):
+    """Async version of worker.text_to_speech_segments: yields (sentence, audio) in order."""
+    sentences = iter(split_sentences(text))
+    in_flight = deque()
+
+    def submit(sentence):
+        in_flight.append((sentence, asyncio.create_task(text_to_speech(sentence, voice, use_cache))))
+
+    try:
+        for sentence in sentences:
+            submit(sentence)
+            if len(in_flight) >= max_in_flight:
+                break
+        while in_flight:
+            sentence, task = in_flight.popleft()
+            audio = await task
+            next_sentence = next(sentences, None)
+            if next_sentence is not None:
+                submit(next_sentence)
+            yield sentence, audio
+    finally:
+        for _, task in in_flight:
+            task.cancel()
+
+
+async def openai_process_message(user_message, use_cache=True):
+    """Async version of worker.openai_process_message."""
+    if not use_cache:
+        llm_cache.record_bypass()
+    else:
+        # Semantic matching embeds the message, so the lookup runs on a thread
+        cached = await asyncio.to_thread(llm_cache.get, user_message, assistant_prompt, **llm_params)
+        if cached is not None:
+            logging.info("OpenAI response served from the cache")
+            return cached
+
+    start = time.perf_counter()
+    openai_response = await openai_client.chat.completions.create(
+        messages=[
+            {"role": "system", "content": assistant_prompt},
+            {"role": "user", "content": user_message}
+        ],
+        **llm_params
+    )
+    logging.info(f"OpenAI response: {openai_response}")
+    response_text = openai_response.choices[0].message.content
+    if use_cache:
+        await asyncio.to_thread(llm_cache.put, user_message, assistant_prompt, response_text,
+                                time.perf_counter() - start, **llm_params)
+    return response_text
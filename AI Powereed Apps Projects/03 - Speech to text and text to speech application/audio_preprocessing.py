@@ -0,0 +1,161 @@
+import re
+import struct
+
+import numpy as np
+
+# Shrinks recordings before they are uploaded to the STT service: downmix to mono, trim the
+# silence before and after the speech, resample to the model's rate and encode as 16-bit PCM
+# (or 8-bit mu-law). Everything happens on NumPy buffers in memory.
+#
+# Only uncompressed audio (WAV and audio/l16) is decoded. Compressed recordings, such as the
+# WebM/Opus the browser's MediaRecorder produces, are already compact and are sent unchanged.
+
+CODECS = ('l16', 'mulaw')
+
+
+def decode(audio_binary, content_type=None):
+    """
+    Decodes WAV or raw audio/l16 data.
+
+    Args:
+        audio_binary (bytes): The audio data.
+        content_type (str, optional): Its media type; needed for audio/l16, which has no header.
+
+    Returns:
+        tuple[np.ndarray, int] | None: float32 samples in [-1, 1] shaped (frames, channels) and
+        the sample rate, or None if the audio isn't in a format this module decodes.
+    """
+    if audio_binary[:4] == b'RIFF' and audio_binary[8:12] == b'WAVE':
+        return _decode_wav(audio_binary)
+    if content_type and content_type.lower().startswith('audio/l16'):
+        rate = re.search(r'rate=(\d+)', content_type)
+        channels = re.search(r'channels=(\d+)', content_type)
+        samples = np.frombuffer(audio_binary[:len(audio_binary) // 2 * 2], dtype='>i2')
+        channels = int(channels.group(1)) if channels else 1
+        samples = samples[:len(samples) // channels * channels].reshape(-1, channels)
+        return samples.astype(np.float32) / 32768, int(rate.group(1)) if rate else 16000
+    return None
+
+
+def _decode_wav(audio_binary):
+    fmt, data, offset = None, None, 12
+    while offset + 8 <= len(audio_binary):
+        chunk_id, size = struct.unpack_from('<4sI', audio_binary, offset)
+        body = audio_binary[offset + 8:offset + 8 + size]
+        if chunk_id == b'fmt ':
+            fmt = struct.unpack_from('<HHIIHH', body)
+            if fmt[0] == 0xFFFE and len(body) >= 26:  # WAVE_FORMAT_EXTENSIBLE: the real format is in the subformat
+                fmt = (struct.unpack_from('<H', body, 24)[0],) + fmt[1:]
+        elif chunk_id == b'data':
+            # Recorders that stream the WAV write the header before knowing the length, and leave
+            # the size at 0 or 0xFFFFFFFF: the data then runs to the end of the file
+            data = audio_binary[offset + 8:] if size in (0, 0xFFFFFFFF) else body
+            break
+        offset += 8 + size + size % 2
+    if fmt is None or data is None:
+        return None
+
+    format_tag, channels, rate, _, _, bits = fmt
+    if format_tag == 3 and bits in (32, 64):
+        samples = np.frombuffer(data[:len(data) // (bits // 8) * (bits // 8)], dtype=f'<f{bits // 8}')
+    elif format_tag == 1 and bits == 8:
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif format_tag == 1 and bits in (16, 32):
+        samples = np.frombuffer(data[:len(data) // (bits // 8) * (bits // 8)], dtype=f'<i{bits // 8}')
+        samples = samples / np.float32(2 ** (bits - 1))
+    elif format_tag == 1 and bits == 24:
+        raw = np.frombuffer(data[:len(data) // 3 * 3], dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = ((raw[:, 0] | raw[:, 1] << 8 | raw[:, 2] << 16) << 8 >> 8) / np.float32(2 ** 23)
+    else:
+        return None
+    samples = samples[:len(samples) // channels * channels].reshape(-1, channels)
+    return samples.astype(np.float32, copy=False), rate
+
+
+def downmix(samples):
+    """Averages the channels of (frames, channels) samples into mono."""
+    return samples.mean(axis=1, dtype=np.float32) if samples.shape[1] > 1 else samples[:, 0]
+
+
+def resample(samples, rate, target_rate):
+    """
+    Resamples mono audio down to `target_rate`: a windowed-sinc low-pass filter against
+    aliasing, then linear interpolation onto the new sample times. Audio at or below the
+    target rate is returned unchanged, since upsampling adds bytes but no information.
+    """
+    if rate <= target_rate or len(samples) == 0:
+        return samples, rate
+    cutoff = 0.45 * target_rate / rate  # A little below the new Nyquist frequency, in cycles per input sample
+    half_width = int(np.ceil(8 / cutoff))
+    taps = np.arange(-half_width, half_width + 1)
+    kernel = (2 * cutoff * np.sinc(2 * cutoff * taps) * np.hamming(len(taps))).astype(np.float32)
+    filtered = np.convolve(samples, kernel / kernel.sum(), mode='same')
+    times = np.arange(int(len(samples) * target_rate / rate)) * (rate / target_rate)
+    return np.interp(times, np.arange(len(samples)), filtered).astype(np.float32), target_rate
+
+
+def trim_silence(samples, rate, frame_ms=20, threshold_db=-35, floor_db=-55, padding_ms=200):
+    """
+    Trims leading and trailing silence with an energy detector: a frame is speech if its RMS
+    level is within `threshold_db` of the loudest frame and above `floor_db` dBFS. Keeps
+    `padding_ms` of audio around the speech so word onsets and endings aren't clipped.
+
+    Returns:
+        np.ndarray: The trimmed samples; empty if no frame is speech.
+    """
+    frame = max(1, rate * frame_ms // 1000)
+    frames = len(samples) // frame
+    if frames == 0:
+        return samples
+    energy = np.sqrt(np.mean(np.square(samples[:frames * frame].reshape(frames, frame)), axis=1))
+    level = 20 * np.log10(np.maximum(energy, 1e-10))
+    speech = np.flatnonzero((level > level.max() + threshold_db) & (level > floor_db))
+    if len(speech) == 0:
+        return samples[:0]
+    padding = rate * padding_ms // 1000
+    return samples[max(0, speech[0] * frame - padding):min(len(samples), (speech[-1] + 1) * frame + padding)]
+
+
+def encode(samples, rate, codec='l16'):
+    """
+    Encodes mono samples for the STT service.
+
+    Args:
+        codec (str, optional): 'l16' for 16-bit PCM, or 'mulaw' for 8-bit mu-law at half the size.
+
+    Returns:
+        tuple[bytes, str]: The audio data and its media type.
+    """
+    pcm = (np.clip(samples, -1, 1) * 32767).astype(np.int32)
+    if codec == 'mulaw':
+        # G.711 mu-law: 3-bit segment and 4-bit step of the biased 14-bit magnitude, inverted,
+        # with the sign in the top bit
+        pcm >>= 2
+        magnitude = np.minimum(np.abs(pcm) + 0x21, 8191)
+        segment = np.floor(np.log2(magnitude)).astype(np.int32) - 5
+        code = ((segment << 4) | ((magnitude >> (segment + 1)) & 0x0F)) ^ np.where(pcm < 0, 0x7F, 0xFF)
+        return code.astype(np.uint8).tobytes(), f'audio/mulaw;rate={rate}'
+    return pcm.astype('>i2').tobytes(), f'audio/l16;rate={rate}'
+
+
+def prepare_audio(audio_binary, content_type=None, target_rate=16000, codec='l16'):
+    """
+    Runs the whole pre-processing stage on a recording.
+
+    Args:
+        audio_binary (bytes): The recording as uploaded.
+        content_type (str, optional): Its media type, if known.
+        target_rate (int, optional): The native rate of the STT model.
+        codec (str, optional): One of CODECS.
+
+    Returns:
+        tuple[bytes, str] | None: The audio to send and its media type, or None if the recording
+        isn't in a format this module decodes. The audio is empty if the recording is all silence.
+    """
+    decoded = decode(audio_binary, content_type)
+    if decoded is None:
+        return None
+    samples, rate = decoded
+    # Trimming first means only the speech goes through the resampling filter
+    samples, rate = resample(trim_silence(downmix(samples), rate), rate, target_rate)
+    return encode(samples, rate, codec)
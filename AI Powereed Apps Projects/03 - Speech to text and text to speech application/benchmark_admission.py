@@ -0,0 +1,105 @@
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmark_http_client import StubWatsonHandler, start_stub_server
+
+
+class FakeRuntimeHandler(StubWatsonHandler):
+    """
+    A TTS runtime with room for `sessions` concurrent sessions and `cores` cores: requests
+    share the cores, so they slow down once there are more of them than cores, and a request
+    that arrives when the runtime is full fails as if it had run out of memory.
+    """
+
+    sessions = 8
+    cores = 4
+    active = 0
+    lock = threading.Lock()
+
+    def processing_delay(self, request_body):
+        return self.delay * max(1, FakeRuntimeHandler.active / self.cores)
+
+    def do_POST(self):
+        with FakeRuntimeHandler.lock:
+            FakeRuntimeHandler.active += 1
+            full = FakeRuntimeHandler.active > self.sessions
+        try:
+            if full:
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self.send_response(500)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            else:
+                super().do_POST()
+        finally:
+            with FakeRuntimeHandler.lock:
+                FakeRuntimeHandler.active -= 1
+
+
+def run(clients, calls_per_client):
+    """Has `clients` threads synthesize `calls_per_client` sentences each; returns latencies and outcomes."""
+    from admission import AdmissionRejected
+    from worker import text_to_speech
+
+    latencies, outcomes, lock = [], {"ok": 0, "shed": 0, "failed": 0}, threading.Lock()
+
+    def client(i):
+        for j in range(calls_per_client):
+            start = time.perf_counter()
+            try:
+                text_to_speech(f"Sentence {j} for client {i}.", use_cache=False)
+                outcome = "ok"
+            except AdmissionRejected:
+                outcome = "shed"
+            except requests.exceptions.RequestException:
+                outcome = "failed"
+            with lock:
+                outcomes[outcome] += 1
+                if outcome == "ok":
+                    latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(client, range(clients)))
+    return latencies, outcomes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare TTS calls to a saturated fake runtime with and without admission control.")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--calls", type=int, default=10, help="Calls per client")
+    parser.add_argument("--delay-ms", type=float, default=50, help="Synthesis time of one sentence on an idle core")
+    parser.add_argument("--sessions", type=int, default=8, help="Sessions that fit in the fake runtime's memory")
+    parser.add_argument("--cores", type=int, default=4)
+    args = parser.parse_args()
+
+    FakeRuntimeHandler.sessions = args.sessions
+    FakeRuntimeHandler.cores = args.cores
+    server, base_url = start_stub_server(args.delay_ms / 1000, handler=FakeRuntimeHandler)
+    os.environ["TTS_BASE_URL"] = base_url
+    import worker
+
+    # Size the envelope like the fake runtime: as many WTTSDnn sessions as it has room for
+    memory, cpu = worker.tts_admission.cost(worker.tts_default_voice)
+    envelopes = {
+        "off": (float('inf'), float('inf')),
+        "on": (memory * args.sessions, cpu * args.sessions),
+    }
+
+    print(f"{'admission':>9} {'ok':>5} {'shed':>5} {'failed':>6} {'p50 ms':>7} {'p99 ms':>7}")
+    for mode, (memory_limit, cpu_limit) in envelopes.items():
+        worker.tts_admission.memory_limit = memory_limit
+        worker.tts_admission.cpu_limit = cpu_limit
+        worker.tts_client.breaker.record_success()  # Start each run with the circuit closed
+        latencies, outcomes = run(args.clients, args.calls)
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000 if latencies else float('nan')
+        p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else float('nan')
+        print(f"{mode:>9} {outcomes['ok']:>5} {outcomes['shed']:>5} {outcomes['failed']:>6} {p50:>7.0f} {p99:>7.0f}")
+    print(worker.tts_admission.stats())
+    server.shutdown()
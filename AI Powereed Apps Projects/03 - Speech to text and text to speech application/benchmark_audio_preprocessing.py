@@ -0,0 +1,102 @@
+import argparse
+import io
+import os
+import re
+import statistics
+import time
+import wave
+
+import numpy as np
+
+from audio_preprocessing import decode, prepare_audio
+from benchmark_http_client import StubWatsonHandler, start_stub_server
+
+
+class StubRecognizerHandler(StubWatsonHandler):
+    """
+    Watson STT stand-in whose response time is the upload time at `bandwidth` bytes per second
+    plus `real_time_factor` seconds of recognition per second of audio.
+    """
+
+    bandwidth = 20e6 / 8
+    real_time_factor = 0.3
+
+    def do_POST(self):
+        self.content_type = self.headers.get("Content-Type", "")
+        super().do_POST()
+
+    def processing_delay(self, request_body):
+        rate = re.search(r'rate=(\d+)', self.content_type)
+        if self.content_type.startswith('audio/mulaw'):
+            seconds = len(request_body) / int(rate.group(1))
+        elif self.content_type.startswith('audio/l16'):
+            seconds = len(request_body) / 2 / int(rate.group(1))
+        else:
+            samples, sample_rate = decode(request_body)
+            seconds = len(samples) / sample_rate
+        return len(request_body) / self.bandwidth + self.real_time_factor * seconds
+
+
+def speech_like(seconds, rate, seed=0):
+    """Voiced syllables at about 4 per second: harmonics of a wandering pitch under a syllable envelope."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 12))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t + rng.uniform(0, 2 * np.pi)), 0, None) ** 2
+    return 0.2 * voice * envelope
+
+
+def clip(speech_seconds, rate, channels, sample_width, lead=1.5, tail=2.0):
+    """A WAV recording of speech with `lead` and `tail` seconds of quiet room noise around it."""
+    rng = np.random.default_rng(1)
+    signal = np.concatenate([np.zeros(int(lead * rate)), speech_like(speech_seconds, rate), np.zeros(int(tail * rate))])
+    signal = signal + 3e-4 * rng.standard_normal(len(signal))
+    frames = np.repeat(signal[:, None], channels, axis=1)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(channels)
+        f.setsampwidth(sample_width)
+        f.setframerate(rate)
+        f.writeframes((np.clip(frames, -1, 1) * (2 ** (8 * sample_width - 1) - 1)).astype(f'<i{sample_width}').tobytes())
+    return buffer.getvalue()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare upload size and STT latency with and without audio pre-processing.")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--bandwidth-mbps", type=float, default=20, help="Upload bandwidth to the STT service")
+    parser.add_argument("--real-time-factor", type=float, default=0.3,
+                        help="Recognition time of the stub per second of audio")
+    args = parser.parse_args()
+
+    StubRecognizerHandler.bandwidth = args.bandwidth_mbps * 1e6 / 8
+    StubRecognizerHandler.real_time_factor = args.real_time_factor
+    server, base_url = start_stub_server(0, handler=StubRecognizerHandler)
+    os.environ["STT_BASE_URL"] = base_url
+    import worker
+
+    clips = {
+        "6 s, 48 kHz stereo": clip(6, 48000, 2, 2),
+        "6 s, 44.1 kHz stereo": clip(6, 44100, 2, 2),
+        "6 s, 16 kHz mono": clip(6, 16000, 1, 2),
+        "60 s, 48 kHz stereo": clip(60, 48000, 2, 2),
+    }
+    modes = {"raw": (False, None), "l16": (True, "l16"), "mulaw": (True, "mulaw")}
+
+    print(f"{'clip':>22} {'mode':>6} {'upload KB':>10} {'prepare ms':>11} {'end-to-end ms':>14}")
+    for name, audio in clips.items():
+        for mode, (preprocess, codec) in modes.items():
+            start = time.perf_counter()
+            prepared = prepare_audio(audio, 'audio/wav', codec=codec) if preprocess else (audio, None)
+            prepare_ms = (time.perf_counter() - start) * 1000
+            worker.stt_preprocess, worker.stt_codec = preprocess, codec
+            latencies = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                worker.speech_to_text(audio, 'audio/wav')
+                latencies.append(time.perf_counter() - start)
+            print(f"{name:>22} {mode:>6} {len(prepared[0]) / 1024:>10.0f} {prepare_ms:>11.1f} "
+                  f"{statistics.median(latencies) * 1000:>14.0f}")
+    server.shutdown()
@@ -0,0 +1,88 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from benchmark_http_client import StubWatsonHandler, start_stub_server
+
+
+class LongAudioHandler(StubWatsonHandler):
+    """Stub TTS service returning WAV audio whose size grows with the length of the text."""
+
+    bytes_per_char = 2000  # 16 kHz 16-bit mono speech at about 16 characters a second
+
+    def do_POST(self):
+        text = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))["text"]
+        size = self.bytes_per_char * len(text)
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/wav")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        chunk = bytes(64 * 1024)
+        for start in range(0, size, len(chunk)):
+            self.wfile.write(chunk[:size - start])
+
+
+def peak_rss_mb(pid):
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+
+
+def measure(accept, port, tts_url, reply_chars):
+    """Starts the app in its own process, asks for one long reply and returns bytes received and peak RSS."""
+    cache_dir = tempfile.mkdtemp()
+    env = dict(os.environ, TTS_BASE_URL=tts_url, TTS_CACHE_PATH=os.path.join(cache_dir, "tts_cache.sqlite3"))
+    server = subprocess.Popen([sys.executable, __file__, "--serve", str(port), "--reply-chars", str(reply_chars)],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        for _ in range(100):
+            try:
+                requests.get(base_url + "/tts-cache-stats", timeout=1)
+                break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.2)
+        rss_before = peak_rss_mb(server.pid)
+
+        start = time.perf_counter()
+        response = requests.post(base_url + "/process-message", json={"userMessage": "hi", "voice": ""},
+                                 headers={"Accept": accept}, stream=True)
+        header_bytes = sum(len(k) + len(v) + 4 for k, v in response.headers.items())
+        body_bytes = sum(len(chunk) for chunk in response.raw.stream(64 * 1024, decode_content=False))
+        seconds = time.perf_counter() - start
+        return {"bytes": header_bytes + body_bytes, "seconds": seconds,
+                "rss_before_mb": rss_before, "peak_rss_mb": peak_rss_mb(server.pid)}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the JSON and binary audio responses of /process-message.")
+    parser.add_argument("--reply-chars", type=int, default=6000, help="Length of the simulated assistant reply")
+    parser.add_argument("--port", type=int, default=8055)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        # Child process: the app with a fixed long reply in place of the OpenAI call
+        import server
+        server.openai_process_message = lambda message, use_cache=True: ("This is a long reply. " * args.reply_chars)[:args.reply_chars]
+        server.app.run(port=args.serve, threaded=True)
+        sys.exit(0)
+
+    tts_server, tts_url = start_stub_server(0, handler=LongAudioHandler)
+    print(f"{'response':>22} {'MB on wire':>11} {'seconds':>8} {'RSS before MB':>14} {'peak RSS MB':>12}")
+    for accept in ("application/json", "audio/wav"):
+        result = measure(accept, args.port, tts_url, args.reply_chars)
+        label = "JSON + base64" if accept == "application/json" else "binary audio stream"
+        print(f"{label:>22} {result['bytes'] / 2 ** 20:>11.1f} {result['seconds']:>8.2f} "
+              f"{result['rss_before_mb']:>14.0f} {result['peak_rss_mb']:>12.0f}")
+    tts_server.shutdown()
@@ -0,0 +1,115 @@
+import argparse
+import json
+import ssl
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from http_client import ServiceClient
+
+
+class StubWatsonHandler(BaseHTTPRequestHandler):
+    """Answers like the Watson STT/TTS endpoints, with a fixed processing delay."""
+
+    protocol_version = "HTTP/1.1"  # Keep connections open between requests
+    disable_nagle_algorithm = True  # Otherwise delayed ACKs stall each reply on a kept-alive connection
+    delay = 0.0
+
+    def processing_delay(self, request_body):
+        return self.delay
+
+    def do_POST(self):
+        request_body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.processing_delay(request_body))
+        if self.path.startswith("/speech-to-text"):
+            body = json.dumps({"results": [{"alternatives": [{"transcript": "hello world"}]}]}).encode()
+            content_type = "application/json"
+        else:
+            body = b"RIFF" + bytes(4096)
+            content_type = "audio/wav"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # Load tests open hundreds of connections at once
+
+
+def start_stub_server(delay, certfile=None, keyfile=None, handler=StubWatsonHandler):
+    handler.delay = delay
+    server = StubServer(("127.0.0.1", 0), handler)
+    scheme = "http"
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}"
+
+
+def run(call, requests_count):
+    """Makes `requests_count` alternating STT and TTS calls and returns their latencies in seconds."""
+    latencies = []
+    for i in range(requests_count):
+        start = time.perf_counter()
+        call(i % 2 == 0)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare a fresh connection per request with the pooled ServiceClient.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--delay-ms", type=float, default=0, help="Simulated processing time of the stub service")
+    parser.add_argument("--certfile", help="Serve the stub over TLS with this certificate (also used to verify it)")
+    parser.add_argument("--keyfile")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.delay_ms / 1000, args.certfile, args.keyfile)
+    verify = args.certfile or True
+    audio = bytes(16000)
+
+    def fresh_call(stt):
+        # What worker.py used to do: a new connection for every request
+        if stt:
+            requests.post(base_url + "/speech-to-text/api/v1/recognize", params={"model": "en-US_Multimedia"},
+                          data=audio, verify=verify).json()
+        else:
+            requests.post(base_url + "/text-to-speech/api/v1/synthesize", params={"output": "output_text.wav"},
+                          json={"text": "hello world"}, verify=verify).content
+
+    client = ServiceClient(base_url)
+
+    def pooled_call(stt):
+        if stt:
+            client.post("/speech-to-text/api/v1/recognize", params={"model": "en-US_Multimedia"},
+                        data=audio, verify=verify).json()
+        else:
+            client.post("/text-to-speech/api/v1/synthesize", params={"output": "output_text.wav"},
+                        json={"text": "hello world"}, verify=verify).content
+
+    # Warm-up so neither side pays one-off import or DNS costs in the measurement
+    run(fresh_call, 4)
+    run(pooled_call, 4)
+
+    results = {"fresh connection": run(fresh_call, args.requests), "pooled client": run(pooled_call, args.requests)}
+    server.shutdown()
+
+    print(f"{'mode':>17} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for mode, latencies in results.items():
+        latencies.sort()
+        print(f"{mode:>17} {statistics.mean(latencies) * 1000:>9.2f} {statistics.median(latencies) * 1000:>9.2f} "
+              f"{latencies[int(len(latencies) * 0.99) - 1] * 1000:>9.2f}")
+    saved = statistics.mean(results["fresh connection"]) - statistics.mean(results["pooled client"])
+    print(f"saved per request by connection reuse: {saved * 1000:.2f} ms")
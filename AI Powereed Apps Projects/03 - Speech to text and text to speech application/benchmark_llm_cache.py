@@ -0,0 +1,65 @@
+import argparse
+import os
+import random
+import statistics
+import time
+
+from benchmark_http_client import start_stub_server
+from load_test_async import StubServicesHandler
+
+QUESTIONS = [
+    "What's the weather like today?",
+    "Translate good morning into French.",
+    "Summarize today's news.",
+    "Recommend a good book.",
+    "What time is it in Tokyo?",
+    "How do I make a cup of tea?",
+    "Tell me a joke.",
+    "What is the capital of Australia?",
+]
+
+
+def workload(count, unique_share, seed=0):
+    """
+    User messages where most are one of a handful of popular questions (typed or transcribed
+    with varying case and punctuation) and `unique_share` are one-off questions.
+    """
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(QUESTIONS))]
+    messages = []
+    for i in range(count):
+        if rng.random() < unique_share:
+            messages.append(f"Question number {i} that nobody asked before?")
+            continue
+        question = rng.choices(QUESTIONS, weights)[0]
+        messages.append(rng.choice([question, question.lower(), question.rstrip("?.") + "  ", question.upper()]))
+    return messages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay repeated user messages with and without the LLM response cache.")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--unique-share", type=float, default=0.2, help="Share of messages asked only once")
+    parser.add_argument("--llm-delay-ms", type=float, default=800, help="Response time of the stub LLM")
+    args = parser.parse_args()
+
+    StubServicesHandler.llm_delay = args.llm_delay_ms / 1000
+    server, base_url = start_stub_server(0, handler=StubServicesHandler)
+    os.environ.update(OPENAI_BASE_URL=base_url + "/v1", OPENAI_API_KEY="stub")
+    import worker
+
+    messages = workload(args.messages, args.unique_share)
+    print(f"{'cache':>5} {'mean ms':>8} {'p50 ms':>7} {'total s':>8}")
+    for use_cache in (False, True):
+        latencies = []
+        for message in messages:
+            start = time.perf_counter()
+            worker.openai_process_message(message, use_cache)
+            latencies.append(time.perf_counter() - start)
+        print(f"{'on' if use_cache else 'off':>5} {statistics.mean(latencies) * 1000:>8.0f} "
+              f"{statistics.median(latencies) * 1000:>7.0f} {sum(latencies):>8.1f}")
+
+    stats = worker.llm_cache.stats()
+    print(f"Hit rate {stats['hit_rate']:.0%} ({stats['hits']} of {stats['hits'] + stats['misses']}), "
+          f"{stats['seconds_saved']:.1f}s of LLM time saved")
+    server.shutdown()
@@ -0,0 +1,105 @@
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+
+import requests
+import simple_websocket
+from flask import Flask, request
+from flask_sock import Sock
+from werkzeug.serving import make_server
+
+BYTES_PER_SECOND = 32000  # 16 kHz 16-bit mono
+
+
+def create_stub_recognizer(real_time_factor):
+    """
+    Local stand-in for the Watson STT service: recognizes one word per 250 ms of audio and
+    spends `real_time_factor` seconds per second of audio doing it, both over HTTP (after the
+    whole recording has been uploaded) and over the WebSocket interface (as frames arrive).
+    """
+    stub = Flask(__name__)
+    sock = Sock(stub)
+    word_bytes = BYTES_PER_SECOND // 4
+
+    def recognize(audio_bytes):
+        time.sleep(real_time_factor * audio_bytes / BYTES_PER_SECOND)
+        return " ".join(["word"] * max(1, audio_bytes // word_bytes))
+
+    @stub.route('/speech-to-text/api/v1/recognize', methods=['POST'])
+    def recognize_route():
+        text = recognize(len(request.data))
+        return {"results": [{"alternatives": [{"transcript": text}], "final": True}], "result_index": 0}
+
+    @sock.route('/speech-to-text/api/v1/recognize')
+    def recognize_stream_route(ws):
+        json.loads(ws.receive())  # {"action": "start", ...}
+        ws.send(json.dumps({"state": "listening"}))
+        received = 0
+        while True:
+            message = ws.receive()
+            if not isinstance(message, bytes):
+                break  # {"action": "stop"}
+            received += len(message)
+            ws.send(json.dumps({"results": [{"alternatives": [{"transcript": recognize(len(message))}],
+                                             "final": False}], "result_index": 0}))
+        ws.send(json.dumps({"results": [{"alternatives": [{"transcript": " ".join(
+            ["word"] * max(1, received // word_bytes))}], "final": True}], "result_index": 0}))
+        ws.send(json.dumps({"state": "listening"}))
+
+    return stub
+
+
+def serve(app):
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_port
+
+
+def upload_latency(base_url, frames):
+    """The old path: the recording is uploaded once the user stops talking."""
+    start = time.perf_counter()
+    requests.post(base_url + "/speech-to-text", data=b"".join(frames)).json()
+    return time.perf_counter() - start
+
+
+def stream_latency(ws_url, frames, frame_seconds):
+    """The streaming path: frames are sent as they are recorded; measured from the end of the recording."""
+    ws = simple_websocket.Client.connect(ws_url)
+    ws.send(json.dumps({"contentType": "audio/l16;rate=16000"}))
+    for frame in frames:
+        ws.send(frame)
+        time.sleep(frame_seconds)  # Recording in real time
+    start = time.perf_counter()
+    ws.send(json.dumps({"action": "stop"}))
+    while json.loads(ws.receive())["type"] != "done":
+        pass
+    return time.perf_counter() - start  # The server closes the connection after the final text
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare end-of-recording to final-text latency of upload and streaming STT.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=4, help="Length of each simulated recording")
+    parser.add_argument("--real-time-factor", type=float, default=0.3,
+                        help="Recognition time of the stub per second of audio")
+    args = parser.parse_args()
+
+    stub_server, stub_port = serve(create_stub_recognizer(args.real_time_factor))
+    os.environ["STT_BASE_URL"] = f"http://127.0.0.1:{stub_port}"
+    from server import app
+    app_server, app_port = serve(app)
+
+    frame_seconds = 0.25
+    frames = [bytes(int(BYTES_PER_SECOND * frame_seconds))] * int(args.seconds / frame_seconds)
+    upload = [upload_latency(f"http://127.0.0.1:{app_port}", frames) for _ in range(args.runs)]
+    stream = [stream_latency(f"ws://127.0.0.1:{app_port}/speech-to-text-stream", frames, frame_seconds)
+              for _ in range(args.runs)]
+    app_server.shutdown()
+    stub_server.shutdown()
+
+    print(f"{'mode':>8} {'final text p50 ms':>18} {'max ms':>8}")
+    for mode, latencies in (("upload", upload), ("stream", stream)):
+        print(f"{mode:>8} {statistics.median(latencies) * 1000:>18.0f} {max(latencies) * 1000:>8.0f}")
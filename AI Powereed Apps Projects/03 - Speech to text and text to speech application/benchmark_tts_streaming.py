@@ -0,0 +1,61 @@
+import argparse
+import json
+import os
+import statistics
+import time
+
+from benchmark_http_client import StubWatsonHandler, start_stub_server
+
+
+class SlowSynthesisHandler(StubWatsonHandler):
+    """Stub TTS service whose synthesis time grows with the length of the text."""
+
+    per_char = 0.0
+
+    def processing_delay(self, request_body):
+        if self.path.startswith("/text-to-speech"):
+            return self.delay + self.per_char * len(json.loads(request_body)["text"])
+        return self.delay
+
+
+reply = (
+    "Sure, here is a short overview. The Eiffel Tower is in Paris and was finished in 1889. "
+    "It was built for the World's Fair and was the tallest structure in the world for about forty years. "
+    "Today it is one of the most visited monuments anywhere. "
+    "You can take the stairs to the second floor or a lift all the way to the top. "
+    "The view is best just before sunset. Would you like tips for visiting?"
+)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare time-to-first-audio of whole-reply and sentence-streamed TTS.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--delay-ms", type=float, default=150, help="Fixed time the stub spends per synthesis request")
+    parser.add_argument("--per-char-ms", type=float, default=3, help="Additional stub time per character of text")
+    args = parser.parse_args()
+
+    SlowSynthesisHandler.per_char = args.per_char_ms / 1000
+    server, base_url = start_stub_server(args.delay_ms / 1000, handler=SlowSynthesisHandler)
+    os.environ["TTS_BASE_URL"] = base_url
+    from worker import text_to_speech, text_to_speech_segments
+
+    results = {"whole reply": [], "sentence stream": []}
+    totals = {"whole reply": [], "sentence stream": []}
+    for _ in range(args.runs):
+        # Bypass the TTS cache so every run measures synthesis
+        start = time.perf_counter()
+        text_to_speech(reply, use_cache=False)
+        results["whole reply"].append(time.perf_counter() - start)
+        totals["whole reply"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        first_audio = None
+        for _ in text_to_speech_segments(reply, use_cache=False):
+            if first_audio is None:
+                first_audio = time.perf_counter() - start
+        results["sentence stream"].append(first_audio)
+        totals["sentence stream"].append(time.perf_counter() - start)
+    server.shutdown()
+
+    print(f"{'mode':>16} {'first audio p50 ms':>19} {'all audio p50 ms':>17}")
+    for mode in results:
+        print(f"{mode:>16} {statistics.median(results[mode]) * 1000:>19.0f} {statistics.median(totals[mode]) * 1000:>17.0f}")
@@ -0,0 +1,143 @@
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Responses worth retrying: rate limiting and temporary server-side failures
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of sending a request while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing service for a while.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls fail fast
+    for `reset_timeout` seconds. Then one trial call is let through: if it succeeds the
+    circuit closes again, otherwise it stays open for another `reset_timeout`.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Ends a trial call without a verdict (e.g. it was cancelled), so the next call can be the trial."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class ServiceClient:
+    """
+    HTTP client for one service, shared by every request to it.
+
+    Connections are kept alive in a pool and reused, every request has connect and read
+    timeouts, failed requests are retried a bounded number of times with jittered
+    exponential backoff, and a circuit breaker stops calls to a service that keeps failing.
+    """
+
+    def __init__(self, base_url, connect_timeout=3.05, read_timeout=30, max_retries=2, backoff=0.25,
+                 max_backoff=4, pool_size=10, failure_threshold=5, reset_timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post(self, path, **kwargs):
+        """
+        Sends a POST request to `base_url + path`; takes the same arguments as `requests.post`.
+
+        Raises:
+            CircuitOpenError: If the service has been failing and the circuit is open.
+            requests.exceptions.RequestException: If the request still fails after the retries.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {self.base_url}, not sending request")
+
+        kwargs.setdefault('timeout', self.timeout)
+        url = self.base_url + path
+        recorded = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = self.session.post(url, **kwargs)
+                    if response.status_code not in RETRY_STATUSES:
+                        response.raise_for_status()
+                        recorded = True
+                        self.breaker.record_success()
+                        return response
+                    response.close()  # Release the connection back to the pool before retrying
+                    error = requests.exceptions.HTTPError(f"{response.status_code} from {url}", response=response)
+                except requests.exceptions.HTTPError as e:
+                    # Other errors won't get better by retrying; only server errors count against the service
+                    recorded = True
+                    if e.response.status_code >= 500:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                    raise
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    error = e
+
+                if attempt < self.max_retries:
+                    # Full jitter: wait a random time up to the exponential backoff
+                    delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                    logging.warning(f"Request to {url} failed ({error}), retrying in {delay:.2f}s")
+                    time.sleep(delay)
+
+            recorded = True
+            self.breaker.record_failure()
+            raise error
+        finally:
+            if not recorded:
+                # Any other error (undecodable body, invalid URL...) is a failure too, so a half-open
+                # circuit's trial always ends and the circuit can't stay open forever
+                self.breaker.record_failure()
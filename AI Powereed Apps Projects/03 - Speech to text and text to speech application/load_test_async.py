@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmark_http_client import StubWatsonHandler, start_stub_server
+
+
+class StubServicesHandler(StubWatsonHandler):
+    """Stub Watson STT/TTS plus an OpenAI-compatible chat completions endpoint."""
+
+    llm_delay = 0.0
+    replies = itertools.count()
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            return super().do_POST()
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.llm_delay)
+        # A different reply every time so the TTS cache doesn't answer
+        content = f"Reply number {next(self.replies)}. Here is what I found."
+        body = json.dumps({
+            "id": "stub", "object": "chat.completion", "created": 0, "model": "gpt-3.5-turbo",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_app(mode, port, stub_url, threads):
+    env = dict(os.environ, STT_BASE_URL=stub_url, TTS_BASE_URL=stub_url, OPENAI_BASE_URL=stub_url + "/v1",
+               OPENAI_API_KEY="stub", TTS_CACHE_PATH=os.path.join(tempfile.mkdtemp(), "tts_cache.sqlite3"))
+    if mode == "sync":
+        # The threaded Flask app as it would be deployed: one process with a fixed number of threads
+        command = ["gunicorn", "-k", "gthread", "-w", "1", "--threads", str(threads),
+                   "--bind", f"127.0.0.1:{port}", "server:app"]
+    else:
+        command = ["hypercorn", "-w", "1", "--backlog", "1024", "--bind", f"127.0.0.1:{port}", "async_server:app"]
+    return subprocess.Popen([sys.executable, "-m"] + command, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def conversation(client, url, requests_each, latencies, errors):
+    for i in range(requests_each):
+        start = time.perf_counter()
+        try:
+            response = await client.post(url, json={"userMessage": f"question {i}", "voice": ""})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        except httpx.HTTPError:
+            errors.append(1)
+
+
+async def run_load(base_url, concurrency, requests_each, timeout):
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(conversation(client, base_url + "/process-message", requests_each, latencies, errors)
+                               for _ in range(concurrency)))
+        seconds = time.perf_counter() - start
+    return latencies, len(errors), seconds
+
+
+async def wait_until_up(base_url):
+    async with httpx.AsyncClient() as client:
+        for _ in range(150):
+            try:
+                await client.get(base_url + "/tts-cache-stats")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{base_url} did not start")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the threaded and the asyncio serving modes against stub services.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--requests-each", type=int, default=3, help="Messages sent by each simulated conversation")
+    parser.add_argument("--llm-ms", type=float, default=500, help="Stub LLM response time")
+    parser.add_argument("--tts-ms", type=float, default=200, help="Stub TTS response time")
+    parser.add_argument("--threads", type=int, default=16, help="Threads of the sync server")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--port", type=int, default=8077)
+    args = parser.parse_args()
+
+    StubServicesHandler.llm_delay = args.llm_ms / 1000
+    stub_server, stub_url = start_stub_server(args.tts_ms / 1000, handler=StubServicesHandler)
+
+    print(f"{'mode':>6} {'clients':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode in ("sync", "async"):
+        app = start_app(mode, args.port, stub_url, args.threads)
+        base_url = f"http://127.0.0.1:{args.port}"
+        try:
+            asyncio.run(wait_until_up(base_url))
+            for concurrency in args.concurrency:
+                latencies, errors, seconds = asyncio.run(run_load(base_url, concurrency, args.requests_each, args.timeout))
+                latencies.sort()
+                p50 = statistics.median(latencies) * 1000 if latencies else float("nan")
+                p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000 if latencies else float("nan")
+                print(f"{mode:>6} {concurrency:>8} {len(latencies) / seconds:>8.1f} {p50:>8.0f} {p99:>8.0f} {errors:>7}")
+        finally:
+            app.terminate()
+            app.wait()
+    stub_server.shutdown()
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_message(message):
+    """Normalizes a user message so that ways of typing or saying the same question share an entry."""
+    text = " ".join(unicodedata.normalize("NFC", message).casefold().split())
+    return re.sub(r'[\s.!?]+$', '', text)
+
+
+def load_embedder(model_name="sentence-transformers/all-MiniLM-L6-v2"):
+    """
+    Loads a local sentence embedding model for semantic matching.
+
+    Returns:
+        callable: Maps a text to its unit-length embedding (np.ndarray).
+    """
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        raise ImportError("Semantic matching needs sentence-transformers: pip install sentence-transformers")
+    model = SentenceTransformer(model_name, device="cpu")
+    return lambda text: model.encode(text, normalize_embeddings=True)
+
+
+class ResponseCache:
+    """
+    Caches LLM answers by normalized user message, system prompt and model parameters.
+
+    Entries expire `ttl` seconds after they were stored and the least recently used entry is
+    evicted beyond `max_entries`. With an `embed` function and a `similarity_threshold`, a
+    message with no exact entry can also be answered from the entry whose message is the most
+    similar (cosine similarity of the embeddings), if it was asked with the same prompt and
+    parameters.
+    """
+
+    def __init__(self, max_entries=1024, ttl=24 * 3600, embed=None, similarity_threshold=0.92, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (context, answer, stored at, LLM seconds, embedding)
+        self._lock = threading.Lock()
+
+        # Counters
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.seconds_saved = 0.0
+        self._llm_seconds = 0.0
+        self._llm_calls = 0
+
+    def key(self, message, system_prompt, **params):
+        """Returns the cache key of `message` asked with `system_prompt` and the model `params`."""
+        data = json.dumps([normalize_message(message), self._context(system_prompt, params)])
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def get(self, message, system_prompt, **params):
+        """Returns the cached answer, or None on a miss."""
+        key = self.key(message, system_prompt, **params)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.exact_hits += 1
+                self.seconds_saved += entry[3]
+                return entry[1]
+            if self.embed is None:
+                self.misses += 1
+                return None
+
+        # Embedding takes milliseconds, so it happens outside the lock
+        embedding = self.embed(normalize_message(message))
+        context = self._context(system_prompt, params)
+        with self._lock:
+            candidates = [(k, e) for k, e in self._entries.items() if e[0] == context and not self._expired(e)]
+            if candidates:
+                similarities = np.stack([e[4] for _, e in candidates]) @ embedding
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.semantic_hits += 1
+                    self.seconds_saved += entry[3]
+                    return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, message, system_prompt, answer, llm_seconds=0.0, **params):
+        """Stores the answer the LLM gave to `message`, and how long it took."""
+        key = self.key(message, system_prompt, **params)
+        embedding = self.embed(normalize_message(message)) if self.embed is not None else None
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (self._context(system_prompt, params), answer, self.clock(), llm_seconds, embedding)
+            self._llm_seconds += llm_seconds
+            self._llm_calls += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record_bypass(self):
+        """Counts a request that asked not to use the cache."""
+        with self._lock:
+            self.bypassed += 1
+
+    def stats(self):
+        """Returns the hit/miss counters and the LLM time the hits saved."""
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "hits": hits,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "seconds_saved": self.seconds_saved,
+                "mean_llm_ms": self._llm_seconds / self._llm_calls * 1000 if self._llm_calls else 0.0,
+                "entries": len(self._entries),
+            }
+
+    def _context(self, system_prompt, params):
+        return json.dumps([system_prompt, params], sort_keys=True)
+
+    def _expired(self, entry):
+        return self.clock() - entry[2] > self.ttl
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
@@ -2,15 +2,48 @@ import base64
 import json
 import logging
 import os
+import struct
+import time
+import requests
+import simple_websocket
 from flask import Flask, render_template, request
-from worker import speech_to_text, text_to_speech, openai_process_message
+from flask_sock import Sock
+from admission import AdmissionRejected
+from worker import (speech_to_text, open_speech_to_text_stream, text_to_speech, text_to_speech_segments,
+                    text_to_speech_stream, openai_process_message, llm_cache, tts_cache, stt_admission,
+                    tts_admission, audio_response_parts, AUDIO_FORMATS)
 from flask_cors import CORS
 import werkzeug 
 
 # Initialize Flask App and Logging
 app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "*"}})  # Enable CORS
+CORS(app, resources={r"/*": {"origins": "*"}}, expose_headers=['X-Response-Text'])  # Enable CORS
 logging.basicConfig(level=logging.INFO)  # Configure logging
+sock = Sock(app)  # WebSocket routes
+
+# Requests the speech runtimes have no room for are shed with a hint of when to come back
+@app.errorhandler(AdmissionRejected)
+def admission_rejected(e):
+    """Returns 503 with a Retry-After header."""
+    logging.warning(f"Request shed: {e}")
+    response = app.response_class(
+        response=json.dumps({'error': 'Server busy, please retry', 'retryAfter': e.retry_after}),
+        status=503,
+        mimetype='application/json'
+    )
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+# A failing or circuit-broken TTS service gets the same JSON 503 (the STT route handles its own errors)
+@app.errorhandler(requests.exceptions.RequestException)
+def speech_service_failed(e):
+    """Returns 503 with a JSON error instead of Flask's HTML 500 page."""
+    logging.error(f"Text-to-speech failed: {e}")
+    return app.response_class(
+        response=json.dumps({'error': 'Text-to-speech failed, please retry'}),
+        status=503,
+        mimetype='application/json'
+    )
 
 # Route for the main page
 @app.route('/', methods=['GET'])
@@ -32,7 +65,7 @@ def speech_to_text_route():
         return "Bad Request", 400  # Return 400 status on bad request
 
     # Convert audio to text
-    text = speech_to_text(audio_binary)  
+    text = speech_to_text(audio_binary, request.content_type)  
 
     # Create JSON response with the transcribed text
     response = app.response_class(
@@ -44,6 +77,60 @@ def speech_to_text_route():
     return response
 
 
+# WebSocket route transcribing speech while the user is still talking
+@sock.route('/speech-to-text-stream')
+def speech_to_text_stream_route(ws):
+    """
+    Streams speech-to-text: the browser sends {"contentType": ...}, then the audio frames as
+    they are recorded, then {"action": "stop"}. Interim and final transcripts are pushed back
+    as they are recognized, followed by {"type": "done", "text": ...} with the whole transcript.
+    """
+    start = json.loads(ws.receive())
+    logging.info(f"Streaming speech-to-text request ({start.get('contentType')}).")
+    try:
+        recognizer = open_speech_to_text_stream(start.get('contentType', 'audio/webm'),
+                                                lambda result: ws.send(json.dumps(result)))
+    except AdmissionRejected as e:
+        logging.warning(f"Request shed: {e}")
+        ws.send(json.dumps({'type': 'error', 'error': 'Server busy, please retry', 'retryAfter': e.retry_after}))
+        return
+    except (simple_websocket.ConnectionError, OSError) as e:
+        logging.error(f"Error connecting to speech-to-text service: {e}")
+        ws.send(json.dumps({'type': 'error', 'error': 'Speech-to-text service unavailable'}))
+        return
+
+    with recognizer:
+        while True:
+            message = ws.receive()
+            if not isinstance(message, bytes):
+                break  # {"action": "stop"}: the recording has ended
+            recognizer.send(message)
+        stopped = time.perf_counter()
+        text = recognizer.finish()
+
+    latency_ms = round((time.perf_counter() - stopped) * 1000)
+    logging.info(f"End of recording to final text: {latency_ms} ms")
+    ws.send(json.dumps({'type': 'done', 'text': text or 'null', 'finalLatencyMs': latency_ms}))
+
+
+# Clients can keep a request away from the LLM cache with "cache": false in the JSON body
+# or a Cache-Control: no-cache (or no-store) header
+def use_llm_cache():
+    cache_control = request.cache_control
+    return request.json.get('cache', True) is not False and not (cache_control.no_cache or cache_control.no_store)
+
+
+# Streams `audio` between `head` and `tail`, closing it (and releasing its TTS session) if the client leaves
+def surround(head, audio, tail):
+    try:
+        yield head
+        yield from audio
+        yield tail
+    finally:
+        if hasattr(audio, 'close'):
+            audio.close()
+
+
 # Route to process user messages with OpenAI and generate speech
 @app.route('/process-message', methods=['POST'])
 def process_message_route():
@@ -56,11 +143,25 @@ def process_message_route():
     logging.info(f"User message: {user_message}")
     logging.info(f"Selected voice: {voice}")
 
+    # JSON with base64 audio stays the default for existing clients; clients that ask for
+    # audio get it streamed as it arrives from the TTS service, with the text in a header
+    media_type = request.accept_mimetypes.best_match(['application/json'] + list(AUDIO_FORMATS),
+                                                     default='application/json')
+
     # Process the message with OpenAI
-    openai_response_text = openai_process_message(user_message)
+    openai_response_text = openai_process_message(user_message, use_llm_cache())
     # Remove empty lines for cleaner output
     openai_response_text = os.linesep.join([s for s in openai_response_text.splitlines() if s])
 
+    if media_type != 'application/json':
+        audio = text_to_speech_stream(openai_response_text, voice, media_type)
+        # The text goes in a header, or in a multipart body with the audio if it is too long for one
+        content_type, headers, head, tail = audio_response_parts(openai_response_text, media_type)
+        response = app.response_class(surround(head, audio, tail), status=200, content_type=content_type)
+        response.headers.update(headers)
+        response.vary.add('Accept')
+        return response
+
     # Convert OpenAI's response to speech
     openai_response_speech = text_to_speech(openai_response_text, voice)
     # Encode speech audio as base64
@@ -72,10 +173,108 @@ def process_message_route():
         status=200,
         mimetype='application/json'
     )
+    response.vary.add('Accept')
     logging.info(response)
     return response
 
 
+# Frame of the /process-message-stream response: a one-byte kind, the payload length
+# as four big-endian bytes, then the payload
+def frame(kind, payload):
+    return kind + struct.pack('>I', len(payload)) + payload
+
+
+# Route to process user messages and stream the speech sentence by sentence
+@app.route('/process-message-stream', methods=['POST'])
+def process_message_stream_route():
+    """
+    Like /process-message, but streams the reply as binary frames so playback can start
+    before the whole reply is synthesized: a "T" frame with the reply text as JSON, one "A"
+    frame per sentence with its WAV audio, in order, and a "D" frame with timings as JSON.
+    If the LLM call or the synthesis fails, the stream ends with an "E" frame with an error message
+    instead of the "D" frame.
+    """
+    start = time.perf_counter()
+    user_message = request.json['userMessage']
+    voice = request.json['voice']
+    use_cache = use_llm_cache()
+    logging.info(f"Streaming reply to: {user_message} (voice: {voice})")
+
+    def generate():
+        # The 200 status has gone out with the first frame, so failures are reported as an "E" frame
+        try:
+            openai_response_text = openai_process_message(user_message, use_cache)
+        except Exception as e:
+            logging.exception(f"Processing the message failed while streaming: {e}")
+            yield frame(b'E', json.dumps({"error": "The assistant could not answer, please retry"}).encode())
+            return
+        openai_response_text = os.linesep.join([s for s in openai_response_text.splitlines() if s])
+        yield frame(b'T', json.dumps({"openaiResponseText": openai_response_text}).encode())
+
+        first_audio = None
+        segments = 0
+        try:
+            for _, audio in text_to_speech_segments(openai_response_text, voice):
+                if first_audio is None:
+                    first_audio = time.perf_counter() - start
+                    logging.info(f"Time to first audio: {first_audio * 1000:.0f} ms")
+                segments += 1
+                yield frame(b'A', audio)
+        except AdmissionRejected as e:
+            logging.warning(f"Request shed while streaming: {e}")
+            yield frame(b'E', json.dumps({"error": "Server busy, please retry", "retryAfter": e.retry_after}).encode())
+            return
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Text-to-speech failed while streaming: {e}")
+            yield frame(b'E', json.dumps({"error": "Text-to-speech failed"}).encode())
+            return
+        except Exception as e:
+            logging.exception(f"Streaming the reply failed: {e}")
+            yield frame(b'E', json.dumps({"error": "Text-to-speech failed"}).encode())
+            return
+
+        timings = {
+            "segments": segments,
+            "firstAudioMs": round(first_audio * 1000) if first_audio is not None else None,
+            "totalMs": round((time.perf_counter() - start) * 1000),
+        }
+        yield frame(b'D', json.dumps(timings).encode())
+
+    return app.response_class(generate(), status=200, mimetype='application/octet-stream')
+
+
+# Route reporting how well the TTS cache is doing
+@app.route('/tts-cache-stats', methods=['GET'])
+def tts_cache_stats_route():
+    """Returns the TTS cache hit rate and size as JSON."""
+    return app.response_class(
+        response=json.dumps(tts_cache.stats()),
+        status=200,
+        mimetype='application/json'
+    )
+
+
+# Route reporting how many questions the LLM cache answered
+@app.route('/llm-cache-stats', methods=['GET'])
+def llm_cache_stats_route():
+    """Returns the LLM cache hit rate and the LLM time it saved as JSON."""
+    return app.response_class(
+        response=json.dumps(llm_cache.stats()),
+        status=200,
+        mimetype='application/json'
+    )
+
+
+# Route reporting the load the app is putting on the speech runtimes
+@app.route('/admission-stats', methods=['GET'])
+def admission_stats_route():
+    """Returns the budget in use and the admitted, queued and rejected counts of each runtime as JSON."""
+    return app.response_class(
+        response=json.dumps({'stt': stt_admission.stats(), 'tts': tts_admission.stats()}),
+        status=200,
+        mimetype='application/json'
+    )
+
 
 if __name__ == "__main__":
     app.run(port=8000, host='0.0.0.0')  # Start the Flask app on port 8000
@@ -0,0 +1,179 @@
+import argparse
+import heapq
+import json
+import math
+import os
+import random
+
+from admission import load_requirements
+from tune_session_pools import (CONFIG_DIRS, generate_policy, load_policy, load_trace, policy_name,
+                                usage_from_trace)
+
+REQUIREMENTS = {
+    'stt': ('models/stt/chuck_var/resourceRequirements.py', 'RnntResourceRequirement'),
+    'tts': ('models/tts/config/resourceRequirements.py', 'WTTSDnnResourceRequirement'),
+}
+
+
+class Session:
+    def __init__(self):
+        self.uses = 0
+        self.idle_since = None
+
+
+def simulate(trace, policy, session_bytes, idle_timeout=300, warm_up=2.0):
+    """
+    Replays a trace against a runtime's session pools.
+
+    A request takes an idle session of its model if there is one and otherwise starts a cold
+    one. Finished sessions go back to the pool; sessions beyond `minWarmSessions` are dropped
+    after `idle_timeout` seconds without use, and a session that has served `maxUseCount`
+    requests is dropped and, if that leaves fewer than `minWarmSessions`, replaced by a new
+    one that is ready after `warm_up` seconds.
+
+    Args:
+        trace (list): (start time, model, duration) of every session, by start time.
+        policy (dict): Output of `load_policy` or `generate_policy`.
+        session_bytes (int): Memory of one live session (its model class's marginalMem).
+
+    Returns:
+        dict: Requests, cold starts (in total and by model), recycled sessions, and the peak
+        and time-averaged memory of the live sessions in MB.
+    """
+    pools = {}
+    for model in {model for _, model, _ in trace} | set(policy['models']):
+        pool = policy['models'].get(model, policy['default'])
+        pools[model] = {'min_warm': pool.get('minWarmSessions', 0),
+                        'max_uses': pool.get('maxUseCount', math.inf),
+                        'idle': [], 'live': 0}
+
+    start = trace[0][0] if trace else 0
+    events, order = [], 0
+    for arrival in trace:
+        events.append((arrival[0], order, 'arrival', arrival))
+        order += 1
+    heapq.heapify(events)
+
+    def schedule(time, kind, payload):
+        nonlocal order
+        heapq.heappush(events, (time, order, kind, payload))
+        order += 1
+
+    # The runtime starts the pre-warmed sessions when it comes up
+    for pool in pools.values():
+        pool['idle'] = [Session() for _ in range(pool['min_warm'])]
+        pool['live'] = pool['min_warm']
+
+    live = sum(pool['live'] for pool in pools.values())
+    peak, byte_seconds, now = live, 0.0, start
+    cold_starts, cold_by_model, recycled = 0, {}, 0
+
+    while events:
+        time, _, kind, payload = heapq.heappop(events)
+        byte_seconds += live * (time - now)
+        now = time
+
+        if kind == 'arrival':
+            _, model, duration = payload
+            pool = pools[model]
+            if pool['idle']:
+                session = pool['idle'].pop()  # Most recently used, so the others can time out
+            else:
+                session = Session()
+                pool['live'] += 1
+                live += 1
+                cold_starts += 1
+                cold_by_model[model] = cold_by_model.get(model, 0) + 1
+            schedule(time + duration, 'end', (model, session))
+
+        elif kind == 'end':
+            model, session = payload
+            pool = pools[model]
+            session.uses += 1
+            if session.uses >= pool['max_uses']:
+                pool['live'] -= 1
+                live -= 1
+                recycled += 1
+                if pool['live'] < pool['min_warm']:
+                    pool['live'] += 1
+                    live += 1
+                    schedule(time + warm_up, 'ready', (model, Session()))
+            else:
+                session.idle_since = time
+                pool['idle'].append(session)
+                schedule(time + idle_timeout, 'expire', (model, session, time))
+
+        elif kind == 'ready':
+            model, session = payload
+            session.idle_since = time
+            pools[model]['idle'].append(session)
+
+        elif kind == 'expire':
+            model, session, idle_since = payload
+            pool = pools[model]
+            if session.idle_since == idle_since and session in pool['idle'] and pool['live'] > pool['min_warm']:
+                pool['idle'].remove(session)
+                pool['live'] -= 1
+                live -= 1
+
+        peak = max(peak, live)
+
+    elapsed = max(now - start, 1e-9)
+    return {
+        'requests': len(trace),
+        'cold_starts': cold_starts,
+        'cold_by_model': cold_by_model,
+        'recycled': recycled,
+        'peak_memory_mb': peak * session_bytes / 2 ** 20,
+        'mean_memory_mb': byte_seconds / elapsed * session_bytes / 2 ** 20,
+    }
+
+
+def synthetic_trace(models, hours=4, requests_per_hour=2000, popularity=1.2, mean_duration=2.0, seed=0):
+    """
+    A usage trace where the traffic goes to a few of the configured models: Poisson arrivals,
+    model popularity following a Zipf law with exponent `popularity`, exponential durations.
+    """
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) ** popularity for rank in range(len(models))]
+    trace, time = [], 0.0
+    while True:
+        time += rng.expovariate(requests_per_hour / 3600)
+        if time > hours * 3600:
+            return trace
+        trace.append((time, rng.choices(models, weights)[0], rng.expovariate(1 / mean_duration)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a usage trace against the current and a usage-driven session pool config.")
+    parser.add_argument("service", choices=CONFIG_DIRS)
+    parser.add_argument("--trace", help="Usage log to replay (default: a synthetic trace over the configured models)")
+    parser.add_argument("--train-fraction", type=float, default=0.5,
+                        help="Generate the new policy from this first part of the trace and replay the rest")
+    parser.add_argument("--idle-timeout", type=float, default=300, help="Seconds an extra idle session is kept")
+    parser.add_argument("--hours", type=float, default=4, help="Length of the synthetic trace")
+    parser.add_argument("--requests-per-hour", type=float, default=2000, help="Load of the synthetic trace")
+    parser.add_argument("--models-used", type=int, default=4, help="How many of the configured models the synthetic trace uses")
+    args = parser.parse_args()
+
+    old = load_policy(CONFIG_DIRS[args.service])
+    if args.trace:
+        trace = load_trace(args.trace)
+    else:
+        with open(os.path.join(CONFIG_DIRS[args.service], 'env_config.json')) as f:
+            models = json.load(f)['clusterGroups']['default']['models']
+        trace = synthetic_trace(models[:args.models_used], args.hours, args.requests_per_hour)
+
+    split = int(len(trace) * args.train_fraction)
+    new = generate_policy(usage_from_trace(trace[:split]))
+    path, requirement_class = REQUIREMENTS[args.service]
+    session_bytes = load_requirements(path)[requirement_class]['marginalMem']
+
+    print(f"Replaying {len(trace) - split} of {len(trace)} requests; new policy generated from the first {split}")
+    print(f"{'policy':>7} {'pre-warmed':>10} {'cold starts':>11} {'recycled':>8} {'peak MB':>8} {'mean MB':>8}")
+    for name, policy in (("old", old), ("new", new)):
+        result = simulate(trace[split:], policy, session_bytes, args.idle_timeout)
+        print(f"{name:>7} {len(policy['models']):>10} {result['cold_starts']:>11} {result['recycled']:>8} "
+              f"{result['peak_memory_mb']:>8.0f} {result['mean_memory_mb']:>8.0f}")
+    for model, pool in new['models'].items():
+        print(f"  {model}: {policy_name(pool)}")
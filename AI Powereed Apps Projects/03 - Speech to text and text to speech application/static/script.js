@@ -47,6 +47,84 @@ const processUserMessage = async (userMessage) => {
   return response;
 };
 
+// Streams the reply from /process-message-stream. The body is a sequence of frames: a
+// one-byte kind ("T" reply text, "A" WAV audio of one sentence, "E" error, "D" done with
+// timings), the payload length as four big-endian bytes, then the payload. onError is called
+// once with a message if the request fails, the server sends an "E" frame, or the stream
+// ends before its "D" frame.
+const processUserMessageStream = async (userMessage, onText, onAudio, onError) => {
+  const start = performance.now();
+  let response;
+  try {
+    response = await fetch(baseUrl + "/process-message-stream", {
+      method: "POST",
+      headers: { Accept: "application/octet-stream", "Content-Type": "application/json" },
+      body: JSON.stringify({ userMessage: userMessage, voice: voiceOption }),
+    });
+  } catch (e) {
+    onError(`Could not reach the server: ${e.message}`);
+    return;
+  }
+  if (!response.ok) {
+    // Shed requests (503) explain themselves in JSON; other errors may be an HTML page
+    const body = await response.text();
+    let message = `The server answered ${response.status}`;
+    try {
+      message = JSON.parse(body).error || message;
+    } catch (e) {}
+    onError(message);
+    return;
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = new Uint8Array(0);
+  let firstAudio = null;
+  let finished = false;
+
+  try {
+    while (!finished) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      const merged = new Uint8Array(buffer.length + value.length);
+      merged.set(buffer);
+      merged.set(value, buffer.length);
+      buffer = merged;
+
+      // Handle every complete frame received so far
+      while (buffer.length >= 5) {
+        const length = new DataView(buffer.buffer, buffer.byteOffset + 1, 4).getUint32(0);
+        if (buffer.length < 5 + length) break;
+        const kind = String.fromCharCode(buffer[0]);
+        const payload = buffer.slice(5, 5 + length);
+        buffer = buffer.slice(5 + length);
+
+        if (kind === "T") {
+          onText(JSON.parse(decoder.decode(payload)));
+        } else if (kind === "A") {
+          if (firstAudio === null) {
+            firstAudio = performance.now() - start;
+            console.log(`Time to first audio: ${firstAudio.toFixed(0)} ms`);
+          }
+          onAudio(new Blob([payload], { type: "audio/wav" }));
+        } else if (kind === "E") {
+          onError(JSON.parse(decoder.decode(payload)).error);
+          finished = true;
+          break;
+        } else if (kind === "D") {
+          console.log("Reply timings (server):", JSON.parse(decoder.decode(payload)));
+          finished = true;
+          break;
+        }
+      }
+    }
+  } catch (e) {
+    onError(`The reply was interrupted: ${e.message}`);
+    return;
+  }
+  if (!finished) onError("The reply was cut off");
+};
+
 const cleanTextInput = (value) => {
   return value
     .trim() // remove starting and ending spaces
@@ -55,17 +133,70 @@ const cleanTextInput = (value) => {
     .replace(/[<>&;]/g, ""); // sanitize inputs
 };
 
+// Streams the recording to /speech-to-text-stream while the user is talking and shows the
+// interim transcript in the input box. finish() resolves to the final transcript, or null
+// if streaming failed so the caller can upload the recording instead.
+const openSpeechToTextStream = (contentType) => {
+  const socket = new WebSocket(baseUrl.replace(/^http/, "ws") + "/speech-to-text-stream");
+  const pending = []; // Audio recorded before the connection was open
+  const finals = [];
+  let stoppedAt = null;
+  let resolveTranscript;
+  const transcript = new Promise((resolve) => (resolveTranscript = resolve));
+
+  socket.addEventListener("open", () => {
+    socket.send(JSON.stringify({ contentType: contentType }));
+    pending.forEach((chunk) => socket.send(chunk));
+    pending.length = 0;
+  });
+  socket.addEventListener("message", (event) => {
+    const message = JSON.parse(event.data);
+    if (message.type === "interim" || message.type === "final") {
+      $("#message-input").val([...finals, message.text].join(" "));
+      if (message.type === "final") finals.push(message.text);
+    } else if (message.type === "done") {
+      console.log(`End of recording to final text: ${(performance.now() - stoppedAt).toFixed(0)} ms`);
+      resolveTranscript(message.text);
+    } else if (message.type === "error") {
+      console.error(message.error);
+      resolveTranscript(null);
+    }
+  });
+  // Resolving again after "done" has no effect
+  socket.addEventListener("error", () => resolveTranscript(null));
+  socket.addEventListener("close", () => resolveTranscript(null));
+
+  return {
+    send: (chunk) => {
+      if (socket.readyState === WebSocket.OPEN) socket.send(chunk);
+      else if (socket.readyState === WebSocket.CONNECTING) pending.push(chunk);
+    },
+    finish: () => {
+      stoppedAt = performance.now();
+      const stop = () => socket.send(JSON.stringify({ action: "stop" }));
+      if (socket.readyState === WebSocket.OPEN) stop();
+      else if (socket.readyState === WebSocket.CONNECTING) socket.addEventListener("open", stop);
+      return transcript;
+    },
+  };
+};
+
 const recordAudio = () => {
   return new Promise(async (resolve) => {
     const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
     const mediaRecorder = new MediaRecorder(stream);
     const audioChunks = [];
+    let transcriber = null;
 
     mediaRecorder.addEventListener("dataavailable", (event) => {
       audioChunks.push(event.data);
+      transcriber.send(event.data);
     });
 
-    const start = () => mediaRecorder.start();
+    const start = () => {
+      transcriber = openSpeechToTextStream(mediaRecorder.mimeType);
+      mediaRecorder.start(250); // Hand over audio every 250 ms so it can be streamed
+    };
 
     const stop = () =>
       new Promise((resolve) => {
@@ -74,7 +205,8 @@ const recordAudio = () => {
           const audioUrl = URL.createObjectURL(audioBlob);
           const audio = new Audio(audioUrl);
           const play = () => audio.play();
-          resolve({ audioBlob, audioUrl, play });
+          const transcript = transcriber.finish();
+          resolve({ audioBlob, audioUrl, play, transcript });
         });
 
         mediaRecorder.stop();
@@ -111,6 +243,38 @@ const playResponseAudio = (function () {
   };
 })();
 
+// Returns a function that queues audio segments and plays them back-to-back
+const createAudioQueue = () => {
+  const queue = [];
+  let playing = false;
+
+  const playNext = () => {
+    if (queue.length === 0) {
+      playing = false;
+      return;
+    }
+    playing = true;
+    const url = URL.createObjectURL(queue.shift());
+    const snd = playResponseAudio(url);
+    const next = () => {
+      URL.revokeObjectURL(url);
+      playNext();
+    };
+    snd.addEventListener("ended", next);
+    snd.addEventListener("error", next);
+  };
+
+  return (segment) => {
+    queue.push(segment);
+    if (!playing) playNext();
+  };
+};
+
+const playAudioSegments = (segments) => {
+  const play = createAudioQueue();
+  segments.forEach(play);
+};
+
 const getRandomID = () => {
   return Date.now().toString(36) + Math.random().toString(36).substr(2);
 };
@@ -151,24 +315,45 @@ const populateUserMessage = (userMessage, userRecording) => {
 
 const populateBotResponse = async (userMessage) => {
   await showBotLoadingAnimation();
-  const response = await processUserMessage(userMessage);
+  const response = { openaiResponseText: "", speechSegments: [] };
   responses.push(response);
 
   const repeatButtonID = getRandomID();
   botRepeatButtonIDToIndexMap[repeatButtonID] = responses.length - 1;
-  hideBotLoadingAnimation();
-  // Append the random message to the message list
-  $("#message-list").append(
-    `<div class='message-line'><div class='message-box${
-      !lightMode ? " dark" : ""
-    }'>${
-      response.openaiResponseText
-    }</div><button id='${repeatButtonID}' class='btn volume repeat-button' onclick='playResponseAudio("data:audio/wav;base64," + responses[botRepeatButtonIDToIndexMap[this.id]].openaiResponseSpeech);console.log(this.id)'><i class='fa fa-volume-up'></i></button></div>`
+  const playSegment = createAudioQueue();
+
+  await processUserMessageStream(
+    userMessage,
+    (reply) => {
+      response.openaiResponseText = reply.openaiResponseText;
+      hideBotLoadingAnimation();
+      // Append the random message to the message list
+      $("#message-list").append(
+        `<div class='message-line'><div class='message-box${
+          !lightMode ? " dark" : ""
+        }'>${
+          response.openaiResponseText
+        }</div><button id='${repeatButtonID}' class='btn volume repeat-button' onclick='playAudioSegments(responses[botRepeatButtonIDToIndexMap[this.id]].speechSegments);console.log(this.id)'><i class='fa fa-volume-up'></i></button></div>`
+      );
+      scrollToBottom();
+    },
+    (segment) => {
+      // Start speaking as soon as the first sentence arrives
+      response.speechSegments.push(segment);
+      playSegment(segment);
+    },
+    (error) => {
+      console.error(error);
+      hideBotLoadingAnimation();
+      // Show the error in place of the reply, or below it if the text already arrived
+      $("#message-list").append(
+        `<div class='message-line'><div class='message-box${!lightMode ? " dark" : ""}'>${
+          response.openaiResponseText ? "The spoken reply was interrupted." : "Sorry, something went wrong."
+        } ${cleanTextInput(error)}</div></div>`
+      );
+      scrollToBottom();
+    }
   );
-
-  playResponseAudio("data:audio/wav;base64," + response.openaiResponseSpeech);
-
-  scrollToBottom();
 };
 
 $(document).ready(function () {
@@ -209,7 +394,8 @@ $(document).ready(function () {
       toggleRecording().then(async (userRecording) => {
         console.log("stop recording");
         await showUserLoadingAnimation();
-        const userMessage = await getSpeechToText(userRecording);
+        // Use the streamed transcript, or upload the recording if streaming failed
+        const userMessage = (await userRecording.transcript) ?? (await getSpeechToText(userRecording));
         populateUserMessage(userMessage, userRecording);
         populateBotResponse(userMessage);
       });
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import logging
+import threading
+
+import simple_websocket
+
+
+class StreamingRecognizer:
+    """
+    Sends audio to the Watson STT WebSocket interface while it is being recorded.
+
+    Interim and final results are passed to `on_result` as they come back, as
+    {"type": "interim" | "final", "text": ...}, from a background thread.
+    Use `send` for every audio frame and `finish` once the recording has stopped.
+    `on_close`, if given, is called once the recognizer is closed.
+    """
+
+    def __init__(self, url, content_type, on_result, on_close=None):
+        self.on_result = on_result
+        self.on_close = on_close
+        self.finals = []
+        self.error = None
+        self._done = threading.Event()
+
+        self._ws = simple_websocket.Client.connect(url)
+        self._ws.send(json.dumps({
+            'action': 'start',
+            'content-type': content_type,
+            'interim_results': True,
+        }))
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def send(self, frame):
+        try:
+            self._ws.send(frame)
+        except simple_websocket.ConnectionClosed:
+            pass  # The service ended the stream; the reader has logged why and `finish` returns what was recognized
+
+    def finish(self, timeout=10):
+        """Tells the service the audio has ended and returns the final transcript."""
+        try:
+            self._ws.send(json.dumps({'action': 'stop'}))
+        except simple_websocket.ConnectionClosed:
+            pass  # The reader has already stopped and logged why
+        if not self._done.wait(timeout):
+            logging.error("Timed out waiting for the final speech-to-text results")
+        return " ".join(self.finals)
+
+    def close(self):
+        try:
+            self._ws.close()
+        except simple_websocket.ConnectionClosed:
+            pass  # Already closed by the service
+        finally:
+            if self.on_close is not None:
+                self.on_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _read(self):
+        # The service says "listening" once after the start message and again after the
+        # final results for the audio sent before the stop message
+        listening = 0
+        try:
+            while listening < 2:
+                message = json.loads(self._ws.receive())
+                if 'error' in message:
+                    self.error = message['error']
+                    logging.error(f"Speech-to-text stream error: {self.error}")
+                    break
+                if message.get('state') == 'listening':
+                    listening += 1
+                    continue
+                for result in message.get('results', []):
+                    text = result['alternatives'][0]['transcript'].strip()
+                    if result.get('final'):
+                        self.finals.append(text)
+                    self.on_result({'type': 'final' if result.get('final') else 'interim', 'text': text})
+        except simple_websocket.ConnectionClosed:
+            logging.warning("Speech-to-text stream closed before the final results")
+        finally:
+            self._done.set()
+
+
+class AsyncStreamingRecognizer:
+    """
+    asyncio counterpart of `StreamingRecognizer` for the async serving mode; `on_result`
+    is a coroutine function and the methods are coroutines. Create it with `await open(...)`.
+    """
+
+    def __init__(self, ws, on_result, on_close=None):
+        self.on_result = on_result
+        self.on_close = on_close
+        self.finals = []
+        self.error = None
+        self._ws = ws
+        self._reader = asyncio.create_task(self._read())
+
+    @classmethod
+    async def open(cls, url, content_type, on_result, on_close=None):
+        ws = await simple_websocket.AioClient.connect(url)
+        await ws.send(json.dumps({
+            'action': 'start',
+            'content-type': content_type,
+            'interim_results': True,
+        }))
+        return cls(ws, on_result, on_close)
+
+    async def send(self, frame):
+        try:
+            await self._ws.send(frame)
+        except simple_websocket.ConnectionClosed:
+            pass  # The service ended the stream; the reader has logged why and `finish` returns what was recognized
+
+    async def finish(self, timeout=10):
+        """Tells the service the audio has ended and returns the final transcript."""
+        try:
+            await self._ws.send(json.dumps({'action': 'stop'}))
+        except simple_websocket.ConnectionClosed:
+            pass  # The reader has already stopped and logged why
+        try:
+            await asyncio.wait_for(asyncio.shield(self._reader), timeout)
+        except asyncio.TimeoutError:
+            logging.error("Timed out waiting for the final speech-to-text results")
+        return " ".join(self.finals)
+
+    async def close(self):
+        self._reader.cancel()
+        try:
+            await self._ws.close()
+        except simple_websocket.ConnectionClosed:
+            pass  # Already closed by the service
+        finally:
+            if self.on_close is not None:
+                self.on_close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _read(self):
+        # Same protocol as StreamingRecognizer._read
+        listening = 0
+        try:
+            while listening < 2:
+                message = json.loads(await self._ws.receive())
+                if 'error' in message:
+                    self.error = message['error']
+                    logging.error(f"Speech-to-text stream error: {self.error}")
+                    break
+                if message.get('state') == 'listening':
+                    listening += 1
+                    continue
+                for result in message.get('results', []):
+                    text = result['alternatives'][0]['transcript'].strip()
+                    if result.get('final'):
+                        self.finals.append(text)
+                    await self.on_result({'type': 'final' if result.get('final') else 'interim', 'text': text})
+        except simple_websocket.ConnectionClosed:
+            logging.warning("Speech-to-text stream closed before the final results")
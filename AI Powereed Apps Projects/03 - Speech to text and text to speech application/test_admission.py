@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+MB = 2 ** 20
+REQUIREMENTS = {
+    'Small': {'marginalMem': 100 * MB, 'marginalCpu': 10},
+    'Large': {'marginalMem': 900 * MB, 'marginalCpu': 10},
+}
+
+
+class FakeRuntime:
+    """A speech runtime that fails a session, as if out of memory, when more than `sessions` run at once."""
+
+    def __init__(self, sessions):
+        self.sessions = sessions
+        self.active = 0
+        self.peak = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    def synthesize(self, seconds=0.05):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            full = self.active > self.sessions
+        try:
+            if full:
+                self.failures += 1
+                raise MemoryError("runtime out of memory")
+            time.sleep(seconds)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def controller(memory_mb=500, cpu=100, max_queue=32, max_wait=5):
+    return AdmissionController(REQUIREMENTS, 'Small', memory_mb * MB, cpu,
+                               model_classes={'big': 'Large'}, max_queue=max_queue, max_wait=max_wait)
+
+
+def test_admits_sessions_that_fit_and_releases_their_budget():
+    admission = controller()
+    permits = [admission.acquire('voice') for _ in range(5)]
+    assert admission.stats()['memory_in_use_mb'] == 500
+    assert admission.stats()['in_flight'] == {'voice': 5}
+    for permit in permits:
+        permit.release()
+    permit.release()  # Releasing twice is harmless
+    stats = admission.stats()
+    assert stats['memory_in_use_mb'] == 0 and stats['cpu_in_use'] == 0
+    assert stats['in_flight'] == {}
+
+
+def test_rejects_when_no_room_within_max_wait():
+    admission = controller(max_wait=0.05)
+    permits = [admission.acquire('voice') for _ in range(5)]
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.acquire('voice')
+    assert rejected.value.retry_after >= 1
+    assert admission.stats()['rejected'] == 1
+    for permit in permits:
+        permit.release()
+
+
+def test_rejects_immediately_when_queue_is_full():
+    admission = controller(max_queue=0)
+    permits = [admission.acquire('voice') for _ in range(5)]
+    start = time.monotonic()
+    with pytest.raises(AdmissionRejected, match="queue"):
+        admission.acquire('voice')
+    assert time.monotonic() - start < 1
+    for permit in permits:
+        permit.release()
+
+
+def test_queued_call_is_admitted_when_a_session_ends():
+    admission = controller(max_wait=5)
+    permits = [admission.acquire('voice') for _ in range(5)]
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(admission.acquire('voice')))
+    waiter.start()
+    time.sleep(0.1)
+    assert not admitted and admission.stats()['waiting'] == 1
+    permits[0].release()
+    waiter.join(5)
+    assert len(admitted) == 1 and admission.stats()['queued'] == 1
+    for permit in permits[1:] + admitted:
+        permit.release()
+
+
+def test_idle_node_always_admits_one_session_even_after_earlier_sessions():
+    admission = controller(memory_mb=500, max_wait=0.05)
+    for _ in range(3):
+        # A 900 MB session is larger than the 500 MB envelope, but nothing else is running
+        with admission.acquire('big'):
+            with pytest.raises(AdmissionRejected):
+                admission.acquire('voice')
+    assert admission.stats()['admitted'] == 3
+
+
+def test_fake_runtime_never_overloaded_through_the_controller():
+    runtime = FakeRuntime(sessions=5)
+    admission = controller(memory_mb=500, max_wait=10)
+
+    def client():
+        for _ in range(5):
+            with admission.acquire('voice'):
+                runtime.synthesize(0.01)
+
+    clients = [threading.Thread(target=client) for _ in range(16)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    assert runtime.failures == 0 and runtime.peak <= 5
+    assert admission.stats()['admitted'] == 80 and admission.stats()['in_flight'] == {}
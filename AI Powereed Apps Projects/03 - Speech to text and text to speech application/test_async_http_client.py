@@ -0,0 +1,58 @@
+import asyncio
+
+import httpx
+import pytest
+
+from async_http_client import AsyncServiceClient
+
+
+def half_open_client(handler):
+    """An async client whose circuit is half-open and whose requests are answered by `handler`."""
+    client = AsyncServiceClient("http://service", max_retries=0, failure_threshold=1, reset_timeout=0)
+    client.client = httpx.AsyncClient(base_url="http://service", transport=httpx.MockTransport(handler))
+    client.breaker.record_failure()
+    assert client.breaker.state == "half-open"
+    return client
+
+
+def test_decoding_error_during_trial_does_not_leave_circuit_stuck():
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            raise httpx.DecodingError("bad gzip", request=request)
+        return httpx.Response(200)
+
+    async def scenario():
+        client = half_open_client(handler)
+        with pytest.raises(httpx.DecodingError):
+            await client.post("/recognize")
+        response = await client.post("/recognize")
+        await client.aclose()
+        return response, client.breaker.state
+
+    response, state = asyncio.run(scenario())
+    assert response.status_code == 200 and state == "closed"
+
+
+def test_cancelled_trial_lets_the_next_call_try():
+    async def handler(request):
+        if request.headers.get("x-slow"):
+            await asyncio.sleep(10)
+        return httpx.Response(200)
+
+    async def scenario():
+        client = half_open_client(handler)
+        # The client disconnects while the trial call is in flight
+        trial = asyncio.create_task(client.post("/recognize", headers={"x-slow": "1"}))
+        await asyncio.sleep(0.05)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        response = await client.post("/recognize")
+        await client.aclose()
+        return response, client.breaker.state, client.breaker.failures
+
+    response, state, failures = asyncio.run(scenario())
+    assert response.status_code == 200 and state == "closed" and failures == 0
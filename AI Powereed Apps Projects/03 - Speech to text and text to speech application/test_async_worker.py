@@ -0,0 +1,68 @@
+import asyncio
+import os
+import tempfile
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+# The worker creates its OpenAI client and TTS cache when imported
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("TTS_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "tts_cache.sqlite3"))
+
+import async_worker  # noqa: E402
+
+MB = 2 ** 20
+
+
+def controller(max_queue, max_wait):
+    """Room for one session at a time."""
+    return AdmissionController({'Voice': {'marginalMem': 100 * MB, 'marginalCpu': 10}}, 'Voice', 100 * MB, 100,
+                               max_queue=max_queue, max_wait=max_wait)
+
+
+def test_waiting_for_tts_does_not_hold_up_stt_admission():
+    stt = controller(max_queue=2, max_wait=5)
+    tts = controller(max_queue=2, max_wait=1)
+
+    async def run():
+        busy = await async_worker.admitted(tts, 'voice')
+        # A full TTS queue, and a burst of calls it turns away
+        waiting = [asyncio.ensure_future(async_worker.admitted(tts, 'voice')) for _ in range(2 + 20)]
+        await asyncio.sleep(0.1)
+
+        start = time.monotonic()
+        permit = await async_worker.admitted(stt, 'voice')
+        stt_seconds = time.monotonic() - start
+        permit.release()
+
+        busy.release()
+        results = await asyncio.gather(*waiting, return_exceptions=True)
+        for result in results:
+            if not isinstance(result, Exception):
+                result.release()
+        return stt_seconds, results
+
+    stt_seconds, results = asyncio.run(run())
+    assert stt_seconds < 0.5
+    assert async_worker.admission_executor(stt) is not async_worker.admission_executor(tts)
+    # The burst is turned away, the first waiter gets the session and the second times out behind it
+    assert sum(isinstance(result, AdmissionRejected) for result in results) == 21
+
+
+def test_cancelled_call_gives_its_session_back_once_admitted():
+    tts = controller(max_queue=2, max_wait=5)
+
+    async def run():
+        busy = await async_worker.admitted(tts, 'voice')
+        waiting = asyncio.ensure_future(async_worker.admitted(tts, 'voice'))
+        await asyncio.sleep(0.1)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        busy.release()
+        await asyncio.sleep(0.2)
+
+    asyncio.run(run())
+    assert tts.stats()['in_flight'] == {}
@@ -0,0 +1,89 @@
+import struct
+import wave
+from io import BytesIO
+
+import numpy as np
+import pytest
+
+from audio_preprocessing import decode, encode, prepare_audio, resample
+
+
+def tone(frequency, seconds, rate, level=0.5):
+    return (level * np.sin(2 * np.pi * frequency * np.arange(int(seconds * rate)) / rate)).astype(np.float32)
+
+
+def wav(samples, rate, channels=1):
+    buffer = BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes((samples * 32767).astype('<i2').tobytes())
+    return buffer.getvalue()
+
+
+def level_at(samples, rate, frequency):
+    """RMS level of `samples` at `frequency`, by correlating with a sine and a cosine."""
+    t = np.arange(len(samples)) / rate
+    return np.hypot(np.mean(samples * np.sin(2 * np.pi * frequency * t)),
+                    np.mean(samples * np.cos(2 * np.pi * frequency * t))) * np.sqrt(2)
+
+
+def mulaw_to_linear(codes):
+    """G.711 mu-law decoder, as the STT service applies it (14-bit result scaled to 16 bits)."""
+    codes = ~codes.astype(np.int32) & 0xFF
+    magnitude = (((codes & 0x0F) << 3) + 0x84) << ((codes >> 4) & 0x07)
+    return np.where(codes & 0x80, 0x84 - magnitude, magnitude - 0x84)
+
+
+@pytest.mark.parametrize('size', [0, 0xFFFFFFFF])
+def test_streamed_wav_without_a_data_size_is_read_to_the_end(size):
+    samples = tone(440, 0.5, 16000)
+    data = bytearray(wav(samples, 16000))
+    data_offset = data.index(b'data')
+    struct.pack_into('<I', data, 4, 0xFFFFFFFF)  # The RIFF size is unknown too
+    struct.pack_into('<I', data, data_offset + 4, size)
+
+    decoded, rate = decode(bytes(data))
+    assert rate == 16000 and decoded.shape == (len(samples), 1)
+    np.testing.assert_allclose(decoded[:, 0], samples, atol=2 / 32768)
+
+
+def test_resampling_keeps_speech_frequencies_and_removes_aliases():
+    rate, target = 48000, 16000
+    speech, alias = tone(440, 1, rate), tone(12000, 1, rate)  # 12 kHz would fold back to 4 kHz at 16 kHz
+    resampled, new_rate = resample(speech + alias, rate, target)
+
+    assert new_rate == target and len(resampled) == target
+    middle = resampled[1000:-1000]  # Away from the edges of the filter
+    assert level_at(middle, target, 440) == pytest.approx(level_at(speech, rate, 440), rel=0.02)
+    assert level_at(middle, target, 4000) < 0.005
+
+
+def test_audio_at_or_below_the_target_rate_is_not_resampled():
+    samples = tone(440, 0.1, 8000)
+    assert resample(samples, 8000, 16000) == (samples, 8000)
+
+
+def test_mulaw_round_trips_within_its_step_size():
+    samples = np.linspace(-1, 1, 2001, dtype=np.float32)
+    codes, media_type = encode(samples, 8000, 'mulaw')
+    assert media_type == 'audio/mulaw;rate=8000' and len(codes) == len(samples)
+
+    linear = mulaw_to_linear(np.frombuffer(codes, dtype=np.uint8)) / 32768
+    # mu-law steps grow with the level: about 1/256 of full scale near the top, finer near zero
+    error = np.abs(linear - samples)
+    assert error.max() < 0.02
+    assert error[np.abs(samples) < 0.01].max() < 0.001
+    assert encode(np.zeros(1, dtype=np.float32), 8000, 'mulaw')[0] == b'\xff'
+
+
+def test_stereo_48k_wav_is_prepared_as_16k_mono():
+    silence = np.zeros(24000, dtype=np.float32)
+    speech = np.concatenate([silence, tone(440, 1, 48000), silence])
+    stereo = np.stack([speech, speech], axis=1).reshape(-1)
+
+    audio, media_type = prepare_audio(wav(stereo, 48000, channels=2), 'audio/wav')
+    assert media_type == 'audio/l16;rate=16000'
+    # One second of speech plus 200 ms of padding on each side, as 16-bit samples
+    assert len(audio) // 2 == pytest.approx(1.4 * 16000, rel=0.03)
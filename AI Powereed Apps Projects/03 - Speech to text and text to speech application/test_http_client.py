@@ -0,0 +1,71 @@
+import pytest
+import requests
+
+from http_client import CircuitOpenError, ServiceClient
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code}", response=self)
+
+    def close(self):
+        pass
+
+
+def half_open_client(monkeypatch, outcomes):
+    """A client whose circuit is half-open, and whose requests return or raise `outcomes` in turn."""
+    client = ServiceClient("http://service", max_retries=0, failure_threshold=1, reset_timeout=0)
+    client.breaker.record_failure()
+    assert client.breaker.state == "half-open"
+    outcomes = iter(outcomes)
+
+    def post(url, **kwargs):
+        outcome = next(outcomes)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return FakeResponse(outcome)
+
+    monkeypatch.setattr(client.session, "post", post)
+    return client
+
+
+@pytest.mark.parametrize("error", [
+    requests.exceptions.ContentDecodingError("bad gzip"),
+    requests.exceptions.ChunkedEncodingError("connection broken"),
+    requests.exceptions.InvalidURL("bad url"),
+    ValueError("unexpected"),
+])
+def test_unexpected_error_during_trial_does_not_leave_circuit_stuck(monkeypatch, error):
+    client = half_open_client(monkeypatch, [error, 200])
+    with pytest.raises(type(error)):
+        client.post("/synthesize")
+    # The failed trial reopened the circuit; after the reset timeout the next trial goes through
+    assert client.post("/synthesize").status_code == 200
+    assert client.breaker.state == "closed"
+
+
+def test_successful_trial_closes_circuit(monkeypatch):
+    client = half_open_client(monkeypatch, [200])
+    client.post("/synthesize")
+    assert client.breaker.state == "closed"
+
+
+def test_only_one_trial_at_a_time(monkeypatch):
+    client = half_open_client(monkeypatch, [200])
+    assert client.breaker.allow()  # Someone else's trial is in flight
+    with pytest.raises(CircuitOpenError):
+        client.post("/synthesize")
+
+
+def test_server_errors_open_the_circuit(monkeypatch):
+    client = ServiceClient("http://service", max_retries=0, failure_threshold=2, reset_timeout=60)
+    monkeypatch.setattr(client.session, "post", lambda url, **kwargs: FakeResponse(500))
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            client.post("/synthesize")
+    with pytest.raises(CircuitOpenError):
+        client.post("/synthesize")
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from response_cache import ResponseCache, normalize_message
+
+PROMPT = "You are a helpful assistant."
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+# Embeddings of the (normalized) messages: the first two mean the same, the third doesn't
+EMBEDDINGS = {
+    "what's the weather like today": unit(1, 0.1, 0),
+    "how is the weather today": unit(1, 0.2, 0),
+    "tell me a joke": unit(0, 0, 1),
+}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_messages_typed_differently_share_an_exact_entry():
+    cache = ResponseCache()
+    assert normalize_message("  What's the  weather like TODAY?! ") == "what's the weather like today"
+    cache.put("What's the weather like today?", PROMPT, "Sunny.", llm_seconds=2.0, temperature=0.7)
+
+    assert cache.get("what's the weather like today", PROMPT, temperature=0.7) == "Sunny."
+    assert cache.get("what's the weather like today", PROMPT, temperature=0.2) is None
+    assert cache.get("what's the weather like today", "You are a pirate.", temperature=0.7) is None
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["misses"], stats["seconds_saved"]) == (1, 2, 2.0)
+
+
+def test_similar_message_is_a_semantic_hit_above_the_threshold():
+    cache = ResponseCache(embed=EMBEDDINGS.__getitem__, similarity_threshold=0.99)
+    cache.put("What's the weather like today?", PROMPT, "Sunny.")
+
+    assert cache.get("How is the weather today?", PROMPT) == "Sunny."
+    assert cache.get("Tell me a joke", PROMPT) is None
+    assert cache.stats()["semantic_hits"] == 1 and cache.stats()["misses"] == 1
+
+
+@pytest.mark.parametrize("threshold, hit", [(0.99, True), (0.999, False)])
+def test_threshold_decides_how_similar_is_similar_enough(threshold, hit):
+    similarity = float(EMBEDDINGS["what's the weather like today"] @ EMBEDDINGS["how is the weather today"])
+    assert 0.99 < similarity < 0.999
+
+    cache = ResponseCache(embed=EMBEDDINGS.__getitem__, similarity_threshold=threshold)
+    cache.put("What's the weather like today?", PROMPT, "Sunny.")
+    assert (cache.get("How is the weather today?", PROMPT) == "Sunny.") == hit
+
+
+def test_semantic_hits_only_come_from_the_same_prompt_and_parameters():
+    cache = ResponseCache(embed=EMBEDDINGS.__getitem__, similarity_threshold=0.9)
+    cache.put("What's the weather like today?", PROMPT, "Sunny.", temperature=0.7)
+    assert cache.get("How is the weather today?", PROMPT, temperature=0.2) is None
+    assert cache.get("How is the weather today?", "You are a pirate.", temperature=0.7) is None
+
+
+def test_entries_expire_after_the_ttl():
+    clock = FakeClock()
+    cache = ResponseCache(ttl=60, embed=EMBEDDINGS.__getitem__, similarity_threshold=0.9, clock=clock)
+    cache.put("What's the weather like today?", PROMPT, "Sunny.")
+
+    clock.now = 59
+    assert cache.get("What's the weather like today?", PROMPT) == "Sunny."
+    clock.now = 61
+    assert cache.get("How is the weather today?", PROMPT) is None
+    assert cache.get("What's the weather like today?", PROMPT) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted_beyond_max_entries():
+    cache = ResponseCache(max_entries=2)
+    cache.put("one", PROMPT, "1")
+    cache.put("two", PROMPT, "2")
+    assert cache.get("one", PROMPT) == "1"  # Now the most recently used
+
+    cache.put("three", PROMPT, "3")
+    assert cache.get("two", PROMPT) is None
+    assert [cache.get(message, PROMPT) for message in ("one", "three")] == ["1", "3"]
+    assert cache.stats()["entries"] == 2
@@ -0,0 +1,186 @@
+import asyncio
+import email
+import os
+import tempfile
+from urllib.parse import unquote
+
+import httpx
+import pytest
+
+# The apps create their OpenAI client and TTS cache when imported
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("TTS_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "tts_cache.sqlite3"))
+
+import async_server  # noqa: E402
+import server  # noqa: E402
+from http_client import CircuitOpenError  # noqa: E402
+
+SHORT_REPLY = "Hola, ¿cómo estás?"
+LONG_REPLY = "La niña pidió una canción en español. " * 200  # About 20 KB once percent-encoded
+AUDIO = b"RIFF" + bytes(100_000)
+
+
+def audio_chunks(closed):
+    try:
+        for start in range(0, len(AUDIO), 4096):
+            yield AUDIO[start:start + 4096]
+    finally:
+        closed.append(True)
+
+
+async def async_audio_chunks(closed):
+    for chunk in audio_chunks(closed):
+        yield chunk
+
+
+def form_parts(content_type, body):
+    message = email.message_from_bytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    return {part.get_param("name", header="Content-Disposition"): part for part in message.get_payload()}
+
+
+def check_audio_response(reply, status, headers, body):
+    assert status == 200 and "Accept" in headers["Vary"]
+    if len(reply) < 100:
+        assert headers["Content-Type"] == "audio/wav"
+        assert unquote(headers["X-Response-Text"]) == reply and body == AUDIO
+    else:
+        # Too long for a header: the text and the audio are parts of the body
+        assert "X-Response-Text" not in headers
+        assert headers["Content-Type"].startswith("multipart/form-data; boundary=")
+        parts = form_parts(headers["Content-Type"], body)
+        assert parts["text"].get_payload(decode=True).decode("utf-8") == reply
+        assert parts["audio"].get_content_type() == "audio/wav"
+        assert parts["audio"].get_payload(decode=True) == AUDIO
+    assert sum(len(value) for value in headers.values()) < 4096
+
+
+@pytest.mark.parametrize("reply", [SHORT_REPLY, LONG_REPLY], ids=["short", "long"])
+def test_audio_reply_carries_its_text_within_header_limits(monkeypatch, reply):
+    closed = []
+    monkeypatch.setattr(server, "openai_process_message", lambda message, use_cache=True: reply)
+    monkeypatch.setattr(server, "text_to_speech_stream", lambda text, voice, media_type: audio_chunks(closed))
+
+    response = server.app.test_client().post("/process-message", json={"userMessage": "hi", "voice": ""},
+                                              headers={"Accept": "audio/wav"})
+
+    check_audio_response(reply, response.status_code, response.headers, response.get_data())
+    assert closed == [True]
+
+
+@pytest.mark.parametrize("reply", [SHORT_REPLY, LONG_REPLY], ids=["short", "long"])
+def test_async_audio_reply_carries_its_text_within_header_limits(monkeypatch, reply):
+    closed = []
+
+    async def process_message(message, use_cache=True):
+        return reply
+
+    async def speech_stream(text, voice, media_type):
+        return async_audio_chunks(closed)
+
+    monkeypatch.setattr(async_server, "openai_process_message", process_message)
+    monkeypatch.setattr(async_server, "text_to_speech_stream", speech_stream)
+
+    async def post():
+        response = await async_server.app.test_client().post(
+            "/process-message", json={"userMessage": "hi", "voice": ""}, headers={"Accept": "audio/wav"})
+        return response.status_code, response.headers, await response.get_data()
+
+    check_audio_response(reply, *asyncio.run(post()))
+    assert closed == [True]
+
+
+def parse_frames(body):
+    frames = []
+    while body:
+        length = int.from_bytes(body[1:5], "big")
+        frames.append((body[:1].decode(), body[5:5 + length]))
+        body = body[5 + length:]
+    return frames
+
+
+def failing_llm(message, use_cache=True):
+    raise RuntimeError("The model is overloaded")
+
+
+def failing_speech(text, voice):
+    yield text, b"RIFF first sentence"
+    raise ValueError("Unexpected answer from the TTS service")
+
+
+@pytest.mark.parametrize("llm, speech, kinds", [
+    (failing_llm, failing_speech, ["E"]),
+    (lambda message, use_cache=True: SHORT_REPLY, failing_speech, ["T", "A", "E"]),
+], ids=["llm fails", "speech fails"])
+def test_stream_ends_with_an_error_frame_when_the_reply_fails(monkeypatch, llm, speech, kinds):
+    monkeypatch.setattr(server, "openai_process_message", llm)
+    monkeypatch.setattr(server, "text_to_speech_segments", speech)
+
+    response = server.app.test_client().post("/process-message-stream", json={"userMessage": "hi", "voice": ""})
+
+    frames = parse_frames(response.get_data())
+    assert [kind for kind, _ in frames] == kinds
+    assert b"error" in frames[-1][1]
+
+
+@pytest.mark.parametrize("fail_llm, kinds", [(True, ["E"]), (False, ["T", "A", "E"])], ids=["llm fails", "speech fails"])
+def test_async_stream_ends_with_an_error_frame_when_the_reply_fails(monkeypatch, fail_llm, kinds):
+    async def process_message(message, use_cache=True):
+        return failing_llm(message) if fail_llm else SHORT_REPLY
+
+    async def speech_segments(text, voice):
+        for segment in failing_speech(text, voice):
+            yield segment
+
+    monkeypatch.setattr(async_server, "openai_process_message", process_message)
+    monkeypatch.setattr(async_server, "text_to_speech_segments", speech_segments)
+
+    async def post():
+        response = await async_server.app.test_client().post("/process-message-stream",
+                                                             json={"userMessage": "hi", "voice": ""})
+        return await response.get_data()
+
+    frames = parse_frames(asyncio.run(post()))
+    assert [kind for kind, _ in frames] == kinds
+    assert b"error" in frames[-1][1]
+
+
+def failing_tts(*args):
+    raise CircuitOpenError("Circuit open for the TTS service, not sending request")
+
+
+@pytest.mark.parametrize("accept, route_function", [
+    ("application/json", "text_to_speech"),
+    ("audio/wav", "text_to_speech_stream"),
+])
+def test_failed_speech_is_a_json_503(monkeypatch, accept, route_function):
+    monkeypatch.setattr(server, "openai_process_message", lambda message, use_cache=True: SHORT_REPLY)
+    monkeypatch.setattr(server, route_function, failing_tts)
+
+    response = server.app.test_client().post("/process-message", json={"userMessage": "hi", "voice": ""},
+                                              headers={"Accept": accept})
+
+    assert response.status_code == 503
+    assert response.get_json() == {"error": "Text-to-speech failed, please retry"}
+
+
+@pytest.mark.parametrize("accept, route_function", [
+    ("application/json", "text_to_speech"),
+    ("audio/wav", "text_to_speech_stream"),
+])
+def test_async_failed_speech_is_a_json_503(monkeypatch, accept, route_function):
+    async def process_message(message, use_cache=True):
+        return SHORT_REPLY
+
+    async def failing_async_tts(*args):
+        raise httpx.HTTPStatusError("500 from the TTS service", request=httpx.Request("POST", "http://tts"),
+                                    response=httpx.Response(500))
+
+    monkeypatch.setattr(async_server, "openai_process_message", process_message)
+    monkeypatch.setattr(async_server, route_function, failing_async_tts)
+
+    async def post():
+        response = await async_server.app.test_client().post(
+            "/process-message", json={"userMessage": "hi", "voice": ""}, headers={"Accept": accept})
+        return response.status_code, await response.get_json()
+
+    assert asyncio.run(post()) == (503, {"error": "Text-to-speech failed, please retry"})
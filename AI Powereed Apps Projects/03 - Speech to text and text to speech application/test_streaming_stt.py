@@ -0,0 +1,173 @@
+import asyncio
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+import simple_websocket
+from werkzeug.serving import make_server
+
+# The apps create their OpenAI client and TTS cache when imported
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("TTS_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "tts_cache.sqlite3"))
+
+import async_server  # noqa: E402
+import server  # noqa: E402
+import streaming_stt  # noqa: E402
+from worker import stt_admission  # noqa: E402
+
+
+def upstream_replies(message):
+    """What the Watson STT WebSocket answers to a message: "listening", an interim result per frame, a final result."""
+    if isinstance(message, bytes):
+        return [{'results': [{'final': False, 'alternatives': [{'transcript': f'frame {len(message)} '}]}]}]
+    if json.loads(message)['action'] == 'start':
+        return [{'state': 'listening'}]
+    return [{'results': [{'final': True, 'alternatives': [{'transcript': ' hello world '}]}]}, {'state': 'listening'}]
+
+
+class FakeUpstream:
+    """Stands in for the STT service's WebSocket, answering as `upstream_replies` says."""
+
+    instances = []
+
+    def __init__(self):
+        self.sent = []
+        self.closed = threading.Event()
+        self._replies = queue.Queue()
+        FakeUpstream.instances.append(self)
+
+    @classmethod
+    def connect(cls, url):
+        return cls()
+
+    def send(self, message):
+        if self.closed.is_set():
+            raise simple_websocket.ConnectionClosed()
+        self.sent.append(message)
+        for reply in upstream_replies(message):
+            self._replies.put(reply)
+
+    def receive(self):
+        reply = self._replies.get()
+        if reply is None:
+            raise simple_websocket.ConnectionClosed()
+        return json.dumps(reply)
+
+    def close(self):
+        self.closed.set()
+        self._replies.put(None)
+
+
+class FakeAsyncUpstream:
+    """asyncio version of FakeUpstream."""
+
+    instances = []
+
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+        self._replies = asyncio.Queue()
+        FakeAsyncUpstream.instances.append(self)
+
+    @classmethod
+    async def connect(cls, url):
+        return cls()
+
+    async def send(self, message):
+        if self.closed:
+            raise simple_websocket.ConnectionClosed()
+        self.sent.append(message)
+        for reply in upstream_replies(message):
+            self._replies.put_nowait(reply)
+
+    async def receive(self):
+        reply = await self._replies.get()
+        if reply is None:
+            raise simple_websocket.ConnectionClosed()
+        return json.dumps(reply)
+
+    async def close(self):
+        self.closed = True
+        self._replies.put_nowait(None)
+
+
+@pytest.fixture(autouse=True)
+def upstream(monkeypatch):
+    """Points the recognizers at the fakes; the tests' own clients still use simple_websocket."""
+    FakeUpstream.instances = []
+    FakeAsyncUpstream.instances = []
+    monkeypatch.setattr(streaming_stt, "simple_websocket", SimpleNamespace(
+        Client=FakeUpstream, AioClient=FakeAsyncUpstream, ConnectionClosed=simple_websocket.ConnectionClosed))
+
+
+@pytest.fixture
+def ws_url():
+    httpd = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"ws://127.0.0.1:{httpd.server_port}/speech-to-text-stream"
+    httpd.shutdown()
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_results_are_relayed_while_the_user_talks(ws_url):
+    client = simple_websocket.Client.connect(ws_url)
+    client.send(json.dumps({'contentType': 'audio/webm;codecs=opus'}))
+    client.send(b'\x01' * 10)
+    assert json.loads(client.receive(timeout=5)) == {'type': 'interim', 'text': 'frame 10'}
+    client.send(b'\x02' * 20)
+    assert json.loads(client.receive(timeout=5)) == {'type': 'interim', 'text': 'frame 20'}
+    client.send(json.dumps({'action': 'stop'}))
+
+    assert json.loads(client.receive(timeout=5)) == {'type': 'final', 'text': 'hello world'}
+    done = json.loads(client.receive(timeout=5))
+    assert done['type'] == 'done' and done['text'] == 'hello world'  # The server then ends the connection
+
+    [upstream] = FakeUpstream.instances
+    assert json.loads(upstream.sent[0]) == {'action': 'start', 'content-type': 'audio/webm;codecs=opus',
+                                            'interim_results': True}
+    assert upstream.sent[1:] == [b'\x01' * 10, b'\x02' * 20, json.dumps({'action': 'stop'})]
+    assert upstream.closed.wait(5)
+    wait_until(lambda: stt_admission.stats()['in_flight'] == {})
+
+
+def test_client_disconnect_closes_the_upstream_session(ws_url):
+    client = simple_websocket.Client.connect(ws_url)
+    client.send(json.dumps({'contentType': 'audio/webm'}))
+    client.send(b'\x01' * 10)
+    assert json.loads(client.receive(timeout=5))['type'] == 'interim'
+    client.close()
+
+    wait_until(lambda: FakeUpstream.instances and FakeUpstream.instances[0].closed.is_set())
+    # The STT session went back to the admission controller with it
+    wait_until(lambda: stt_admission.stats()['in_flight'] == {})
+
+
+def test_async_results_are_relayed_while_the_user_talks():
+    async def talk():
+        messages = []
+        async with async_server.app.test_client().websocket('/speech-to-text-stream') as ws:
+            await ws.send(json.dumps({'contentType': 'audio/webm'}))
+            await ws.send(b'\x01' * 10)
+            messages.append(json.loads(await ws.receive()))
+            await ws.send(json.dumps({'action': 'stop'}))
+            messages.append(json.loads(await ws.receive()))
+            messages.append(json.loads(await ws.receive()))
+        return messages
+
+    interim, final, done = asyncio.run(talk())
+    assert interim == {'type': 'interim', 'text': 'frame 10'}
+    assert final == {'type': 'final', 'text': 'hello world'}
+    assert done['type'] == 'done' and done['text'] == 'hello world'
+    [upstream] = FakeAsyncUpstream.instances
+    assert upstream.sent[1:] == [b'\x01' * 10, json.dumps({'action': 'stop'})] and upstream.closed
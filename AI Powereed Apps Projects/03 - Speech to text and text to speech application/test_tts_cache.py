@@ -0,0 +1,73 @@
+from tts_cache import SpeechCache
+
+KB = 1024
+
+
+def test_hits_come_from_memory_then_disk(tmp_path):
+    path = str(tmp_path / "tts.sqlite3")
+    cache = SpeechCache(path)
+    key = cache.key("Hello  there", "en-US_AllisonV3Voice")
+    assert cache.get(key) is None
+    cache.put(key, b"RIFF audio")
+
+    assert cache.get(cache.key("Hello there", "en-US_AllisonV3Voice")) == b"RIFF audio"
+    assert cache.get(cache.key("Hello there", "en-US_AllisonV3Voice", "audio/ogg")) is None
+    cache.close()
+
+    cache = SpeechCache(path)
+    assert cache.get(key) == b"RIFF audio" and key in cache
+    assert cache.disk_hits == 1
+    cache.close()
+
+
+def test_counters(tmp_path):
+    cache = SpeechCache(str(tmp_path / "tts.sqlite3"))
+    key = cache.key("Hello", "")
+    cache.get(key)
+    cache.put(key, b"x" * 10)
+    cache.get(key)
+    stats = cache.stats()
+    assert (stats["hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["bytes_served"] == 10 and stats["entries"] == 1
+    cache.close()
+
+
+def test_default_voice_shares_an_entry_with_no_voice(tmp_path):
+    cache = SpeechCache(str(tmp_path / "tts.sqlite3"), default_voice="en-US_MichaelV3Voice")
+    cache.put(cache.key("Hello", ""), b"michael")
+    assert cache.get(cache.key("Hello", "default")) == b"michael"
+    assert cache.get(cache.key("Hello", "en-US_MichaelV3Voice")) == b"michael"
+    assert cache.get(cache.key("Hello", "en-US_AllisonV3Voice")) is None
+    cache.close()
+
+
+def test_least_recently_used_audio_is_evicted_from_disk(tmp_path):
+    cache = SpeechCache(str(tmp_path / "tts.sqlite3"), max_bytes=30 * KB, memory_bytes=0)
+    keys = [cache.key(f"phrase {n}") for n in range(4)]
+    for key in keys[:3]:
+        cache.put(key, bytes(10 * KB))
+    assert cache.get(keys[0]) is not None  # Now the most recently used
+
+    cache.put(keys[3], bytes(10 * KB))
+    assert keys[1] not in cache
+    assert all(key in cache for key in (keys[0], keys[2], keys[3]))
+    assert cache.stats()["disk_bytes"] == 30 * KB
+
+    # Audio larger than the whole cache doesn't stay either
+    cache.put(cache.key("long"), bytes(40 * KB))
+    assert cache.stats()["entries"] == 0
+    cache.close()
+
+
+def test_memory_tier_is_bounded_in_bytes(tmp_path):
+    cache = SpeechCache(str(tmp_path / "tts.sqlite3"), memory_bytes=20 * KB)
+    keys = [cache.key(f"phrase {n}") for n in range(3)]
+    for key in keys:
+        cache.put(key, bytes(10 * KB))
+    assert cache.stats()["memory_bytes"] == 20 * KB
+
+    cache.get(keys[0])
+    assert cache.disk_hits == 1  # Evicted from memory, still on disk
+    cache.get(keys[2])
+    assert cache.memory_hits == 1
+    cache.close()
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import yaml
+
+
+def normalize_text(text):
+    """Normalizes text so that spellings the TTS service reads the same way share a cache entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def pool_voices(path):
+    """Returns the voices listed under the session pool policies of a sessionPools.yaml file."""
+    with open(path) as f:
+        config = yaml.safe_load(f) or {}
+    voices = []
+    for entries in (config.get("sessionPoolPolicies") or {}).values():
+        for entry in entries or []:
+            if entry["name"] not in voices:
+                voices.append(entry["name"])
+    return voices
+
+
+class SpeechCache:
+    """
+    Caches synthesized audio by normalized text, voice and output format.
+
+    Lookups go to an in-memory LRU first and then to an SQLite file on disk. Both tiers
+    are bounded by size in bytes and evict the least recently used audio first.
+
+    Asking for no voice, "default" or `default_voice` by name gets the same audio from the
+    service, so all three share one entry.
+    """
+
+    def __init__(self, path="tts_cache.sqlite3", max_bytes=256 * 2 ** 20, memory_bytes=32 * 2 ** 20,
+                 default_voice=""):
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.default_voice = default_voice
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS speech ("
+            "key TEXT PRIMARY KEY, audio BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS speech_last_used ON speech (last_used)")
+        self._db.commit()
+
+        # Counters
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+
+    def key(self, text, voice="", output_format="audio/wav"):
+        """Returns the cache key of `text` spoken by `voice` in `output_format`."""
+        if voice in ("", "default"):
+            voice = self.default_voice
+        data = json.dumps([normalize_text(text), voice, output_format])
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def get(self, key):
+        """Returns the cached audio bytes, or None on a miss."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                self.bytes_served += len(self._memory[key])
+                return self._memory[key]
+
+            row = self._db.execute("SELECT audio FROM speech WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            audio = bytes(row[0])
+            self._db.execute("UPDATE speech SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.disk_hits += 1
+            self.bytes_served += len(audio)
+            self._remember(key, audio)
+            return audio
+
+    def put(self, key, audio):
+        """Stores the audio bytes returned by the TTS service for `key`."""
+        with self._lock:
+            self._remember(key, audio)
+            self._db.execute(
+                "INSERT OR REPLACE INTO speech (key, audio, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, audio, len(audio), time.time())
+            )
+            self._evict()
+            self._db.commit()
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._memory:
+                return True
+            return self._db.execute("SELECT 1 FROM speech WHERE key = ?", (key,)).fetchone() is not None
+
+    def stats(self):
+        """Returns the hit/miss counters and the size of both tiers."""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            disk_bytes, entries = self._db.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM speech").fetchone()
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "bytes_served": self.bytes_served,
+                "memory_bytes": self._memory_size,
+                "disk_bytes": disk_bytes,
+                "entries": entries,
+            }
+
+    def close(self):
+        self._db.close()
+
+    def _remember(self, key, audio):
+        if len(audio) > self.memory_bytes:
+            return  # Would evict everything else; leave it on disk only
+        if key in self._memory:
+            self._memory_size -= len(self._memory.pop(key))
+        self._memory[key] = audio
+        self._memory_size += len(audio)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _evict(self):
+        # Keep the most recently used audio that fits in max_bytes, and drop everything older
+        self._db.execute(
+            "DELETE FROM speech WHERE key IN ("
+            " SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS kept FROM speech)"
+            " WHERE kept > ?)",
+            (self.max_bytes,)
+        )
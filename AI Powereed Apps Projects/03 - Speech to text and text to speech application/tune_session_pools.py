@@ -0,0 +1,159 @@
+import argparse
+import heapq
+import json
+import math
+import os
+
+import requests
+import yaml
+
+from admission import load_class_settings
+
+# Generates the session pool config of a Watson runtime (sessionPools.yaml and the policy
+# classes of sessionPools.py) from how much each model or voice is actually used, instead of
+# keeping a fixed list of models pre-warmed with one session each.
+
+CONFIG_DIRS = {'stt': 'models/stt/chuck_var', 'tts': 'models/tts/config'}
+
+
+def load_policy(config_dir):
+    """
+    Reads the session pool config of a runtime.
+
+    Returns:
+        dict: {'default': sessionPool of the default policy, 'models': {name: sessionPool}}.
+    """
+    classes = load_class_settings(os.path.join(config_dir, 'sessionPools.py'), 'sessionPool')
+    with open(os.path.join(config_dir, 'sessionPools.yaml')) as f:
+        config = yaml.safe_load(f) or {}
+    models = {}
+    for policy, entries in (config.get('sessionPoolPolicies') or {}).items():
+        for entry in entries or []:
+            models[entry['name']] = classes[policy]
+    return {'default': classes[config.get('defaultPolicy', 'DefaultPolicy')], 'models': models}
+
+
+def load_trace(path):
+    """Returns the (start time, model, duration) of every session in a usage log, by start time."""
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return sorted((r['time'], r['model'], r['duration']) for r in records)
+
+
+def usage_from_trace(trace):
+    """
+    Returns {model: {'requests_per_hour', 'concurrency'}}, where `concurrency` is the sorted
+    number of sessions of the model in use (including the new one) at each arrival.
+    """
+    if not trace:
+        return {}
+    hours = max(max(start + duration for start, _, duration in trace) - trace[0][0], 1) / 3600
+    busy, concurrency = {}, {}
+    for start, model, duration in trace:
+        ends = busy.setdefault(model, [])
+        while ends and ends[0] <= start:
+            heapq.heappop(ends)
+        heapq.heappush(ends, start + duration)
+        concurrency.setdefault(model, []).append(len(ends))
+    return {model: {'requests_per_hour': len(levels) / hours, 'concurrency': sorted(levels)}
+            for model, levels in concurrency.items()}
+
+
+def usage_from_stats(stats):
+    """Same as `usage_from_trace`, from the live counters of one runtime in /admission-stats."""
+    hours = max(stats['uptime_s'], 1) / 3600
+    return {model: {'requests_per_hour': count / hours, 'concurrency': [stats['peak_in_flight'][model]]}
+            for model, count in stats['requests'].items()}
+
+
+def round_significant(value, digits=2):
+    return int(round(value, digits - 1 - int(math.floor(math.log10(value))))) if value >= 1 else 1
+
+
+def generate_policy(usage, percentile=0.95, min_requests_per_hour=1, max_warm=8, recycle_hours=24,
+                    min_use_count=1000, max_use_count=100000):
+    """
+    Sizes the session pool of every model from its usage.
+
+    Args:
+        usage (dict): Output of `usage_from_trace` or `usage_from_stats`.
+        percentile (float, optional): Share of arrivals that should find a warm session.
+        min_requests_per_hour (float, optional): Models used less than this are not pre-warmed.
+        max_warm (int, optional): Upper bound on the warm sessions of one model.
+        recycle_hours (float, optional): How often a warm session should be recycled;
+            `maxUseCount` is the number of requests it serves in that time.
+        min_use_count, max_use_count (int, optional): Bounds on `maxUseCount`; busy models get more
+            uses per session so they aren't recycled (and cold-started) every few minutes.
+
+    Returns:
+        dict: Same shape as `load_policy`.
+    """
+    models = {}
+    for model, stats in sorted(usage.items()):
+        if stats['requests_per_hour'] < min_requests_per_hour:
+            continue  # Idle: not worth a session's memory all day
+        levels = stats['concurrency']
+        warm = min(max_warm, levels[min(len(levels) - 1, math.ceil(percentile * len(levels)) - 1)])
+        uses = stats['requests_per_hour'] / warm * recycle_hours
+        models[model] = {
+            'minWarmSessions': warm,
+            'maxUseCount': min(max_use_count, max(min_use_count, round_significant(uses))),
+        }
+    return {'default': {}, 'models': models}
+
+
+def policy_name(pool):
+    return f"PreWarming{pool['minWarmSessions']}x{pool['maxUseCount']}Policy"
+
+
+def policy_files(policy):
+    """Returns the text of the sessionPools.yaml and sessionPools.py that configure `policy`."""
+    by_class = {}
+    for model, pool in policy['models'].items():
+        by_class.setdefault(policy_name(pool), (pool, []))[1].append(model)
+
+    classes = ["class DefaultPolicy:\n    sessionPool = {}\n"]
+    for name, (pool, _) in sorted(by_class.items()):
+        settings = "".join(f"        '{key}': {value},\n" for key, value in pool.items())
+        classes.append(f"class {name}:\n    sessionPool = {{\n{settings}    }}\n")
+
+    config = {
+        'defaultPolicy': 'DefaultPolicy',
+        'sessionPoolPolicies': {name: [{'name': model} for model in models]
+                                for name, (_, models) in sorted(by_class.items())},
+    }
+    return yaml.safe_dump(config, sort_keys=False), "\n".join(classes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a runtime's session pool config from observed usage.")
+    parser.add_argument("service", choices=CONFIG_DIRS)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--trace", help="Usage log written with STT_USAGE_LOG/TTS_USAGE_LOG")
+    source.add_argument("--stats-url", help="/admission-stats of a running app, e.g. http://localhost:8000/admission-stats")
+    parser.add_argument("--output-dir", required=True, help="Where to write sessionPools.yaml and sessionPools.py")
+    parser.add_argument("--percentile", type=float, default=0.95)
+    parser.add_argument("--min-requests-per-hour", type=float, default=1)
+    parser.add_argument("--max-warm", type=int, default=8)
+    parser.add_argument("--recycle-hours", type=float, default=24)
+    args = parser.parse_args()
+
+    if args.trace:
+        usage = usage_from_trace(load_trace(args.trace))
+    else:
+        usage = usage_from_stats(requests.get(args.stats_url, timeout=10).json()[args.service])
+    policy = generate_policy(usage, args.percentile, args.min_requests_per_hour, args.max_warm, args.recycle_hours)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    pools_yaml, pools_py = policy_files(policy)
+    with open(os.path.join(args.output_dir, 'sessionPools.yaml'), 'w') as f:
+        f.write(pools_yaml)
+    with open(os.path.join(args.output_dir, 'sessionPools.py'), 'w') as f:
+        f.write(pools_py)
+
+    old = load_policy(CONFIG_DIRS[args.service])
+    print(f"Pre-warmed: {len(old['models'])} models before, {len(policy['models'])} now")
+    for model, pool in policy['models'].items():
+        print(f"  {model}: {pool['minWarmSessions']} warm, recycled after {pool['maxUseCount']} uses")
+    for model in sorted(set(old['models']) - set(policy['models'])):
+        print(f"  {model}: no longer pre-warmed")
@@ -0,0 +1,25 @@
+import argparse
+import time
+
+from tts_cache import pool_voices
+from worker import tts_cache, warm_tts_cache
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-synthesize common phrases into the TTS cache.")
+    parser.add_argument("--phrases", default="warm_phrases.txt", help="Text file with one phrase per line")
+    parser.add_argument("--pools", default="models/tts/config/sessionPools.yaml",
+                        help="Session pool config listing the voices to warm")
+    parser.add_argument("--voices", nargs="+", help="Warm these voices instead of the ones in --pools")
+    args = parser.parse_args()
+
+    with open(args.phrases) as f:
+        phrases = [line.strip() for line in f if line.strip()]
+    # "" is the service's default voice, which the app uses unless the user picks another one
+    voices = args.voices or [""] + pool_voices(args.pools)
+
+    start = time.perf_counter()
+    synthesized = warm_tts_cache(phrases, voices)
+    print(f"Synthesized {synthesized} of {len(phrases) * len(voices)} phrase/voice pairs "
+          f"in {time.perf_counter() - start:.1f}s")
+    stats = tts_cache.stats()
+    print(f"Cache holds {stats['entries']} entries, {stats['disk_bytes'] / 2 ** 20:.1f} MB")
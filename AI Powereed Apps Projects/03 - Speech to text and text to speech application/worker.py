@@ -1,6 +1,19 @@
 from openai import OpenAI
 import requests
 import logging
+import os
+import re
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from admission import AdmissionController, load_requirements
+from audio_preprocessing import prepare_audio
+from http_client import ServiceClient
+from response_cache import ResponseCache, load_embedder
+from streaming_stt import StreamingRecognizer
+from tts_cache import SpeechCache
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)  # Configure logging to INFO level for debugging
@@ -8,31 +21,122 @@ logging.basicConfig(level=logging.INFO)  # Configure logging to INFO level for d
 # Initialize OpenAI client (ensure your API key is set)
 openai_client = OpenAI()  
 
+assistant_prompt = """Act like a personal assistant. You can respond to questions, 
+    translate sentences, summarize news, and give recommendations."""
+llm_params = {'model': "gpt-3.5-turbo", 'max_tokens': 4000}
+
+# Answers to questions that were asked before, so they skip the LLM round trip. Set
+# LLM_CACHE_SIMILARITY (e.g. 0.92) to also answer rephrasings from a local embedding model.
+llm_similarity = os.environ.get("LLM_CACHE_SIMILARITY")
+llm_cache = ResponseCache(
+    max_entries=int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 1024)),
+    ttl=float(os.environ.get("LLM_CACHE_TTL", 24 * 3600)),
+    embed=load_embedder(os.environ.get("LLM_CACHE_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    if llm_similarity else None,
+    similarity_threshold=float(llm_similarity or 0.92))
+
+# Shared clients for the Watson services: pooled keep-alive connections, timeouts,
+# retries with backoff and a circuit breaker (base URLs can be overridden for testing)
+stt_base_url = os.environ.get("STT_BASE_URL", "https://sn-watson-stt.labs.skills.network")
+tts_base_url = os.environ.get("TTS_BASE_URL", "https://sn-watson-tts.labs.skills.network")
+stt_stream_url = re.sub(r'^http', 'ws', stt_base_url) + '/speech-to-text/api/v1/recognize?model=en-US_Multimedia'
+stt_client = ServiceClient(stt_base_url, read_timeout=60)  # Recognizing a long recording takes a while
+tts_client = ServiceClient(tts_base_url, read_timeout=30)
+
+tts_default_voice = os.environ.get("TTS_DEFAULT_VOICE", "en-US_MichaelV3Voice")  # defaultTTSVoice of the runtime
+
+# Synthesized audio, so the same text in the same voice is only sent to the TTS service once
+tts_cache = SpeechCache(os.environ.get("TTS_CACHE_PATH", "tts_cache.sqlite3"),
+                        max_bytes=int(os.environ.get("TTS_CACHE_MAX_MB", 256)) * 2 ** 20,
+                        memory_bytes=int(os.environ.get("TTS_CACHE_MEMORY_MB", 32)) * 2 ** 20,
+                        default_voice=tts_default_voice)
+# Streamed audio longer than this isn't cached, so long replies pass through without being held in memory
+tts_stream_cache_max_bytes = int(os.environ.get("TTS_STREAM_CACHE_MAX_MB", 2)) * 2 ** 20
+
+# Threads synthesizing sentences for streamed replies; bounds the TTS calls in flight across all requests
+tts_parallelism = int(os.environ.get("TTS_PARALLELISM", 4))
+tts_executor = ThreadPoolExecutor(max_workers=tts_parallelism)
+
+# Admission control: calls are only sent while their sessions fit in the memory and CPU of the
+# STT and TTS runtime nodes, at the per-session cost the models' resourceRequirements.py declare.
+# Calls that don't fit wait up to ADMISSION_MAX_WAIT seconds and are then turned away with a
+# Retry-After (AdmissionRejected), instead of piling up on an overloaded runtime.
+models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+stt_model = 'en-US_Multimedia'
+stt_model_rate = 16000  # en-US_Multimedia is a 16 kHz model
+stt_admission = AdmissionController(
+    load_requirements(os.path.join(models_dir, 'stt', 'chuck_var', 'resourceRequirements.py')),
+    default_class=os.environ.get("STT_RESOURCE_CLASS", "RnntResourceRequirement"),
+    memory_bytes=int(os.environ.get("STT_NODE_MEM_MB", 2048)) * 2 ** 20,
+    cpu=float(os.environ.get("STT_NODE_CPU", 400)),  # Percent of a core, like marginalCpu
+    max_queue=int(os.environ.get("ADMISSION_MAX_QUEUE", 32)),
+    max_wait=float(os.environ.get("ADMISSION_MAX_WAIT", 5)),
+    usage_log=os.environ.get("STT_USAGE_LOG"))
+tts_admission = AdmissionController(
+    load_requirements(os.path.join(models_dir, 'tts', 'config', 'resourceRequirements.py')),
+    default_class=os.environ.get("TTS_RESOURCE_CLASS", "WTTSDnnResourceRequirement"),
+    memory_bytes=int(os.environ.get("TTS_NODE_MEM_MB", 2048)) * 2 ** 20,
+    cpu=float(os.environ.get("TTS_NODE_CPU", 400)),
+    max_queue=int(os.environ.get("ADMISSION_MAX_QUEUE", 32)),
+    max_wait=float(os.environ.get("ADMISSION_MAX_WAIT", 5)),
+    usage_log=os.environ.get("TTS_USAGE_LOG"))  # Usage logs feed tune_session_pools.py
+
+# Uncompressed uploads are downmixed, trimmed, resampled to the model's rate and re-encoded
+# before they are sent (STT_CODEC: l16, or mulaw for half the size); STT_PREPROCESS=0 turns it off
+stt_preprocess = os.environ.get("STT_PREPROCESS", "1") != "0"
+stt_codec = os.environ.get("STT_CODEC", "l16")
+
 # Function to transcribe speech from audio data
-def speech_to_text(audio_binary):
+def speech_to_text(audio_binary, content_type=None):
     """
     Converts audio data to text using the Watson Speech-to-Text service.
 
     Args:
         audio_binary: Raw audio data (bytes) in a supported format.
+        content_type (str, optional): Media type of the audio, if the client sent one.
     
     Returns:
         str: The transcribed text, or 'null' if transcription fails.
+
+    Raises:
+        AdmissionRejected: If the speech-to-text runtime has no room for the request.
     """
     
-    base_url = "https://sn-watson-stt.labs.skills.network"  # Watson STT base URL
-    api_url = base_url + '/speech-to-text/api/v1/recognize'  # Specific endpoint
+    api_path = '/speech-to-text/api/v1/recognize'  # Specific endpoint
+
+    params = {'model': stt_model}  # Parameters for English US model
 
-    params = {'model': 'en-US_Multimedia'}  # Parameters for English US model
+    # Send less audio when it can be decoded; other formats are sent as they are for the service to detect
+    headers = {}
+    prepared = prepare_audio(audio_binary, content_type, stt_model_rate, stt_codec) if stt_preprocess else None
+    if prepared is not None:
+        audio_binary, headers['Content-Type'] = prepared
+        if not audio_binary:
+            logging.info("Recording is all silence, nothing to transcribe")
+            return "null"
 
     try:
         # Send POST request to Watson STT API
-        response = requests.post(api_url, params=params, data=audio_binary).json() 
+        with stt_admission.acquire(stt_model):
+            response = stt_client.post(api_path, params=params, headers=headers, data=audio_binary).json() 
     except requests.exceptions.RequestException as e:
         # Handle network errors or other exceptions
         logging.error(f"Error connecting to speech-to-text service: {e}")
         return "null"  # Return null if transcription fails
 
+    return recognized_text(response)
+
+# Function to read the transcript out of a Watson STT response
+def recognized_text(response):
+    """
+    Extracts the most likely transcript from a Watson Speech-to-Text recognize response.
+
+    Args:
+        response (dict): The decoded JSON response.
+
+    Returns:
+        str: The transcribed text, or 'null' if there is none.
+    """
     text = 'null'  # Default result
 
     if 'results' in response:  # Check if transcription results are present
@@ -47,60 +151,288 @@ def speech_to_text(audio_binary):
         logging.error("Error: 'results' not found in speech-to-text response.")
         return "null"
 
+# Function to start transcribing speech while it is being recorded
+def open_speech_to_text_stream(content_type, on_result):
+    """
+    Opens a streaming recognition session with the Watson Speech-to-Text service.
+
+    Args:
+        content_type (str): Media type of the audio frames, e.g. 'audio/webm;codecs=opus'.
+        on_result (callable): Called with {"type": "interim" | "final", "text": ...} for every result.
+
+    Returns:
+        StreamingRecognizer: Send the audio frames to it, then call `finish()` for the final transcript.
+
+    Raises:
+        AdmissionRejected: If the speech-to-text runtime has no room for another session.
+    """
+    # The session holds its share of the runtime until the recognizer is closed
+    permit = stt_admission.acquire(stt_model)
+    try:
+        return StreamingRecognizer(stt_stream_url, content_type, on_result, on_close=permit.release)
+    except BaseException:
+        permit.release()
+        raise
+
 # Function to convert text to speech audio
-def text_to_speech(text, voice=""):
+def text_to_speech(text, voice="", use_cache=True):
     """
     Converts text to speech using the Watson Text-to-Speech service.
 
     Args:
         text (str): The text to convert to speech.
         voice (str, optional): The voice to use (default is the service's default).
+        use_cache (bool, optional): Whether to look up and store the audio in the TTS cache.
     
     Returns:
         bytes: The synthesized speech audio data (WAV format).
+
+    Raises:
+        AdmissionRejected: If the text-to-speech runtime has no room for the request.
+    """
+
+    # Serve repeated text from the cache without calling the service
+    cache_key = tts_cache.key(text, voice, 'audio/wav')
+    audio = tts_cache.get(cache_key) if use_cache else None
+    if audio is not None:
+        return audio
+
+    with tts_admission.acquire(voice_model(voice)):
+        response = request_speech(text, voice, 'audio/wav')
+    logging.info(f"Text-to-Speech response: {response}")
+    if use_cache:
+        tts_cache.put(cache_key, response.content)
+    return response.content  # Return the audio data
+
+# Function to send a synthesis request to the Watson TTS service
+def request_speech(text, voice, audio_format, stream=False):
     """
+    Sends text to the Watson Text-to-Speech service.
 
-    base_url = "https://sn-watson-tts.labs.skills.network" 
-    api_url = base_url + '/text-to-speech/api/v1/synthesize?output=output_text.wav'
-    # Append voice parameter if provided and not "default"
+    Args:
+        text (str): The text to convert to speech.
+        voice (str): The voice to use ("" or "default" for the service's default).
+        audio_format (str): One of the values of AUDIO_FORMATS.
+        stream (bool, optional): Return as soon as the headers arrive and leave the audio unread.
+
+    Returns:
+        requests.Response: The service's response.
+    """
+    api_path, request_args = speech_request(text, voice, audio_format)
+    return tts_client.post(api_path, stream=stream, **request_args)
+
+# Function to name the voice the TTS runtime will use
+def voice_model(voice):
+    """Returns the voice name the runtime synthesizes `voice` with ("" and "default" are its default voice)."""
+    return tts_default_voice if voice in ("", "default") else voice
+
+# Function to build a synthesis request for the Watson TTS service
+def speech_request(text, voice, audio_format):
+    """
+    Returns the path and the params, headers and JSON body of a synthesis request.
+    """
+    api_path = '/text-to-speech/api/v1/synthesize'
+    params = {'output': 'output_text.wav'}
+    # Add voice parameter if provided and not "default"
     if voice != "" and voice != "default":
-        api_url += "&voice=" + voice  
+        params['voice'] = voice
 
     headers = {
-        'Accept': 'audio/wav',
+        'Accept': audio_format,
         'Content-Type': 'application/json',
     }
 
     json_data = {'text': text}
 
-    response = requests.post(api_url, headers=headers, json=json_data)
+    return api_path, {'params': params, 'headers': headers, 'json': json_data}
+
+# Audio formats the app can ask the TTS service for, by the media type sent to the browser
+AUDIO_FORMATS = {
+    'audio/wav': 'audio/wav',
+    'audio/ogg': 'audio/ogg;codecs=opus',  # About a tenth of the size of WAV
+    'audio/mpeg': 'audio/mpeg',
+}
+
+# Streamed audio carries its reply text percent-encoded in an X-Response-Text header only up to this
+# many bytes: proxies reject responses with larger headers (nginx buffers 4-8 KB of them), so longer
+# texts are sent in a multipart/form-data body instead, a "text" part followed by an "audio" part
+response_text_header_max = int(os.environ.get("RESPONSE_TEXT_HEADER_MAX", 2048))
+
+
+def audio_response_parts(text, media_type):
+    """
+    Lays out a response that sends streamed audio together with its reply text.
+
+    Args:
+        text (str): The reply text.
+        media_type (str): One of the keys of AUDIO_FORMATS.
+
+    Returns:
+        tuple: (content type, headers, bytes to send before the audio, bytes to send after it).
+    """
+    quoted = quote(text)
+    if len(quoted) <= response_text_header_max:
+        return media_type, {'X-Response-Text': quoted}, b'', b''
+    boundary = uuid.uuid4().hex
+    head = (f'--{boundary}\r\nContent-Disposition: form-data; name="text"\r\n'
+            f'Content-Type: text/plain; charset=utf-8\r\n\r\n{text}\r\n'
+            f'--{boundary}\r\nContent-Disposition: form-data; name="audio"; filename="reply"\r\n'
+            f'Content-Type: {media_type}\r\n\r\n').encode()
+    return f'multipart/form-data; boundary={boundary}', {}, head, f'\r\n--{boundary}--\r\n'.encode()
+
+# Function to stream synthesized speech without holding all of it in memory
+def text_to_speech_stream(text, voice="", media_type='audio/wav', chunk_size=64 * 1024, use_cache=True):
+    """
+    Converts text to speech and returns the audio as it arrives from the service.
+
+    Args:
+        text (str): The text to convert to speech.
+        voice (str, optional): The voice to use (default is the service's default).
+        media_type (str, optional): One of the keys of AUDIO_FORMATS.
+        chunk_size (int, optional): Size of the chunks read from the service.
+        use_cache (bool, optional): Whether to look up and store the audio in the TTS cache.
+
+    Returns:
+        Iterator[bytes]: The audio data. The request has already been answered when this
+        returns, so service and admission errors are raised here rather than while iterating.
+    """
+    audio_format = AUDIO_FORMATS[media_type]
+    cache_key = tts_cache.key(text, voice, audio_format)
+    audio = tts_cache.get(cache_key) if use_cache else None
+    if audio is not None:
+        return iter([audio])
+
+    # The synthesis holds its share of the runtime until the audio has been passed on
+    permit = tts_admission.acquire(voice_model(voice))
+    try:
+        response = request_speech(text, voice, audio_format, stream=True)
+    except BaseException:
+        permit.release()
+        raise
     logging.info(f"Text-to-Speech response: {response}")
-    return response.content  # Return the audio data
+
+    def chunks():
+        # Keep a copy for the cache only while it is short enough to be worth caching
+        parts, size = ([], 0) if use_cache else (None, 0)
+        try:
+            for chunk in response.iter_content(chunk_size):
+                if parts is not None:
+                    parts.append(chunk)
+                    size += len(chunk)
+                    if size > tts_stream_cache_max_bytes:
+                        parts = None
+                yield chunk
+        finally:
+            response.close()
+            permit.release()
+        if parts is not None:
+            tts_cache.put(cache_key, b''.join(parts))
+
+    return chunks()
+
+# Function to split a reply into the pieces that are synthesized separately
+def split_sentences(text):
+    """
+    Splits text into sentences at sentence-ending punctuation and line breaks.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        list[str]: The non-empty sentences, in order.
+    """
+    return [s.strip() for s in re.split(r'(?<=[.!?])\s+|\n+', text) if s.strip()]
+
+# Function to synthesize a reply sentence by sentence
+def text_to_speech_segments(text, voice="", max_in_flight=tts_parallelism, use_cache=True):
+    """
+    Converts text to speech one sentence at a time, synthesizing up to `max_in_flight`
+    sentences concurrently and yielding the audio in the order of the text.
+
+    Args:
+        text (str): The text to convert to speech.
+        voice (str, optional): The voice to use (default is the service's default).
+        max_in_flight (int, optional): How many sentences to synthesize ahead of the one being yielded.
+        use_cache (bool, optional): Whether to look up and store the audio in the TTS cache.
+
+    Yields:
+        tuple[str, bytes]: Each sentence and its audio data (WAV format).
+    """
+    sentences = iter(split_sentences(text))
+    in_flight = deque()
+    try:
+        for sentence in sentences:
+            in_flight.append((sentence, tts_executor.submit(text_to_speech, sentence, voice, use_cache)))
+            if len(in_flight) >= max_in_flight:
+                break
+        while in_flight:
+            sentence, future = in_flight.popleft()
+            audio = future.result()
+            # Keep the window full before handing the finished sentence back
+            next_sentence = next(sentences, None)
+            if next_sentence is not None:
+                in_flight.append((next_sentence, tts_executor.submit(text_to_speech, next_sentence, voice, use_cache)))
+            yield sentence, audio
+    finally:
+        # The client went away or a sentence failed: don't synthesize the rest
+        for _, future in in_flight:
+            future.cancel()
+
+# Function to fill the TTS cache ahead of time
+def warm_tts_cache(phrases, voices):
+    """
+    Synthesizes every phrase in every voice that isn't cached yet.
+
+    Args:
+        phrases (list[str]): Text that is likely to be spoken, e.g. common replies and error messages.
+        voices (list[str]): Voices to synthesize them in, e.g. the pre-warmed voices of sessionPools.yaml.
+
+    Returns:
+        int: The number of phrases that were synthesized.
+    """
+    synthesized = 0
+    for voice in voices:
+        for phrase in phrases:
+            if tts_cache.key(phrase, voice, 'audio/wav') in tts_cache:
+                continue
+            try:
+                text_to_speech(phrase, voice)
+                synthesized += 1
+            except requests.exceptions.RequestException as e:
+                logging.error(f"Could not pre-warm '{phrase}' in voice {voice}: {e}")
+    return synthesized
 
 # Function to process user messages with OpenAI's GPT
-def openai_process_message(user_message):
+def openai_process_message(user_message, use_cache=True):
     """
     Processes a user message with OpenAI's GPT-3.5-turbo model.
 
     Args:
         user_message (str): The user's input message.
+        use_cache (bool, optional): Whether to answer from and store the answer in the LLM cache.
 
     Returns:
         str: The generated response from GPT-3.5-turbo.
     """
+    if not use_cache:
+        llm_cache.record_bypass()
+    else:
+        cached = llm_cache.get(user_message, assistant_prompt, **llm_params)
+        if cached is not None:
+            logging.info("OpenAI response served from the cache")
+            return cached
 
-    prompt = """Act like a personal assistant. You can respond to questions, 
-    translate sentences, summarize news, and give recommendations."""
-    
+    start = time.perf_counter()
     openai_response = openai_client.chat.completions.create(
-        model="gpt-3.5-turbo",
         messages=[
-            {"role": "system", "content": prompt},
+            {"role": "system", "content": assistant_prompt},
             {"role": "user", "content": user_message}
         ],
-        max_tokens=4000
+        **llm_params
     )
 
     logging.info(f"OpenAI response: {openai_response}")
     response_text = openai_response.choices[0].message.content
+    if use_cache:
+        llm_cache.put(user_message, assistant_prompt, response_text, time.perf_counter() - start, **llm_params)
     return response_text
\ No newline at end of file
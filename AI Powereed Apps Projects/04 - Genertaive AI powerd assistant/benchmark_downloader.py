@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+# Benchmark: download time of a large file over one connection versus parallel Range requests, and the
+# bytes sent again when an interrupted download is resumed. The file is served by a local HTTP server
+# that supports Range/If-Range, sends a strong ETag, and caps the bandwidth of each connection.
+
+import argparse  # Command line options.
+import hashlib  # ETag and checksum of the test file.
+import os  # Removing the downloaded files.
+import re  # Parsing Range headers.
+import sys  # Finding the shared downloader.
+import tempfile  # Where the files are downloaded to.
+import threading  # Running the server in the background.
+import time  # Timing the downloads and throttling the server.
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # The local test server.
+
+# The downloader is shared with the other projects (../shared)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "shared"))
+from downloader import PART_SIZE, DownloadError, download  # noqa: E402
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves `payload` at any path, `bandwidth` bytes per second per connection."""
+
+    payload = b""
+    bandwidth = 4e6
+    drop_after = None   # Close every connection after sending this many bytes of the body.
+    bytes_sent = 0
+    lock = threading.Lock()
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_headers(len(self.payload))
+        self.end_headers()
+
+    def do_GET(self):
+        start, end = 0, len(self.payload) - 1
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get("Range", ""))
+        etag = self.etag()
+        if match and self.headers.get("If-Range", etag) == etag:
+            start, end = int(match.group(1)), int(match.group(2) or end)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(self.payload)}")
+        else:
+            self.send_response(200)
+        self.send_headers(end - start + 1)
+        self.end_headers()
+
+        sent, block = 0, 64 << 10
+        for offset in range(start, end + 1, block):
+            if self.drop_after is not None and sent >= self.drop_after:
+                self.close_connection = True
+                return
+            data = self.payload[offset:min(offset + block, end + 1)]
+            self.wfile.write(data)
+            sent += len(data)
+            with self.lock:
+                RangeHandler.bytes_sent += len(data)
+            time.sleep(len(data) / self.bandwidth)
+
+    def send_headers(self, length):
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", self.etag())
+
+    @classmethod
+    def etag(cls):
+        return f'"{hashlib.md5(cls.payload).hexdigest()}"'
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare single-connection, parallel and resumed downloads.")
+    parser.add_argument("--size-mb", type=float, default=64, help="Size of the test file")
+    parser.add_argument("--bandwidth-mbps", type=float, default=200, help="Bandwidth of each connection")
+    parser.add_argument("--parallel", type=int, default=4)
+    args = parser.parse_args()
+
+    RangeHandler.payload = os.urandom(int(args.size_mb * (1 << 20)))
+    RangeHandler.bandwidth = args.bandwidth_mbps * 1e6 / 8
+    sha256 = hashlib.sha256(RangeHandler.payload).hexdigest()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/fixture.bin"
+    path = os.path.join(tempfile.mkdtemp(), "fixture.bin")
+
+    print(f"{'download':>22} {'seconds':>8} {'MB sent':>8}")
+    for name, parallel in (("one connection", 1), (f"{args.parallel} parallel ranges", args.parallel)):
+        RangeHandler.bytes_sent = 0
+        start = time.perf_counter()
+        download(url, path, parallel=parallel)
+        print(f"{name:>22} {time.perf_counter() - start:>8.2f} {RangeHandler.bytes_sent / (1 << 20):>8.1f}")
+        os.remove(path)
+
+    # Every connection dropped halfway through its range, then resumed from the .part file
+    RangeHandler.bytes_sent = 0
+    RangeHandler.drop_after = PART_SIZE // 2
+    try:
+        download(url, path, parallel=args.parallel, retries=0)
+    except DownloadError:
+        pass
+    interrupted = RangeHandler.bytes_sent
+    RangeHandler.drop_after = None
+    RangeHandler.bytes_sent = 0
+    start = time.perf_counter()
+    download(url, path, sha256=sha256, parallel=args.parallel)
+    print(f"{'resumed':>22} {time.perf_counter() - start:>8.2f} {RangeHandler.bytes_sent / (1 << 20):>8.1f}"
+          f"  ({interrupted / (1 << 20):.1f} MB were already there)")
+    os.remove(path)
+    server.shutdown()
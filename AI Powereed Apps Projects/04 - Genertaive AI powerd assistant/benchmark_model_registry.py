@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+# Benchmark: per-request latency of transcribing a fixed clip when every request builds its own
+# Whisper pipeline (as transcript_audio used to) versus using the shared pipeline of the registry.
+
+import argparse  # Command line options.
+import os  # Checking for the sample clip.
+import statistics  # Median latency.
+import time  # Timing the requests.
+
+import numpy as np  # Synthetic clip when the sample file isn't there.
+
+from model_registry import ASR_BATCH_SIZE, ASR_CHUNK_LENGTH_S, ASR_MODEL, transcribe, warm_up_asr
+
+
+def fixed_clip(path, seconds):
+    """Returns the audio file at `path` if it exists, else `seconds` of a 16 kHz test tone."""
+    if os.path.exists(path):
+        return path
+    t = np.arange(int(seconds * 16000)) / 16000
+    return {"raw": (0.1 * np.sin(2 * np.pi * 220 * t)).astype(np.float32), "sampling_rate": 16000}
+
+
+def inline_request(clip, model, chunk_length_s, batch_size):
+    """What transcript_audio used to do on every call: build the pipeline, then transcribe."""
+    from transformers import pipeline
+    pipe = pipeline("automatic-speech-recognition", model=model, chunk_length_s=chunk_length_s)
+    return pipe(dict(clip) if isinstance(clip, dict) else clip, batch_size=batch_size)["text"]
+
+
+def registry_request(clip, model, chunk_length_s, batch_size):
+    """The shared pipeline of the registry."""
+    return transcribe(dict(clip) if isinstance(clip, dict) else clip, model, chunk_length_s, batch_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-request ASR latency with inline pipelines and the model registry.")
+    parser.add_argument("--clip", default="downloaded_audio.mp3", help="Audio file to transcribe (downloadmp3.py fetches it)")
+    parser.add_argument("--seconds", type=float, default=10, help="Length of the test tone used when --clip doesn't exist")
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--model", default=ASR_MODEL)
+    parser.add_argument("--chunk-length", type=int, default=ASR_CHUNK_LENGTH_S)
+    parser.add_argument("--batch-size", type=int, default=ASR_BATCH_SIZE)
+    args = parser.parse_args()
+
+    clip = fixed_clip(args.clip, args.seconds)
+    config = (args.model, args.chunk_length, args.batch_size)
+
+    start = time.perf_counter()
+    warm_up_asr(args.model, args.chunk_length, mode="eager")
+    warm_up = time.perf_counter() - start
+
+    print(f"{'mode':>9} {'first ms':>9} {'median ms':>10} {'max ms':>8}")
+    for mode, request in (("inline", inline_request), ("registry", registry_request)):
+        latencies = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            request(clip, *config)
+            latencies.append(time.perf_counter() - start)
+        print(f"{mode:>9} {latencies[0] * 1000:>9.0f} {statistics.median(latencies) * 1000:>10.0f} "
+              f"{max(latencies) * 1000:>8.0f}")
+    print(f"One-off warm-up of the registry at startup: {warm_up * 1000:.0f} ms")
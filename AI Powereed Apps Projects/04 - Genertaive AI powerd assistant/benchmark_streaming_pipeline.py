@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+# Benchmark: end-to-end latency of the speech analyzer on a long recording when the key points are
+# extracted after the whole file is transcribed (sequential) versus while it is being transcribed
+# (streaming). Whisper and the LLM are stand-ins that take a configurable time per window and per call,
+# and the times are scaled down so that a 30-minute recording runs in seconds.
+
+import argparse  # Command line options.
+import random  # Stand-in transcript.
+import time  # Timing and simulated work.
+
+from summarization import MapReduceSummarizer, stream_key_points
+
+WORDS = ("we need to review the budget for the next quarter and the team agreed to move the release "
+         "date because testing found problems in the new speech features").split()
+
+
+def fake_segments(minutes, window_s, overlap_s, seconds_per_window, words_per_minute=150, seed=0):
+    """Transcript segments of a `minutes`-long recording, one window every `seconds_per_window`."""
+    rng = random.Random(seed)
+    step = window_s - overlap_s
+    start = 0.0
+    while start < minutes * 60:
+        time.sleep(seconds_per_window)
+        words = [rng.choice(WORDS) for _ in range(int(words_per_minute * step / 60))]
+        for i in range(0, len(words), 12):
+            yield {"timestamp": (start, start + step), "text": " ".join(words[i:i + 12]).capitalize() + "."}
+        start += step
+
+
+def fake_llm(seconds):
+    def call(text):
+        time.sleep(seconds)
+        return f"- Key point about {text.split()[0].lower()} ({len(text.split())} words)"
+    return call
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare sequential and streaming transcription + summarization.")
+    parser.add_argument("--minutes", type=float, default=30, help="Length of the recording")
+    parser.add_argument("--window-seconds", type=float, default=1.5,
+                        help="Whisper time per 30-second window (whisper-tiny.en on a few CPU cores)")
+    parser.add_argument("--llm-seconds", type=float, default=20, help="LLM time per call (800 new tokens)")
+    parser.add_argument("--scale", type=float, default=0.05, help="Speed-up of the simulation; results are scaled back")
+    args = parser.parse_args()
+
+    def run(streaming):
+        llm = fake_llm(args.llm_seconds * args.scale)
+        summarizer = MapReduceSummarizer(llm, llm)
+        segments = fake_segments(args.minutes, 30, 5, args.window_seconds * args.scale)
+        start = time.perf_counter()
+        first_points = None
+        if streaming:
+            for _, points in stream_key_points(segments, summarizer):
+                if points and first_points is None:
+                    first_points = time.perf_counter() - start
+        else:
+            transcript = " ".join(segment["text"] for segment in segments)
+            points = summarizer.summarize(transcript)
+            first_points = time.perf_counter() - start
+        total = time.perf_counter() - start
+        return first_points / args.scale, total / args.scale, summarizer.stats()
+
+    print(f"{'pipeline':>10} {'first key points s':>19} {'end-to-end s':>13} {'LLM calls':>10}")
+    for name, streaming in (("sequential", False), ("streaming", True)):
+        first_points, total, stats = run(streaming)
+        print(f"{name:>10} {first_points:>19.0f} {total:>13.0f} {stats['mapped_chunks'] + stats['reduce_calls']:>10}")
@@ -1,20 +1,22 @@
-import requests
+import os
+import sys
+
+# The downloader is shared with the other projects (../shared)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "shared"))
+from downloader import DownloadError, download  # noqa: E402
 
 # URL of the audio file to be downloaded
 url = "https://cf-courses-data.s3.us.cloud-object-storage.appdomain.cloud/IBMSkillsNetwork-GPXX04C6EN/Testing%20speech%20to%20text.mp3"
 
-# Send a GET request to the URL to download the file
-response = requests.get(url)
-
 # Define the local file path where the audio file will be saved
 audio_file_path = "downloaded_audio.mp3"
 
-# Check if the request was successful (status code 200)
-if response.status_code == 200:
-    # If successful, write the content to the specified local file path
-    with open(audio_file_path, "wb") as file:
-        file.write(response.content)
+# Download the file in chunks straight to disk (as downloaded_audio.mp3.part until it is complete).
+# An interrupted download resumes where it stopped when the script is run again, and the content
+# is checked against any checksum the server advertises (pass sha256=... to check a known digest)
+try:
+    download(url, audio_file_path)
     print("File downloaded successfully")
-else:
-    # If the request failed, print an error message
-    print("Failed to download the file")
\ No newline at end of file
+except (DownloadError, OSError) as e:
+    # If the download failed, print an error message
+    print(f"Failed to download the file: {e}")
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+# Long-form transcription: the audio file is decoded as a stream into overlapping 30-second windows,
+# the windows are transcribed in parallel by a pool of Whisper replicas (one process per core), and
+# the timestamped segments are stitched back together at the overlaps. Only the windows in flight are
+# held in memory, so a two-hour recording needs no more memory than a two-minute one.
+
+import argparse  # Command line options.
+import os  # Core count and environment variables.
+import shutil  # Finding ffmpeg.
+import subprocess  # Decoding with ffmpeg.
+import tempfile  # ffmpeg's error messages.
+import threading  # Warming up the pool in the background.
+import time  # Timing the command line runs.
+import wave  # Decoding WAV files without ffmpeg.
+from collections import deque  # Windows in flight, in order.
+from concurrent.futures import ProcessPoolExecutor  # The pool of Whisper replicas.
+
+import numpy as np  # Audio samples.
+
+from model_registry import ASR_MODEL, MODEL_WARMUP, get_asr_pipeline, registry
+
+# Configuration (can be overridden with environment variables)
+ASR_WORKERS = int(os.environ.get("ASR_WORKERS", os.cpu_count() or 1))  # Whisper replicas (processes).
+ASR_WINDOW_S = float(os.environ.get("ASR_WINDOW_S", 30))               # Window length; Whisper's input is 30 s.
+ASR_OVERLAP_S = float(os.environ.get("ASR_OVERLAP_S", 5))              # Audio shared by consecutive windows.
+SAMPLING_RATE = 16000                                                   # Whisper's sampling rate.
+
+
+def stream_audio(path, sampling_rate=SAMPLING_RATE, block_s=10):
+    """
+    Decodes an audio file into mono float32 blocks of `block_s` seconds at `sampling_rate`.
+
+    Any format ffmpeg can read is supported; WAV files are also read without ffmpeg.
+
+    Yields:
+        np.ndarray: The next block of samples.
+    """
+    if shutil.which("ffmpeg") is None:
+        if not path.lower().endswith(".wav"):
+            raise RuntimeError(f"Decoding {path} needs ffmpeg: install it with your package manager")
+        yield from _stream_wav(path, sampling_rate, block_s)
+        return
+
+    command = ["ffmpeg", "-nostdin", "-v", "error", "-i", path, "-ac", "1", "-ar", str(sampling_rate), "-f", "f32le", "-"]
+    # ffmpeg's messages go to a file rather than a pipe: nobody reads a pipe until the audio has been
+    # read, so a damaged file that logs a lot would fill it and block ffmpeg (and the transcription).
+    with tempfile.TemporaryFile() as errors:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=errors)
+        block_bytes = int(block_s * sampling_rate) * 4
+        try:
+            while True:
+                data = process.stdout.read(block_bytes)
+                if not data:
+                    break
+                yield np.frombuffer(data[:len(data) // 4 * 4], dtype=np.float32)
+            if process.wait() != 0:
+                errors.seek(max(0, errors.tell() - 2000))  # The last messages say what went wrong
+                raise ValueError(f"ffmpeg could not decode {path}: {errors.read().decode(errors='replace').strip()}")
+        finally:
+            process.kill()
+            process.wait()
+            process.stdout.close()
+
+
+def _stream_wav(path, sampling_rate, block_s):
+    with wave.open(path, "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit WAV files can be read without ffmpeg")
+        channels, rate = f.getnchannels(), f.getframerate()
+        position = 0       # Output samples produced so far.
+        previous = None    # Last input sample of the previous block, for interpolating across blocks.
+        consumed = 0       # Input samples read so far.
+        while True:
+            frames = f.readframes(int(block_s * rate))
+            if not frames:
+                break
+            block = np.frombuffer(frames, dtype="<i2").reshape(-1, channels).mean(axis=1) / 32768
+            if rate != sampling_rate:
+                times = np.arange(consumed - (previous is not None), consumed + len(block))
+                values = block if previous is None else np.concatenate([[previous], block])
+                end = int(np.floor((consumed + len(block) - 1) * sampling_rate / rate)) + 1
+                wanted = np.arange(position, end) * rate / sampling_rate
+                previous, consumed, position = block[-1], consumed + len(block), end
+                block = np.interp(wanted, times, values)
+            yield block.astype(np.float32)
+
+
+def windows(blocks, sampling_rate=SAMPLING_RATE, window_s=ASR_WINDOW_S, overlap_s=ASR_OVERLAP_S):
+    """
+    Cuts a stream of sample blocks into windows of `window_s` seconds that overlap by `overlap_s`.
+
+    Yields:
+        tuple: (start time in seconds, samples) for each window; the last one may be shorter.
+    """
+    window, step = int(window_s * sampling_rate), int((window_s - overlap_s) * sampling_rate)
+    buffer = np.empty(0, dtype=np.float32)
+    offset = 0
+    for block in blocks:
+        buffer = np.concatenate([buffer, block])
+        while len(buffer) >= window:
+            yield offset / sampling_rate, buffer[:window].copy()
+            buffer = buffer[step:]
+            offset += step
+    # The remainder, unless it is only audio the last window already covered
+    if len(buffer) and (offset == 0 or len(buffer) > window - step):
+        yield offset / sampling_rate, buffer
+
+
+def _load_replica(model, threads):
+    """Pool initializer: shares the cores among the replicas and loads this process's Whisper replica."""
+    import torch
+    torch.set_num_threads(threads)
+    get_asr_pipeline(model, chunk_length_s=None)
+
+
+def _transcribe_window(model, samples, start, sampling_rate=SAMPLING_RATE):
+    """Transcribes one window; returns its segments as (start, end, text) in seconds from the start of the file."""
+    result = get_asr_pipeline(model, chunk_length_s=None)(
+        {"raw": samples, "sampling_rate": sampling_rate}, return_timestamps=True)
+    end_of_window = start + len(samples) / sampling_rate
+    segments = []
+    for chunk in result.get("chunks") or [{"timestamp": (0.0, None), "text": result["text"]}]:
+        segment_start, segment_end = chunk["timestamp"]
+        segments.append((start + (segment_start or 0.0),
+                         start + segment_end if segment_end is not None else end_of_window,
+                         chunk["text"]))
+    return segments
+
+
+def get_pool(model=ASR_MODEL, workers=ASR_WORKERS):
+    """Returns the shared pool of `workers` processes, each holding a replica of `model`."""
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    return registry.get(("asr-pool", model, workers),
+                        lambda: ProcessPoolExecutor(workers, initializer=_load_replica, initargs=(model, threads)))
+
+
+def transcribe_long(path, model=ASR_MODEL, workers=ASR_WORKERS, window_s=ASR_WINDOW_S, overlap_s=ASR_OVERLAP_S):
+    """
+    Transcribes an audio file of any length in parallel.
+
+    Each window keeps the segments whose midpoint falls between the middle of its overlap with
+    the previous window and the middle of its overlap with the next one, so every stretch of
+    audio is taken from exactly one window, away from its edges where words get cut.
+
+    Yields:
+        dict: The segments in order, as {"timestamp": (start, end), "text": text} like Whisper's chunks.
+    """
+    pool = get_pool(model, workers)
+    step = window_s - overlap_s
+    in_flight = deque()
+
+    def stitched(start, future, last):
+        lower = start + overlap_s / 2 if start > 0 else float("-inf")
+        upper = start + step + overlap_s / 2 if not last else float("inf")
+        for segment_start, segment_end, text in future.result():
+            if lower <= (segment_start + segment_end) / 2 < upper:
+                yield {"timestamp": (segment_start, segment_end), "text": text}
+
+    try:
+        for start, samples in windows(stream_audio(path), SAMPLING_RATE, window_s, overlap_s):
+            in_flight.append((start, pool.submit(_transcribe_window, model, samples, start)))
+            # Two windows per replica keep every replica busy; more would only use memory.
+            # A window is stitched once a later one exists, so it is known not to be the last.
+            if len(in_flight) > 2 * workers:
+                yield from stitched(*in_flight.popleft(), last=False)
+        while in_flight:
+            start, future = in_flight.popleft()
+            yield from stitched(start, future, last=not in_flight)
+    finally:
+        for _, future in in_flight:
+            future.cancel()
+
+
+def transcribe_file(path, model=ASR_MODEL, workers=ASR_WORKERS):
+    """
+    Transcribes an audio file of any length in parallel.
+
+    Returns:
+        str: The transcribed text.
+    """
+    return " ".join(segment["text"].strip() for segment in transcribe_long(path, model, workers))
+
+
+def warm_up_pool(model=ASR_MODEL, workers=ASR_WORKERS, mode=MODEL_WARMUP):
+    """
+    Starts the pool's processes so the replicas load their model before the first request.
+
+    Args:
+        mode (str): "eager" waits for the warm-up, "background" runs it on a thread and
+            "lazy" skips it (the replicas are then loaded by the first request).
+    """
+    def run():
+        list(get_pool(model, workers).map(time.sleep, [0.1] * workers))
+
+    if mode == "eager":
+        run()
+    elif mode == "background":
+        threading.Thread(target=run, daemon=True).start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcribe a long recording in parallel with timestamps.")
+    parser.add_argument("audio", help="Audio file to transcribe")
+    parser.add_argument("--model", default=ASR_MODEL)
+    parser.add_argument("--workers", type=int, default=ASR_WORKERS, help="Whisper replicas (processes)")
+    parser.add_argument("--window", type=float, default=ASR_WINDOW_S, help="Window length in seconds")
+    parser.add_argument("--overlap", type=float, default=ASR_OVERLAP_S, help="Overlap of consecutive windows in seconds")
+    args = parser.parse_args()
+
+    import resource  # Peak memory of the decoding process (Unix only).
+
+    warm_up_pool(args.model, args.workers, mode="eager")
+    start = time.perf_counter()
+    last_end = 0.0
+    for segment in transcribe_long(args.audio, args.model, args.workers, args.window, args.overlap):
+        segment_start, last_end = segment["timestamp"]
+        print(f"[{segment_start:8.2f} -> {last_end:8.2f}] {segment['text'].strip()}")
+    elapsed = time.perf_counter() - start
+    print(f"Transcribed {last_end:.0f}s of audio in {elapsed:.1f}s ({last_end / elapsed:.1f}x real time) "
+          f"with {args.workers} workers; peak memory of this process "
+          f"{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+# Process-wide model registry: every Whisper pipeline and LLM this project uses is built once per
+# process and shared by all requests and entry points, instead of being rebuilt on every call.
+
+import os  # Environment variables for the model configuration.
+import threading  # Locks so concurrent requests don't load the same model twice.
+
+import numpy as np  # Silent audio for warming up the ASR pipelines.
+
+# Configuration (can be overridden with environment variables)
+ASR_MODEL = os.environ.get("ASR_MODEL", "openai/whisper-tiny.en")          # Whisper model id or local path.
+ASR_CHUNK_LENGTH_S = int(os.environ.get("ASR_CHUNK_LENGTH_S", 30))         # Audio is processed in chunks this long.
+ASR_BATCH_SIZE = int(os.environ.get("ASR_BATCH_SIZE", 8))                  # Chunks transcribed at a time.
+LLM_MODEL = os.environ.get("LLM_MODEL", "meta-llama/llama-2-70b-chat")     # watsonx.ai foundation model id.
+MODEL_WARMUP = os.environ.get("MODEL_WARMUP", "eager")                     # "eager", "background" or "lazy".
+
+
+class ModelRegistry:
+    """
+    Thread-safe store of loaded models, keyed by their configuration.
+
+    `get` builds a model with its factory the first time its key is asked for and returns the
+    same object afterwards. Requests for a model that is still loading wait for it rather than
+    loading a second copy; different models load in parallel.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, factory):
+        """
+        Returns the model stored under `key`, building it with `factory()` if needed.
+
+        Args:
+            key (tuple): The model's configuration, e.g. ("asr", model id, chunk length).
+            factory (callable): Builds the model.
+        """
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._models:
+                self._models[key] = factory()
+            return self._models[key]
+
+    def loaded(self):
+        """Returns the keys of the models loaded so far."""
+        return list(self._models)
+
+
+# The registry shared by every entry point in the process
+registry = ModelRegistry()
+
+
+def get_asr_pipeline(model=ASR_MODEL, chunk_length_s=ASR_CHUNK_LENGTH_S):
+    """
+    Returns the shared Whisper speech recognition pipeline for `model` and `chunk_length_s`.
+    """
+    def build():
+        from transformers import pipeline  # Imported here so LLM-only entry points don't pay for it.
+        return pipeline("automatic-speech-recognition", model=model, chunk_length_s=chunk_length_s)
+
+    return registry.get(("asr", model, chunk_length_s), build)
+
+
+def transcribe(audio, model=ASR_MODEL, chunk_length_s=ASR_CHUNK_LENGTH_S, batch_size=ASR_BATCH_SIZE):
+    """
+    Transcribes an audio file path (or a {"raw": samples, "sampling_rate": rate} dict).
+
+    Returns:
+        str: The transcribed text.
+    """
+    return get_asr_pipeline(model, chunk_length_s)(audio, batch_size=batch_size)["text"]
+
+
+def get_llm(model_id=LLM_MODEL, max_new_tokens=800, temperature=0.1):
+    """
+    Returns the shared LangChain-compatible watsonx.ai LLM for `model_id` and the generation parameters.
+
+    The credentials come from the WATSONX_URL, WATSONX_APIKEY and WATSONX_PROJECT_ID environment variables.
+    """
+    def build():
+        from ibm_watson_machine_learning.foundation_models import Model
+        from ibm_watson_machine_learning.foundation_models.extensions.langchain import WatsonxLLM
+        from ibm_watson_machine_learning.metanames import GenTextParamsMetaNames as GenParams
+
+        credentials = {
+            "url": os.environ.get("WATSONX_URL", "https://us-south.ml.cloud.ibm.com"),
+            "apikey": os.environ.get("WATSONX_APIKEY", "YOUR_API_KEY"),  # Replace with your IBM Cloud API key.
+        }
+        params = {GenParams.MAX_NEW_TOKENS: max_new_tokens, GenParams.TEMPERATURE: temperature}
+        model = Model(model_id=model_id, credentials=credentials, params=params,
+                      project_id=os.environ.get("WATSONX_PROJECT_ID", "skills-network"))
+        return WatsonxLLM(model)
+
+    return registry.get(("llm", model_id, max_new_tokens, temperature), build)
+
+
+def warm_up_asr(model=ASR_MODEL, chunk_length_s=ASR_CHUNK_LENGTH_S, mode=MODEL_WARMUP):
+    """
+    Loads the ASR pipeline and runs it once on a second of silence, so the first real request
+    doesn't pay for loading the weights or setting up the graph.
+
+    Args:
+        mode (str): "eager" waits for the warm-up, "background" runs it on a thread and
+            "lazy" skips it (the model is then loaded by the first request).
+    """
+    def run():
+        transcribe({"raw": np.zeros(16000, dtype=np.float32), "sampling_rate": 16000}, model, chunk_length_s)
+
+    if mode == "eager":
+        run()
+    elif mode == "background":
+        threading.Thread(target=run, daemon=True).start()
@@ -1,18 +1,12 @@
-import torch
-from transformers import pipeline
-# Initialize the speech-to-text pipeline from Hugging Face Transformers
-# This uses the "openai/whisper-tiny.en" model for automatic speech recognition (ASR)
-# The `chunk_length_s` parameter specifies the chunk length in seconds for processing
-pipe = pipeline(
-  "automatic-speech-recognition",
-  model="openai/whisper-tiny.en",
-  chunk_length_s=30,
-)
+from model_registry import transcribe
+# The speech-to-text pipeline comes from the shared model registry (model_registry.py)
+# It uses the "openai/whisper-tiny.en" model for automatic speech recognition (ASR),
+# processing the audio in 30-second chunks (ASR_MODEL and ASR_CHUNK_LENGTH_S change this)
 # Define the path to the audio file that needs to be transcribed
 sample = 'downloaded_audio.mp3'
 # Perform speech recognition on the audio file
-# The `batch_size=8` parameter indicates how many chunks are processed at a time
-# The result is stored in `prediction` with the key "text" containing the transcribed text
-prediction = pipe(sample, batch_size=8)["text"]
+# By default 8 chunks are processed at a time (ASR_BATCH_SIZE)
+# The result is the transcribed text
+prediction = transcribe(sample)
 # Print the transcribed text to the console
 print(prediction)
\ No newline at end of file
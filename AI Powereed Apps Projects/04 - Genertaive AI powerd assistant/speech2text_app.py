@@ -2,9 +2,8 @@
 # Shebang: Directs the operating system to use the Python3 interpreter.
 
 # Import Statements
-import torch       # PyTorch: A deep learning library used by the Transformers pipeline.
-from transformers import pipeline  # Pipeline: Streamlines the process of loading and using pre-trained models.
 import gradio as gr  # Gradio: A library for building easy-to-use web interfaces for ML models.
+from long_transcription import transcribe_file, warm_up_pool  # Parallel Whisper replicas for recordings of any length.
 
 # Transcription Function
 def transcript_audio(audio_file):
@@ -19,15 +18,10 @@ def transcript_audio(audio_file):
         str: The transcribed text from the audio file.
     """
 
-    # Initialize the Speech Recognition Pipeline
-    pipe = pipeline(
-        "automatic-speech-recognition",  # Task: Automatic speech recognition.
-        model="openai/whisper-tiny.en",   # Model: The Whisper model for English language.
-        chunk_length_s=30                 # Chunk Length: Process audio in 30-second chunks.
-    )
-
-    # Transcribe the Audio
-    result = pipe(audio_file, batch_size=8)["text"]  # Transcribe using batch processing.
+    # Transcribe the Audio in overlapping 30-second windows spread over one Whisper replica per core
+    # (openai/whisper-tiny.en by default; see long_transcription.py). The replicas are loaded once, not
+    # on every upload, and only the windows being transcribed are held in memory.
+    result = transcribe_file(audio_file)
 
     return result 
 
@@ -52,6 +46,7 @@ iface = gr.Interface(
 # Launch the Gradio App
 if __name__ == "__main__":       
     # This line ensures that the following code is only executed if this script is run as the main program (not imported as a module).
+    warm_up_pool()  # Load the Whisper replicas before the first upload (MODEL_WARMUP: eager, background or lazy).
     iface.launch(server_name="0.0.0.0", server_port=7860)  
     # Starts the Gradio app:
     # - server_name="0.0.0.0": Makes the app accessible from any device on the network.
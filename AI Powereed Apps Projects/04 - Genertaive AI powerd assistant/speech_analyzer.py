@@ -3,38 +3,21 @@
 # Shebang: Directs the operating system to use the Python3 interpreter for executing this script.
 
 # Import Statements
-import torch  # PyTorch for deep learning and tensor operations.
 import gradio as gr  # Gradio for creating user interfaces for machine learning models.
 
-from transformers import pipeline  # Transformers library for easy access to pre-trained models.
 from langchain.prompts import PromptTemplate  # Langchain to create structured prompts for language models.
 from langchain.chains import LLMChain  # Langchain for chaining prompts and LLM responses together.
 
-from ibm_watson_machine_learning.foundation_models import Model  # IBM SDK for interacting with foundation models.
-from ibm_watson_machine_learning.foundation_models.extensions.langchain import WatsonxLLM  # LangChain wrapper for IBM Watsonx LLM.
-from ibm_watson_machine_learning.metanames import GenTextParamsMetaNames as GenParams  # Parameter names for text generation with IBM models.
-
-# IBM Watson Model Setup
-my_credentials = {
-    "url": "https://us-south.ml.cloud.ibm.com",  # URL for the IBM Watson Machine Learning service.
-    "apikey": "YOUR_API_KEY"  # Replace with your actual IBM Watson API key.
-}
-# Generation parameters for the language model
-params = {
-    GenParams.MAX_NEW_TOKENS: 800,    # Maximum number of tokens to generate in a single response.
-    GenParams.TEMPERATURE: 0.1        # Controls randomness in text generation (lower = more focused).
-}
-
-# Load Llama 2 Chat Model
-llama2_model = Model(
-    model_id='meta-llama/llama-2-70b-chat',    # ID of the Llama 2 70B chat model on IBM Watson.
-    credentials=my_credentials,             # Authentication credentials.
-    params=params,                           # Text generation parameters.
-    project_id="skills-network"              # Your project ID on IBM Watson Machine Learning.
-)
+from model_registry import get_llm  # Shared LLM, loaded once per process.
+from long_transcription import transcribe_long, warm_up_pool  # Parallel Whisper replicas for recordings of any length.
+from summarization import MapReduceSummarizer, stream_key_points  # Key points of transcripts longer than the context window.
 
-# Create LangChain-compatible LLM object
-llm = WatsonxLLM(llama2_model)                 # Creates an interface for using the model with LangChain.
+# Llama 2 70B chat on IBM watsonx.ai, LangChain-compatible (set WATSONX_APIKEY to your IBM Watson API key)
+llm = get_llm(
+    "meta-llama/llama-2-70b-chat",  # ID of the Llama 2 70B chat model on IBM Watson.
+    max_new_tokens=800,             # Maximum number of tokens to generate in a single response.
+    temperature=0.1                 # Controls randomness in text generation (lower = more focused).
+)
 
 
 # Prompt Template
@@ -61,35 +44,49 @@ prompt = PromptTemplate(
 chain = LLMChain(llm=llm, prompt=prompt)        # This creates a chain to manage the LLM and prompt.
 
 
-# Audio Transcription and Summarization Function
-def transcript_audio(audio_file):
-    # Load Whisper model for speech-to-text
-    pipe = pipeline(
-        "automatic-speech-recognition",
-        model="openai/whisper-tiny.en",  # English whisper model from OpenAI.
-        chunk_length_s=30,               # Process audio in 30-second chunks.
-    )
+# Prompt Template for merging the key points of the parts of a long transcript
+reduce_template = """
+<s><<SYS>>
+Merge these key points from consecutive parts of one recording into a single list of key points with details, without repeating any:
+[INST] The key points : {points} [/INST]
+<</SYS>>
+"""
+reduce_prompt = PromptTemplate(input_variables=["points"], template=reduce_template)
+reduce_chain = LLMChain(llm=llm, prompt=reduce_prompt)
+
+# Long transcripts are split into chunks that fit the context window. The key points of the chunks are
+# extracted concurrently and merged by reduce_chain; the key points of each chunk are cached, so only the
+# chunks that changed are sent again (chunk budget and parallelism: SUMMARY_CHUNK_TOKENS, SUMMARY_PARALLELISM).
+summarizer = MapReduceSummarizer(
+    chain.run,                                  # Key points of one chunk.
+    reduce_chain.run,                           # Merged key points of the chunks.
+    namespace="meta-llama/llama-2-70b-chat" + prompt_template + reduce_template  # Cached key points are per model and prompt.
+)
 
-    # Transcribe the audio
-    transcript_text = pipe(audio_file, batch_size=8)["text"]  # Transcribe and get the text.
 
-    # Summarize with Llama 2 Model
-    result = chain.run(transcript_text)      # Run the text through the LLM chain for summarization.
-    return result
+# Audio Transcription and Summarization Function
+def transcript_audio(audio_file):
+    # Transcribe the audio in parallel 30-second windows (openai/whisper-tiny.en) and summarize it with
+    # Llama 2 at the same time: every finished part of the transcript is queued for its key points while
+    # later audio is still being transcribed, so only the last part and the merge are left at the end.
+    # This is a generator, so Gradio shows the transcript and key points as they come in.
+    yield from stream_key_points(transcribe_long(audio_file), summarizer)
 
 
 # Gradio Interface Setup
 audio_input = gr.Audio(sources="upload", type="filepath")  # File upload component for audio.
-output_text = gr.Textbox()                               # Textbox component to display results.
+transcript_output = gr.Textbox(label="Transcript")      # Textbox for the transcript, filled in as it is transcribed.
+key_points_output = gr.Textbox(label="Key points")      # Textbox for the key points, filled in as they are extracted.
 
 iface = gr.Interface(
     fn=transcript_audio,                         # Function to be called when the interface is run.
     inputs=audio_input,                         # Input component (audio file).
-    outputs=output_text,                        # Output component (summarized text).
+    outputs=[transcript_output, key_points_output],  # Output components (transcript and key points).
     title="Audio Transcription & Key Points App",  # Title of the web app.
     description="Upload an audio file to transcribe and extract key points."  # Description of the web app.
 )
 
 # Main Execution Block - Conditional starting point of the script
 if __name__ == "__main__":
+    warm_up_pool()  # Load the Whisper replicas before the first upload (MODEL_WARMUP: eager, background or lazy).
     iface.launch(server_name="0.0.0.0", server_port=7860)  # Start Gradio interface on all network interfaces, port 7860.
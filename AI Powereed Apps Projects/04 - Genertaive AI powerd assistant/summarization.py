@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+# Map-reduce summarization for transcripts longer than the LLM's context window: the transcript is
+# split into chunks that fit the token budget, the key points of the chunks are extracted concurrently
+# (map), and the partial key points are merged by a final call (reduce). The key points of every chunk
+# are cached, so summarizing an edited transcript again only sends the chunks that changed.
+
+import hashlib  # Cache keys.
+import os  # Environment variables for the configuration.
+import re  # Splitting into sentences.
+import threading  # Lock for the cache.
+from collections import OrderedDict  # Least recently used order of the cache.
+from concurrent.futures import ThreadPoolExecutor  # Concurrent map calls.
+
+# Configuration (can be overridden with environment variables)
+SUMMARY_CHUNK_TOKENS = int(os.environ.get("SUMMARY_CHUNK_TOKENS", 1500))   # Prompt budget per call (Llama 2: 4096 in total).
+SUMMARY_PARALLELISM = int(os.environ.get("SUMMARY_PARALLELISM", 4))        # LLM calls in flight at a time.
+SUMMARY_CACHE_ENTRIES = int(os.environ.get("SUMMARY_CACHE_ENTRIES", 4096))  # Chunks whose key points are kept.
+
+
+def approx_tokens(text):
+    """Estimates the number of LLM tokens in `text` (about 4 characters per token for English)."""
+    return len(text) // 4 + 1
+
+
+def _sentences(text):
+    return [s for s in re.split(r'(?<=[.!?])\s+|\n+', text) if s.strip()]
+
+
+def split_transcript(text, max_tokens=SUMMARY_CHUNK_TOKENS, count_tokens=approx_tokens):
+    """
+    Splits a transcript into chunks of whole sentences of at most `max_tokens` tokens.
+
+    Besides when the budget is full, a chunk also ends after any sentence whose hash is a
+    multiple of 4 once the chunk holds half the budget. These cuts depend only on the sentences
+    themselves, so after an edit the chunks line up with the old ones again from the first such
+    cut on, and only the chunks around the edit change.
+
+    Returns:
+        list: The chunks, as strings.
+    """
+    chunks, current, size = [], [], 0
+    for sentence in _sentences(text):
+        tokens = count_tokens(sentence)
+        if current and size + tokens > max_tokens:
+            chunks.append(" ".join(current))
+            current, size = [], 0
+        if tokens > max_tokens:
+            # A run-on "sentence" longer than the budget (transcripts often have no punctuation)
+            words = sentence.split()
+            step = max(1, len(words) * max_tokens // tokens)
+            chunks.extend(" ".join(words[i:i + step]) for i in range(0, len(words), step))
+            continue
+        current.append(sentence)
+        size += tokens
+        if size >= max_tokens // 2 and int(hashlib.sha1(sentence.encode()).hexdigest(), 16) % 4 == 0:
+            chunks.append(" ".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+class MapReduceSummarizer:
+    """
+    Extracts the key points of a long text with `map_fn` on each chunk and merges them with `reduce_fn`.
+
+    Args:
+        map_fn (callable): Returns the key points of a chunk of text (e.g. `LLMChain.run`).
+        reduce_fn (callable): Returns the merged key points of the partial key points, separated by blank lines.
+        namespace (str): Identifies the prompt and model in the cache keys, so a different prompt
+            or model doesn't reuse old key points.
+    """
+
+    def __init__(self, map_fn, reduce_fn, namespace="", max_tokens=SUMMARY_CHUNK_TOKENS,
+                 parallelism=SUMMARY_PARALLELISM, cache_entries=SUMMARY_CACHE_ENTRIES, count_tokens=approx_tokens):
+        self.map_fn = map_fn
+        self.reduce_fn = reduce_fn
+        self.namespace = namespace
+        self.max_tokens = max_tokens
+        self.cache_entries = cache_entries
+        self.count_tokens = count_tokens
+        self._executor = ThreadPoolExecutor(parallelism)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.cached_chunks = 0
+        self.mapped_chunks = 0
+        self.reduce_calls = 0
+
+    def summarize(self, text):
+        """Returns the key points of `text`, in one call if it fits the budget."""
+        return self._merge(list(self._executor.map(self._map, split_transcript(text, self.max_tokens, self.count_tokens))))
+
+    def stream(self):
+        """Returns a SummaryStream, for text that is still arriving."""
+        return SummaryStream(self)
+
+    def stats(self):
+        """Returns how many chunks came from the cache and how many LLM calls were made."""
+        with self._lock:
+            return {"cached_chunks": self.cached_chunks, "mapped_chunks": self.mapped_chunks,
+                    "reduce_calls": self.reduce_calls, "cache_entries": len(self._cache)}
+
+    def _map(self, chunk):
+        key = hashlib.sha256(f"{self.namespace}\0{chunk}".encode()).hexdigest()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.cached_chunks += 1
+                return self._cache[key]
+        points = self.map_fn(chunk)
+        with self._lock:
+            self.mapped_chunks += 1
+            self._cache[key] = points
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return points
+
+    def _merge(self, partials):
+        # Merge in rounds until the key points fit one call (long recordings can need more than one)
+        while len(partials) > 1:
+            joined = "\n\n".join(partials)
+            groups = [joined]
+            if self.count_tokens(joined) > self.max_tokens:
+                groups = split_transcript(joined, self.max_tokens, self.count_tokens)
+            if len(groups) >= len(partials):
+                groups = [joined]  # The key points don't shrink any further; merge them all.
+            partials = list(self._executor.map(self._reduce, groups))
+        return partials[0] if partials else ""
+
+    def _reduce(self, partials):
+        with self._lock:
+            self.reduce_calls += 1
+        return self.reduce_fn(partials)
+
+
+class SummaryStream:
+    """
+    Key points of a text that arrives in pieces, e.g. a transcript while Whisper is still producing it.
+
+    A chunk is queued for its map call as soon as text after it has arrived, so the key points of
+    the beginning of a recording are extracted while the rest is still being transcribed, and only
+    the last chunk and the reduce step are left when the transcript is complete.
+    """
+
+    def __init__(self, summarizer):
+        self.summarizer = summarizer
+        self._pending = ""   # The last chunk, which can still grow.
+        self._futures = []   # Map calls of the finished chunks, in order.
+
+    def add(self, text):
+        """Appends `text` and queues the map calls of the chunks it completes."""
+        summarizer = self.summarizer
+        chunks = split_transcript(f"{self._pending} {text}", summarizer.max_tokens, summarizer.count_tokens)
+        for chunk in chunks[:-1]:
+            self._futures.append(summarizer._executor.submit(summarizer._map, chunk))
+        self._pending = chunks[-1] if chunks else ""
+
+    def ready(self):
+        """Returns the key points of the leading chunks whose map calls are done."""
+        points = []
+        for future in self._futures:
+            if not future.done():
+                break
+            points.append(future.result())
+        return points
+
+    def finish(self):
+        """Waits for the map calls, including the one of the last chunk, and returns the merged key points."""
+        if self._pending.strip():
+            self._futures.append(self.summarizer._executor.submit(self.summarizer._map, self._pending))
+            self._pending = ""
+        return self.summarizer._merge([future.result() for future in self._futures])
+
+
+def stream_key_points(segments, summarizer):
+    """
+    Summarizes a transcript while it is being transcribed.
+
+    Args:
+        segments (iterable): Transcript segments in order, as {"text": text, ...} dicts
+            (e.g. from long_transcription.transcribe_long).
+        summarizer (MapReduceSummarizer): Extracts and merges the key points.
+
+    Yields:
+        tuple: (transcript so far, key points so far) after every segment; the last tuple has the
+            complete transcript and the merged key points.
+    """
+    stream = summarizer.stream()
+    transcript = []
+    for segment in segments:
+        transcript.append(segment["text"].strip())
+        stream.add(segment["text"])
+        yield " ".join(transcript), "\n\n".join(stream.ready())
+    yield " ".join(transcript), stream.finish()
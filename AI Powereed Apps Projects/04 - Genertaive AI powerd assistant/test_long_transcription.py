@@ -0,0 +1,100 @@
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import long_transcription
+from long_transcription import stream_audio, warm_up_pool, windows
+
+FAKE_FFMPEG = f"""#!{sys.executable}
+# Logs far more than a pipe holds before writing any audio, then fails like a damaged file
+import sys
+for i in range(20000):
+    sys.stderr.write("warning: damaged frame %d\\n" % i)
+sys.stderr.flush()
+sys.stdout.buffer.write(bytes(16000 * 4))
+sys.stdout.flush()
+sys.stderr.write("fatal: bad input\\n")
+sys.exit(1)
+"""
+
+
+def test_ffmpeg_logging_a_lot_does_not_block_decoding(tmp_path, monkeypatch):
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_text(FAKE_FFMPEG)
+    ffmpeg.chmod(0o755)
+    monkeypatch.setenv("PATH", str(tmp_path))
+
+    outcome = []
+
+    def decode():
+        try:
+            outcome.append(sum(len(block) for block in stream_audio(str(tmp_path / "meeting.mp3"))))
+        except ValueError as e:
+            outcome.append(e)
+
+    thread = threading.Thread(target=decode, daemon=True)
+    thread.start()
+    thread.join(20)
+    assert not thread.is_alive(), "decoding blocked on ffmpeg's stderr"
+    assert isinstance(outcome[0], ValueError) and "fatal: bad input" in str(outcome[0])
+
+
+def test_windows_overlap_and_cover_the_whole_stream():
+    rate = 100
+    samples = np.arange(95 * rate, dtype=np.float32)
+    blocks = np.array_split(samples, 7)
+    cut = list(windows(blocks, rate, window_s=30, overlap_s=5))
+    assert [start for start, _ in cut] == [0, 25, 50, 75]
+    assert all(len(window) == 30 * rate for _, window in cut[:-1])
+    for start, window in cut:
+        assert window[0] == start * rate
+    assert cut[-1][1][-1] == samples[-1]
+
+
+def test_short_recording_is_one_window():
+    cut = list(windows([np.zeros(500, dtype=np.float32)], 100, window_s=30, overlap_s=5))
+    assert len(cut) == 1 and len(cut[0][1]) == 500
+
+
+@pytest.mark.parametrize("rate, channels", [(16000, 1), (44100, 2)])
+def test_wav_is_decoded_to_16_khz_mono_without_ffmpeg(tmp_path, monkeypatch, rate, channels):
+    import wave
+    monkeypatch.setenv("PATH", str(tmp_path))  # No ffmpeg
+    t = np.arange(3 * rate) / rate
+    tone = 0.5 * np.sin(2 * np.pi * 440 * t)
+    path = str(tmp_path / "clip.wav")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes((np.repeat(tone[:, None], channels, axis=1) * 32767).astype("<i2").tobytes())
+    decoded = np.concatenate(list(stream_audio(path, block_s=1)))
+    expected = 0.5 * np.sin(2 * np.pi * 440 * np.arange(len(decoded)) / 16000)
+    assert abs(len(decoded) - 3 * 16000) <= 1
+    assert np.abs(decoded - expected).max() < 0.01
+
+
+class SlowPool:
+    """Stands in for the process pool; loading the replicas takes `seconds`."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.loaded = threading.Event()
+
+    def map(self, function, arguments):
+        time.sleep(self.seconds)
+        self.loaded.set()
+        return [None for _ in arguments]
+
+
+@pytest.mark.parametrize("mode, blocks, loads", [("eager", True, True), ("background", False, True), ("lazy", False, False)])
+def test_warm_up_modes(monkeypatch, mode, blocks, loads):
+    pool = SlowPool(0.5)
+    monkeypatch.setattr(long_transcription, "get_pool", lambda model, workers: pool)
+    start = time.monotonic()
+    warm_up_pool("model", 2, mode=mode)
+    assert (time.monotonic() - start >= 0.5) == blocks
+    assert pool.loaded.wait(2) == loads
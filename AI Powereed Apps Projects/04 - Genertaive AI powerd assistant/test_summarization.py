@@ -0,0 +1,112 @@
+import re
+import threading
+
+from summarization import MapReduceSummarizer, split_transcript, stream_key_points
+
+SENTENCES = [f"Sentence number {i} is about topic {i * 7 % 13}." for i in range(200)]
+
+
+class StubLLM:
+    """Stands in for the LLM chains: a summary says how many transcript sentences it covers."""
+
+    def __init__(self):
+        self.map_calls = []
+        self.reduce_inputs = []
+        self.lock = threading.Lock()
+
+    def map(self, chunk):
+        with self.lock:
+            self.map_calls.append(chunk)
+        return f"Covers {chunk.count('Sentence number') + chunk.count('edited')} sentences."
+
+    def reduce(self, partials):
+        with self.lock:
+            self.reduce_inputs.append(partials)
+        covered = sum(int(n) for n in re.findall(r'Covers (\d+)', partials))
+        return f"Covers {covered} sentences."
+
+
+def summarizer(llm, max_tokens=100, **kwargs):
+    return MapReduceSummarizer(llm.map, llm.reduce, max_tokens=max_tokens, **kwargs)
+
+
+def test_chunks_keep_every_sentence_within_the_budget():
+    chunks = split_transcript(" ".join(SENTENCES), max_tokens=100)
+    assert " ".join(chunks) == " ".join(SENTENCES)
+    assert len(chunks) > 10 and all(len(chunk) // 4 + 1 <= 100 for chunk in chunks)
+
+
+def test_local_edit_only_changes_the_chunks_around_it():
+    before = split_transcript(" ".join(SENTENCES), max_tokens=100)
+    edited = list(SENTENCES)
+    edited[100] = "This sentence was edited by hand."
+    inserted = SENTENCES[:50] + ["A sentence said in between."] + SENTENCES[50:]
+    for text in (edited, inserted):
+        after = split_transcript(" ".join(text), max_tokens=100)
+        # Chunks before and after the edit line up with the old ones again
+        assert len(set(after) - set(before)) <= 2
+        assert after[:3] == before[:3] and after[-3:] == before[-3:]
+
+
+def test_summarizing_an_edited_transcript_only_maps_the_changed_chunks():
+    llm = StubLLM()
+    summaries = summarizer(llm)
+    chunks = len(split_transcript(" ".join(SENTENCES), max_tokens=100))
+
+    assert summaries.summarize(" ".join(SENTENCES)) == "Covers 200 sentences."
+    assert summaries.stats()["mapped_chunks"] == chunks and summaries.stats()["cached_chunks"] == 0
+
+    edited = list(SENTENCES)
+    edited[100] = "This sentence was edited by hand."
+    assert summaries.summarize(" ".join(edited)) == "Covers 200 sentences."
+    stats = summaries.stats()
+    assert 1 <= stats["mapped_chunks"] - chunks <= 2
+    assert stats["cached_chunks"] == chunks - (stats["mapped_chunks"] - chunks)
+    assert any("edited" in chunk for chunk in llm.map_calls[chunks:])
+
+
+def test_cache_is_per_namespace_and_bounded():
+    llm = StubLLM()
+    text = " ".join(SENTENCES)
+    first = summarizer(llm, cache_entries=5)
+    first.summarize(text)
+    first.summarize(text)
+    assert first.stats()["cache_entries"] == 5
+    assert first.stats()["cached_chunks"] < first.stats()["mapped_chunks"]  # Most were evicted
+
+    shared = summarizer(llm, namespace="prompt v1")
+    shared.summarize(SENTENCES[0])
+    shared.namespace = "prompt v2"
+    shared.summarize(SENTENCES[0])
+    assert shared.stats()["mapped_chunks"] == 2 and shared.stats()["cached_chunks"] == 0
+
+
+def test_many_partials_are_reduced_in_rounds_without_losing_any():
+    llm = StubLLM()
+    summaries = summarizer(llm, max_tokens=20, parallelism=2)
+    sentences = [f"Sentence number {i}." for i in range(60)]
+
+    assert summaries.summarize(" ".join(sentences)) == "Covers 60 sentences."
+    # The partials don't fit one reduce call, so they are merged in several rounds
+    assert summaries.stats()["reduce_calls"] > 2
+    assert all(len(partials) // 4 + 1 <= 20 for partials in llm.reduce_inputs[:-1])
+
+
+def test_short_text_is_summarized_with_a_single_call():
+    llm = StubLLM()
+    summaries = summarizer(llm)
+    assert summaries.summarize(SENTENCES[0]) == "Covers 1 sentences."
+    assert summaries.stats()["reduce_calls"] == 0 and summaries.summarize("") == ""
+
+
+def test_streamed_transcript_ends_with_the_merged_key_points():
+    llm = StubLLM()
+    segments = [{"text": sentence} for sentence in SENTENCES]
+
+    results = list(stream_key_points(segments, summarizer(llm)))
+
+    assert len(results) == len(segments) + 1
+    transcript, points = results[-1]
+    assert transcript == " ".join(SENTENCES) and points == "Covers 200 sentences."
+    # Key points of the beginning are available before the transcript is complete
+    assert any(points for _, points in results[:-1])
@@ -3,10 +3,11 @@ import json
 from flask import Flask, render_template, request
 from flask_cors import CORS
 import os
-from worker import speech_to_text, text_to_speech, watsonx_process_message
+from worker import (speech_to_text, text_to_speech, text_to_speech_stream, watsonx_process_message,
+                    audio_response_parts, AUDIO_FORMATS)
 
 app = Flask(__name__)
-cors = CORS(app, resources={r"/*": {"origins": "*"}})
+cors = CORS(app, resources={r"/*": {"origins": "*"}}, expose_headers=['X-Response-Text'])
 
 
 @app.route('/', methods=['GET'])
@@ -31,6 +32,16 @@ def speech_to_text_route():
     return response
 
 
+# Streams `audio` between `head` and `tail`, closing the Text-to-Speech response if the client leaves
+def surround(head, audio, tail):
+    try:
+        yield head
+        yield from audio
+        yield tail
+    finally:
+        audio.close()
+
+
 @app.route('/process-message', methods=['POST'])
 def process_message_route():
     user_message = request.json['userMessage'] # Get user's message from their request
@@ -39,12 +50,26 @@ def process_message_route():
     voice = request.json['voice'] # Get user\'s preferred voice from their request
     print('voice', voice)
 
+    # Pick the response format from the Accept header: JSON with base64 audio unless the client asks for audio
+    media_type = request.accept_mimetypes.best_match(['application/json'] + list(AUDIO_FORMATS),
+                                                     default='application/json')
+
     # Call watsonx_process_message function to process the user's message and get a response back
     watsonx_response_text = watsonx_process_message(user_message)
 
     # Clean the response to remove any emptylines
     watsonx_response_text = os.linesep.join([s for s in watsonx_response_text.splitlines() if s])
 
+    if media_type != 'application/json':
+        # Stream the audio straight from the Text-to-Speech service and send the text in a header,
+        # or in a multipart body with the audio if it is too long for a header
+        audio = text_to_speech_stream(watsonx_response_text, voice, media_type)
+        content_type, headers, head, tail = audio_response_parts(watsonx_response_text, media_type)
+        response = app.response_class(surround(head, audio, tail), status=200, content_type=content_type)
+        response.headers.update(headers)
+        response.vary.add('Accept')
+        return response
+
     # Call our text_to_speech function to convert Watsonx Api's reponse to speech
     watsonx_response_speech = text_to_speech(watsonx_response_text, voice)
 
@@ -57,6 +82,7 @@ def process_message_route():
         status=200,
         mimetype='application/json'
     )
+    response.vary.add('Accept')
 
     print(response)
     return response
@@ -36,15 +36,35 @@ const getSpeechToText = async (userRecording) => {
   return response.text;
 };
 
+// Ask for compressed audio when the browser can play it; the server sends the audio bytes as
+// the response body and the reply text in the X-Response-Text header, or, when the text is too
+// long for a header, both as parts of a multipart/form-data body
+const preferredAudioType = new Audio().canPlayType('audio/ogg; codecs="opus"') ? "audio/ogg" : "audio/wav";
+
 const processUserMessage = async (userMessage) => {
-  let response = await fetch(baseUrl + "/process-message", {
+  const response = await fetch(baseUrl + "/process-message", {
     method: "POST",
-    headers: { Accept: "application/json", "Content-Type": "application/json" },
+    headers: { Accept: preferredAudioType, "Content-Type": "application/json" },
     body: JSON.stringify({ userMessage: userMessage, voice: voiceOption }),
   });
-  response = await response.json();
-  console.log(response);
-  return response;
+  if (!response.ok) {
+    // An error page, not audio: show the error instead of playing it
+    console.error(`Processing the message failed: ${response.status} ${await response.text()}`);
+    return { watsonxResponseText: "Sorry, something went wrong. Please try again.", watsonxResponseSpeech: null };
+  }
+
+  let text, speech;
+  if ((response.headers.get("Content-Type") || "").startsWith("multipart/form-data")) {
+    const parts = await response.formData();
+    text = parts.get("text");
+    speech = parts.get("audio");
+  } else {
+    text = decodeURIComponent(response.headers.get("X-Response-Text") || "");
+    speech = await response.blob();
+  }
+  const reply = { watsonxResponseText: text, watsonxResponseSpeech: URL.createObjectURL(speech) };
+  console.log(reply);
+  return reply;
 };
 
 const cleanTextInput = (value) => {
@@ -164,10 +184,10 @@ const populateBotResponse = async (userMessage) => {
       !lightMode ? " dark" : ""
     }'>${
       response.watsonxResponseText
-    }</div><button id='${repeatButtonID}' class='btn volume repeat-button' onclick='playResponseAudio("data:audio/wav;base64," + responses[botRepeatButtonIDToIndexMap[this.id]].watsonxResponseSpeech);console.log(this.id)'><i class='fa fa-volume-up'></i></button></div>`
+    }</div><button id='${repeatButtonID}' class='btn volume repeat-button' onclick='playResponseAudio(responses[botRepeatButtonIDToIndexMap[this.id]].watsonxResponseSpeech);console.log(this.id)'><i class='fa fa-volume-up'></i></button></div>`
   );
 
-  playResponseAudio("data:audio/wav;base64," + response.watsonxResponseSpeech);
+  if (response.watsonxResponseSpeech) playResponseAudio(response.watsonxResponseSpeech);
 
   scrollToBottom();
 };
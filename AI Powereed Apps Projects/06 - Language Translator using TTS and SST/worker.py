@@ -7,6 +7,10 @@ from ibm_watson_machine_learning.foundation_models.utils.enums import ModelTypes
 from ibm_watson_machine_learning.foundation_models.utils.enums import DecodingMethods  # For setting the decoding method.
 from ibm_watson_machine_learning.metanames import GenTextParamsMetaNames as GenParams  # For defining generation parameters.
 
+import os  # For reading the configuration from environment variables.
+import uuid  # For the boundaries of multipart responses.
+from urllib.parse import quote  # For percent-encoding the reply text in a header.
+
 import requests  # For making HTTP requests to the Watson APIs.
 
 
@@ -107,6 +111,80 @@ def text_to_speech(text, voice=""):
     response = requests.post(api_url, headers=headers, json=json_data)
     return response.content
 
+# Audio formats the app can ask the TTS service for, by the media type sent to the browser
+AUDIO_FORMATS = {
+    'audio/wav': 'audio/wav',
+    'audio/ogg': 'audio/ogg;codecs=opus',  # About a tenth of the size of WAV
+    'audio/mpeg': 'audio/mpeg',
+}
+
+# Translations up to this many bytes once percent-encoded travel in the X-Response-Text header.
+# Proxies cap header sizes, and Spanish or French text grows about 3x when encoded.
+response_text_header_max = int(os.environ.get("RESPONSE_TEXT_HEADER_MAX", 2048))
+
+def audio_response_parts(text, media_type):
+    """
+    Decides how the translated text travels with the streamed audio.
+
+    A short translation goes percent-encoded in the X-Response-Text header and the body is just
+    the audio. A longer one turns the body into multipart/form-data: a "text" part, then an
+    "audio" part.
+
+    Args:
+        text (str): The translated text.
+        media_type (str): The audio media type, one of the keys of AUDIO_FORMATS.
+
+    Returns:
+        tuple: The response content type, extra headers, and the bytes to write before and after the audio.
+    """
+    quoted = quote(text)
+    if len(quoted) <= response_text_header_max:
+        return media_type, {'X-Response-Text': quoted}, b'', b''
+    boundary = uuid.uuid4().hex
+    text_part = (f'--{boundary}\r\nContent-Disposition: form-data; name="text"\r\n'
+                 f'Content-Type: text/plain; charset=utf-8\r\n\r\n{text}\r\n')
+    audio_part_head = (f'--{boundary}\r\nContent-Disposition: form-data; name="audio"; filename="reply"\r\n'
+                       f'Content-Type: {media_type}\r\n\r\n')
+    closing = f'\r\n--{boundary}--\r\n'
+    return f'multipart/form-data; boundary={boundary}', {}, (text_part + audio_part_head).encode(), closing.encode()
+
+def text_to_speech_stream(text, voice="", media_type='audio/wav', chunk_size=64 * 1024):
+    """
+    Converts text into speech and returns the audio as it arrives from the Watson Text-to-Speech
+    service, without holding all of it in memory.
+
+    Args:
+        text (str): The text to be converted into speech.
+        voice (str, optional): The voice to use for synthesis (e.g., "en-US_AllisonV3Voice"). Defaults to "".
+        media_type (str, optional): One of the keys of AUDIO_FORMATS. Defaults to 'audio/wav'.
+        chunk_size (int, optional): Size of the chunks read from the service.
+
+    Returns:
+        Iterator[bytes]: The audio data.
+    """
+    base_url = '...'  # Replace with the actual base URL of your Watson Speech-to-Text service.
+    api_url = f"{base_url}/text-to-speech/api/v1/synthesize"
+    params = {'output': 'output_text.wav'}
+    if voice != "" and voice != "default":
+        params['voice'] = voice
+
+    headers = {
+        'Accept': AUDIO_FORMATS[media_type],
+        'Content-Type': 'application/json',
+    }
+
+    # stream=True returns once the headers arrive; the audio is read chunk by chunk below
+    response = requests.post(api_url, params=params, headers=headers, json={'text': text}, stream=True)
+    response.raise_for_status()
+
+    def chunks():
+        try:
+            yield from response.iter_content(chunk_size)
+        finally:
+            response.close()
+
+    return chunks()
+
 
 ### Watsonx LLM Function ###
 def watsonx_process_message(user_message):
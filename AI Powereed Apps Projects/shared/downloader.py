@@ -0,0 +1,256 @@
+# Streaming, resumable downloads shared by the projects that fetch files over HTTP (the image
+# captioner and the generative AI assistant); they add this folder to their import path.
+
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+CHUNK_SIZE = 256 << 10     # Bytes read from the socket and written to disk at a time (what a dropped connection loses)
+PART_SIZE = 8 << 20        # Files larger than this are split into Range requests of this size
+PARALLEL_PARTS = 4         # Range requests in flight at a time
+
+
+class DownloadError(Exception):
+    """A download that can't be completed: the server misbehaved or the content failed its checksum."""
+
+
+class _RangeIgnored(Exception):
+    """The server answered a Range request with the whole file (it ignores ranges, or the file changed)."""
+
+
+def download(url, path, sha256=None, session=None, parallel=PARALLEL_PARTS, part_size=PART_SIZE,
+             chunk_size=CHUNK_SIZE, retries=3, timeout=30):
+    """
+    Downloads `url` to `path`, streaming it to disk in `chunk_size` pieces.
+
+    The file is written to `path + ".part"` and only renamed to `path` once it is complete and
+    verified, so `path` never holds a partial file. If the server accepts Range requests and sends
+    a validator (a strong ETag or Last-Modified), a large file is fetched as `part_size` ranges,
+    `parallel` at a time, and the progress of every range is kept in `path + ".part.json"`: an
+    interrupted download (even by killing the process) resumes from where it stopped, provided the
+    file on the server still has the same validator. If the server answers a range with the whole
+    file instead (it ignores ranges, or the file changed), the file is downloaded again in one piece.
+
+    The content is checked against `sha256` if given, and against any checksum the server
+    advertises (Content-MD5, Digest/Repr-Digest or x-goog-hash).
+
+    Returns:
+        str: `path`.
+
+    Raises:
+        DownloadError: The checksum didn't match (the partial files are deleted) or the server
+            kept failing after `retries` attempts per range.
+    """
+    if sha256 is not None and os.path.exists(path) and _digests(path, chunk_size)["sha256"] == sha256.lower():
+        return path
+
+    own_session = session is None
+    session = session or requests.Session()
+    part_path, state_path = path + ".part", path + ".part.json"
+    try:
+        head = session.head(url, allow_redirects=True, timeout=timeout)
+        info = head.headers if head.ok else {}  # Some servers don't answer HEAD; then just stream the file.
+        size = int(info["Content-Length"]) if "Content-Length" in info else None
+        validator = _range_validator(info)
+        ranged = size is not None and info.get("Accept-Ranges") == "bytes" and validator is not None
+
+        try:
+            if not ranged:
+                raise _RangeIgnored()
+            progress = _Progress.resume(state_path, url, size, validator)
+            if progress is None or not os.path.exists(part_path):
+                progress = _Progress(state_path, {"url": url, "size": size, "validator": validator, "done": {}})
+                with open(part_path, "wb") as f:
+                    f.truncate(size)
+            ranges = [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+            with ThreadPoolExecutor(max(1, min(parallel, len(ranges)))) as pool:
+                futures = [pool.submit(_fetch, session, url, part_path, start, end, validator, progress,
+                                       chunk_size, timeout, retries) for start, end in ranges]
+                for future in futures:
+                    future.result()
+        except _RangeIgnored:
+            # No usable ranges: the download can only be streamed from the start
+            _remove(state_path)
+            response = _fetch(session, url, part_path, 0, None, None, _Progress(state_path, None),
+                              chunk_size, timeout, retries)
+            info = response.headers
+
+        expected = _advertised_digests(info)
+        if sha256 is not None:
+            expected["sha256"] = sha256.lower()
+        actual = _digests(part_path, chunk_size)
+        if any(actual[name] != digest for name, digest in expected.items()):
+            _remove(part_path, state_path)
+            raise DownloadError(f"{url}: the downloaded content doesn't match its checksum")
+        os.replace(part_path, path)
+        _remove(state_path)
+        return path
+    finally:
+        if own_session:
+            session.close()
+
+
+def fetch(session, url, headers=None, timeout=10, chunk_size=64 << 10, retries=2):
+    """
+    Reads the body of `url` into memory in `chunk_size` pieces.
+
+    For small files such as images, where a `.part` file on disk isn't worth it. If the connection
+    breaks mid-body and the server accepts ranges, the rest is requested with a Range request
+    (guarded by If-Range) instead of downloading the whole file again. If the file changed on the
+    server in the meantime, the new version is read from the start.
+
+    Returns:
+        tuple: (the response whose body was read, for its status and headers; the body as bytes).
+
+    Raises:
+        requests.HTTPError: The request for the rest of the body failed.
+    """
+    response = session.get(url, headers=headers, stream=True, timeout=timeout)
+    data = bytearray()
+    current = response
+    for attempt in range(retries + 1):
+        try:
+            for chunk in current.iter_content(chunk_size):
+                data.extend(chunk)
+            return response, bytes(data)
+        except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError):
+            validator = _range_validator(response.headers)
+            if attempt == retries or response.headers.get("Accept-Ranges") != "bytes" or not validator:
+                raise
+            current = session.get(url, headers={**(headers or {}), "Range": f"bytes={len(data)}-", "If-Range": validator},
+                                  stream=True, timeout=timeout)
+            current.raise_for_status()
+            if current.status_code != 206:  # Changed on the server: start over with the new version
+                data.clear()
+                response = current
+
+
+def _range_validator(headers):
+    """
+    The If-Range value for a response's headers: its ETag if it is strong, else its Last-Modified.
+    A weak ETag (W/"...") never matches If-Range, so the server would always send the whole file.
+    """
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+
+def _advertised_digests(headers):
+    """{"md5"/"sha256": hex digest} of the whole content, for the checksums a server sends explicitly."""
+    def hex_digest(value):
+        try:
+            return base64.b64decode(value.strip().strip(":"), validate=True).hex()
+        except ValueError:
+            return None
+
+    digests = {}
+    if headers.get("Content-MD5"):
+        digests["md5"] = hex_digest(headers["Content-MD5"])
+    # Digest: md5=..., SHA-256=... (RFC 3230); Repr-Digest: sha-256=:...: (RFC 9530); x-goog-hash: crc32c=...,md5=...
+    for header in ("Digest", "Repr-Digest", "x-goog-hash"):
+        for algorithm, value in re.findall(r'([\w-]+)=(:?[A-Za-z0-9+/]+=*:?)', headers.get(header, "")):
+            name = {"md5": "md5", "sha-256": "sha256"}.get(algorithm.lower())
+            if name:
+                digests[name] = hex_digest(value)
+    return {name: digest for name, digest in digests.items() if digest}
+
+
+class _Progress:
+    """Bytes done per range of a download, saved to the `.part.json` file after every chunk."""
+
+    def __init__(self, path, state):
+        self.path = path
+        self.state = state
+        self._lock = threading.Lock()
+
+    @classmethod
+    def resume(cls, path, url, size, validator):
+        """The saved progress, if it belongs to the same version of the same file."""
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (state.get("url"), state.get("size"), state.get("validator")) != (url, size, validator) or not validator:
+            return None
+        return cls(path, state)
+
+    def done(self, start):
+        if self.state is None:
+            return 0
+        with self._lock:
+            return self.state["done"].get(str(start), 0)
+
+    def add(self, start, count):
+        if self.state is None:
+            return
+        with self._lock:
+            done = self.state["done"]
+            done[str(start)] = done.get(str(start), 0) + count
+            with open(self.path, "w") as f:
+                json.dump(self.state, f)
+
+
+def _fetch(session, url, part_path, start, end, validator, progress, chunk_size, timeout, retries):
+    """
+    Writes bytes `start`..`end` of `url` into `part_path` (the whole body if `end` is None).
+
+    Returns:
+        requests.Response: The last response (its body already consumed).
+
+    Connection errors and 5xx answers are retried `retries` times.
+
+    Raises:
+        _RangeIgnored: The server sent the whole file instead of the range.
+        DownloadError: The server kept failing.
+        requests.HTTPError: The server answered with a 4xx error.
+    """
+    for attempt in range(retries + 1):
+        offset = start + progress.done(start)
+        if end is not None and offset > end:
+            return None
+        headers = {}
+        if end is not None:
+            headers["Range"] = f"bytes={offset}-{end}"
+            if validator:
+                headers["If-Range"] = validator
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                response.raise_for_status()
+                if end is not None and response.status_code != 206:
+                    raise _RangeIgnored()
+                with open(part_path, "r+b" if end is not None else "wb") as f:
+                    f.seek(offset)
+                    for chunk in response.iter_content(chunk_size):
+                        f.write(chunk)
+                        f.flush()  # On disk before it is recorded as done
+                        progress.add(start, len(chunk))
+            return response
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                requests.HTTPError) as e:
+            if isinstance(e, requests.HTTPError) and e.response.status_code < 500:
+                raise
+            if attempt == retries:
+                raise DownloadError(f"{url}: giving up after {retries + 1} attempts: {e}") from e
+
+
+def _digests(path, chunk_size):
+    sha256, md5 = hashlib.sha256(), hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+            md5.update(chunk)
+    return {"sha256": sha256.hexdigest(), "md5": md5.hexdigest()}
+
+
+def _remove(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,256 @@
+import base64
+import hashlib
+import os
+import re
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from downloader import DownloadError, download, fetch
+
+LAST_MODIFIED = formatdate(0, usegmt=True)
+
+
+class RangeServer(BaseHTTPRequestHandler):
+    """
+    Serves `payload` with Range/If-Range support (RFC 7233: a weak ETag never matches If-Range).
+
+    The class attributes change its behavior per test; `requests` records the Range/If-Range
+    headers of every GET.
+    """
+
+    payload = b""
+    etag = None
+    weak_etag = False
+    last_modified = None
+    ignore_ranges = False
+    drop_after = None        # Close the connection after sending this many bytes of a body
+    drop_count = None        # ... only for this many GETs (None: all of them)
+    statuses = []            # Error statuses to answer the next GETs with, in order
+    change_after = None      # Replace the payload after this many GETs (with `new_payload`)
+    new_payload = b""
+    extra_headers = {}
+    requests = []
+    bytes_sent = 0
+    lock = threading.Lock()
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_entity_headers(len(self.payload))
+        self.end_headers()
+
+    def do_GET(self):
+        with self.lock:
+            RangeServer.requests.append((self.headers.get("Range"), self.headers.get("If-Range")))
+            payload = self.payload
+            if self.change_after is not None and len(RangeServer.requests) >= self.change_after:
+                RangeServer.payload = payload = self.new_payload
+            status = RangeServer.statuses.pop(0) if RangeServer.statuses else None
+            drop = self.drop_after is not None and (self.drop_count is None or len(RangeServer.requests) <= self.drop_count)
+        if status is not None:
+            self.send_error(status)
+            return
+        start, end = 0, len(payload) - 1
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get("Range", ""))
+        if match and not self.ignore_ranges and self.if_range_matches(self.headers.get("If-Range")):
+            start, end = int(match.group(1)), min(int(match.group(2) or end), end)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(payload)}")
+        else:
+            self.send_response(200)
+        self.send_entity_headers(end - start + 1)
+        self.end_headers()
+
+        body = payload[start:end + 1]
+        if drop and len(body) > self.drop_after:
+            body = body[:self.drop_after]
+            self.close_connection = True
+        self.wfile.write(body)
+        with self.lock:
+            RangeServer.bytes_sent += len(body)
+
+    def if_range_matches(self, value):
+        if value is None:
+            return True
+        if value.startswith('"'):
+            return not self.weak_etag and value == self.current_etag()
+        return value == self.last_modified
+
+    def current_etag(self):
+        return f'"{hashlib.sha1(self.payload).hexdigest()}"'
+
+    def send_entity_headers(self, length):
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        if self.etag:
+            self.send_header("ETag", ("W/" if self.weak_etag else "") + self.current_etag())
+        if self.last_modified:
+            self.send_header("Last-Modified", self.last_modified)
+        for name, value in self.extra_headers.items():
+            self.send_header(name, value)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(RangeServer, "payload", os.urandom(1 << 20))
+    monkeypatch.setattr(RangeServer, "etag", True)
+    monkeypatch.setattr(RangeServer, "requests", [])
+    monkeypatch.setattr(RangeServer, "bytes_sent", 0)
+    monkeypatch.setattr(RangeServer, "statuses", [])
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RangeServer)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}/audio.mp3"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def fetched(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_full_download_in_parallel_ranges(server, tmp_path):
+    path = str(tmp_path / "audio.mp3")
+    download(server, path, part_size=256 << 10, parallel=4)
+    assert fetched(path) == RangeServer.payload
+    assert sorted(os.listdir(tmp_path)) == ["audio.mp3"]
+    assert all(range_ is not None for range_, _ in RangeServer.requests) and len(RangeServer.requests) == 4
+
+
+def test_resumes_an_interrupted_part_file(server, tmp_path, monkeypatch):
+    path = str(tmp_path / "audio.mp3")
+    monkeypatch.setattr(RangeServer, "drop_after", 100 << 10)
+    with pytest.raises(DownloadError):
+        download(server, path, part_size=256 << 10, chunk_size=16 << 10, retries=0)
+    assert sorted(os.listdir(tmp_path)) == ["audio.mp3.part", "audio.mp3.part.json"]
+
+    monkeypatch.setattr(RangeServer, "drop_after", None)
+    monkeypatch.setattr(RangeServer, "bytes_sent", 0)
+    download(server, path, part_size=256 << 10, sha256=hashlib.sha256(RangeServer.payload).hexdigest())
+    assert fetched(path) == RangeServer.payload
+    assert RangeServer.bytes_sent <= len(RangeServer.payload) - 4 * (64 << 10)  # The bytes already there weren't sent again
+    assert sorted(os.listdir(tmp_path)) == ["audio.mp3"]
+
+
+def test_server_that_ignores_ranges(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(RangeServer, "ignore_ranges", True)
+    path = str(tmp_path / "audio.mp3")
+    download(server, path, part_size=256 << 10)
+    assert fetched(path) == RangeServer.payload
+
+
+def test_file_changed_on_the_server_mid_download(server, tmp_path, monkeypatch):
+    new_payload = os.urandom(1 << 20)
+    monkeypatch.setattr(RangeServer, "change_after", 2)
+    monkeypatch.setattr(RangeServer, "new_payload", new_payload)
+    path = str(tmp_path / "audio.mp3")
+    download(server, path, part_size=256 << 10, parallel=1)
+    # The ranges of the old version are discarded and the new version is downloaded whole
+    assert fetched(path) == new_payload
+
+
+def test_weak_etag_falls_back_to_last_modified(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(RangeServer, "weak_etag", True)
+    monkeypatch.setattr(RangeServer, "last_modified", LAST_MODIFIED)
+    path = str(tmp_path / "audio.mp3")
+    download(server, path, part_size=256 << 10)
+    assert fetched(path) == RangeServer.payload
+    assert {if_range for _, if_range in RangeServer.requests} == {LAST_MODIFIED}
+
+
+def test_weak_etag_only_is_downloaded_whole(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(RangeServer, "weak_etag", True)
+    path = str(tmp_path / "audio.mp3")
+    download(server, path, part_size=256 << 10)
+    assert fetched(path) == RangeServer.payload
+    assert RangeServer.requests == [(None, None)]
+
+
+def test_advertised_checksum_is_verified(server, tmp_path, monkeypatch):
+    path = str(tmp_path / "audio.mp3")
+    good = base64.b64encode(hashlib.md5(RangeServer.payload).digest()).decode()
+    monkeypatch.setattr(RangeServer, "extra_headers", {"Content-MD5": good})
+    download(server, path)
+    assert fetched(path) == RangeServer.payload
+
+    os.remove(path)
+    monkeypatch.setattr(RangeServer, "extra_headers", {"Digest": "sha-256=" + base64.b64encode(b"0" * 32).decode()})
+    with pytest.raises(DownloadError, match="checksum"):
+        download(server, path)
+    assert os.listdir(tmp_path) == []
+
+
+def test_hex_etag_is_not_taken_for_a_checksum(server, tmp_path, monkeypatch):
+    # A 32-hex ETag that isn't the MD5 of the content (S3 multipart, nginx...) must not fail the download
+    monkeypatch.setattr(RangeServer, "current_etag", lambda self: '"' + "0" * 32 + '"')
+    path = str(tmp_path / "audio.mp3")
+    download(server, path)
+    assert fetched(path) == RangeServer.payload
+
+
+def test_wrong_sha256_deletes_the_partial_files(server, tmp_path):
+    path = str(tmp_path / "audio.mp3")
+    with pytest.raises(DownloadError, match="checksum"):
+        download(server, path, sha256="0" * 64)
+    assert os.listdir(tmp_path) == []
+
+
+def test_server_errors_are_retried(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(RangeServer, "statuses", [503, 502])
+    path = str(tmp_path / "audio.mp3")
+    download(server, path, part_size=256 << 10, parallel=1)
+    assert fetched(path) == RangeServer.payload
+    assert len(RangeServer.requests) == 6
+
+
+def test_server_that_keeps_failing(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(RangeServer, "statuses", [503] * 10)
+    with pytest.raises(DownloadError, match="3 attempts"):
+        download(server, str(tmp_path / "audio.mp3"), part_size=1 << 20, retries=2)
+
+
+def test_client_errors_are_not_retried(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(RangeServer, "statuses", [404])
+    with pytest.raises(requests.HTTPError):
+        download(server, str(tmp_path / "audio.mp3"), part_size=1 << 20)
+    assert len(RangeServer.requests) == 1
+
+
+def broken_first_get(monkeypatch):
+    monkeypatch.setattr(RangeServer, "drop_after", 300 << 10)
+    monkeypatch.setattr(RangeServer, "drop_count", 1)
+
+
+def test_fetch_resumes_a_broken_body_with_a_range(server, monkeypatch):
+    broken_first_get(monkeypatch)
+    with requests.Session() as session:
+        response, data = fetch(session, server)
+    assert data == RangeServer.payload
+    # Only the rest is requested again (from the last whole chunk that was read)
+    resumed_at = int(re.fullmatch(r"bytes=(\d+)-", RangeServer.requests[1][0]).group(1))
+    assert (300 << 10) - (64 << 10) <= resumed_at <= 300 << 10
+
+
+def test_fetch_restarts_when_the_file_changed(server, monkeypatch):
+    broken_first_get(monkeypatch)
+    new_payload = os.urandom(200 << 10)
+    monkeypatch.setattr(RangeServer, "change_after", 2)
+    monkeypatch.setattr(RangeServer, "new_payload", new_payload)
+    with requests.Session() as session:
+        response, data = fetch(session, server)
+    # The body and the headers are both those of the new version
+    assert data == new_payload
+    assert response.status_code == 200 and response.headers["ETag"] == RangeServer.current_etag(RangeServer)
+
+
+def test_fetch_raises_when_the_rest_of_the_body_fails(server, monkeypatch):
+    broken_first_get(monkeypatch)
+    monkeypatch.setattr(RangeServer, "statuses", [None, 500])
+    with requests.Session() as session, pytest.raises(requests.HTTPError):
+        fetch(session, server)